@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare cutoff tuning by re-running the edlib backend for every cutoff with
+the single pass autotune engine, which aligns once and re-scores cached hits.
+
+Usage: bench_autotune.py [nr_reads] [nr_cutoffs] [threads]
+"""
+
+import sys
+import time
+import numpy as np
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads
+from pychopper import seq_utils as seu
+from pychopper import utils, chopper, autotune, worker_pool
+from pychopper.common_structures import Seq
+
+nr_reads, nr_cutoffs, threads = 2000, 30, 4
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    nr_cutoffs = int(sys.argv[2])
+if len(sys.argv) > 3:
+    threads = int(sys.argv[3])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+reads = [Seq(n, n, s, None) for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads)]
+primers = seu.get_primers(primer_file)
+config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+cutoffs = np.linspace(0.0, 1.0, num=nr_cutoffs)
+mb = max(1, int(len(reads) / threads))
+
+with worker_pool.start_pool(threads, {"primers": primers}) as pool:
+    t0 = time.perf_counter()
+    per_cutoff = []
+    for qv in cutoffs:
+        cls, cls_len = 0, 0
+        for read, (segments, hits, usable_len) in chopper.chopper_edlib(reads, config, qv * 1.2, qv, pool, mb):
+            flt = [x.Len for x in segments if x.Len > 0]
+            if len(flt) == 1:
+                cls += 1
+                cls_len += flt[0]
+        per_cutoff.append((cls, cls_len))
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    class_reads, class_lens = autotune.tune_edlib(reads, primers, config, cutoffs, 1.2, pool, mb)
+    t_single = time.perf_counter() - t0
+
+same = per_cutoff == list(zip(class_reads.tolist(), class_lens.tolist()))
+print("Reads: {}\tCutoffs: {}\tThreads: {}".format(nr_reads, nr_cutoffs, threads))
+print("Per-cutoff alignment:\t{:.2f}s".format(t_loop))
+print("Single pass:\t\t{:.2f}s\t({:.1f}x)".format(t_single, t_loop / t_single))
+print("Identical classification counts: {}".format(same))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare Hit and Segment namedtuples with the columnar data model on a batch of simulated hits:
+memory held by the hits and segments, time to unpack a work unit, to segment it and to build the
+hit pattern of every read used by the statistics.
+
+Usage: bench_columnar.py [nr_reads]
+"""
+
+import sys
+import time
+import tracemalloc
+import numpy as np
+from pychopper import utils, packed_batch
+from pychopper.alignment_hits import process_hits
+from pychopper.chopper import analyse_hits
+from pychopper.batch_segmentation import segment_batch
+from pychopper.columnar import HitBatch, segment_hits, queries
+from pychopper.common_structures import Seq
+
+nr_reads = 1000000
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+
+config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+names = ("SSP", "-SSP", "VNP", "-VNP")
+
+
+def simulate_packed(n, seed=42):
+    "Packed hits of n reads: primers at both ends, missing in some reads, and spurious hits inside"
+    rng = np.random.RandomState(seed)
+    lengths = rng.lognormal(np.log(1000), 0.8, size=n).astype(np.int64) + 100
+    forward = rng.rand(n) < 0.5
+    rows = []
+    for present, start, end, primer in (
+            (rng.rand(n) < 0.95, np.zeros(n, dtype=np.int64), np.full(n, 25), np.where(forward, 0, 2)),
+            (rng.rand(n) < 0.95, lengths - 25, lengths, np.where(forward, 3, 1)),
+            (rng.rand(n) < 0.1, lengths // 2, lengths // 2 + 20, rng.randint(0, 4, size=n))):
+        idx = np.nonzero(present)[0]
+        part = np.zeros(len(idx), dtype=packed_batch.HIT_DTYPE)
+        part["read"], part["ref_start"], part["ref_end"], part["primer"] = idx, start[idx], end[idx], primer[idx]
+        part["query_end"] = part["ref_end"] - part["ref_start"]
+        part["score"] = np.round(rng.rand(len(idx)) * 0.4, 3)
+        rows.append(part)
+    hits = np.concatenate(rows)
+    return hits[np.argsort(hits["read"], kind="stable")], names
+
+
+def timed(func):
+    "Run func, returning its result and run time"
+    t0 = time.perf_counter()
+    res = func()
+    return res, time.perf_counter() - t0
+
+
+def allocated(func):
+    "Run func, returning the memory allocated by its result in MB"
+    tracemalloc.start()
+    res = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del res
+    return size / 1e6
+
+
+reads = [Seq(str(i), str(i), "", None) for i in range(nr_reads)]
+packed = simulate_packed(nr_reads)
+batch = HitBatch.from_packed(reads, packed)
+print("Reads: {}\tHits: {}".format(nr_reads, len(packed[0])))
+print("Step\tNamedtuples s\tColumnar s\tNamedtuples MB\tColumnar MB")
+
+
+def unpack_legacy():
+    return [batch.read_hits(i) for i in range(nr_reads)]
+
+
+def unpack_columnar():
+    return HitBatch.from_packed(reads, packed).views()
+
+
+legacy, t_legacy = timed(unpack_legacy)
+views, t_col = timed(unpack_columnar)
+print("Unpack\t{:.2f}\t{:.2f}\t{:.1f}\t{:.1f}".format(t_legacy, t_col, allocated(unpack_legacy), allocated(unpack_columnar)))
+
+expected, t_loop = timed(lambda: [analyse_hits(process_hits(hits, 0.3), config) for hits in legacy])
+res, t_batch = timed(lambda: segment_batch(legacy, config, 0.3))
+assert res == expected
+del res
+segments, t_col = timed(lambda: segment_hits(HitBatch.gather(views), config, 0.3))
+print("Segment per read\t{:.2f}\t-\t{:.1f}\t-".format(t_loop, allocated(lambda: [analyse_hits(process_hits(hits, 0.3), config) for hits in legacy])))
+print("Segment batch\t{:.2f}\t{:.2f}\t-\t{:.1f}".format(t_batch, t_col, allocated(lambda: segment_hits(HitBatch.gather(views), config, 0.3))))
+results, t_col = timed(segments.results)
+assert results == expected
+print("Segments to namedtuples\t-\t{:.2f}\t-\t{:.1f}".format(t_col, allocated(segments.results)))
+
+patterns, t_legacy = timed(lambda: [",".join([hit.Query for hit in hits]) for hits in legacy])
+res, t_col = timed(lambda: [",".join(queries(hits)) for hits in views])
+assert res == patterns
+print("Hit patterns\t{:.2f}\t{:.2f}\t-\t-".format(t_legacy, t_col))
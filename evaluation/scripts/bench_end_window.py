@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare the edlib backend searching whole reads with the end window mode on simulated
+SIRV cDNA reads: run time, fraction of reads falling back to a whole read search and agreement
+of the resulting segments.
+
+Usage: bench_end_window.py [nr_reads] [window] [threads]
+"""
+
+import sys
+import time
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads
+from pychopper import seq_utils as seu
+from pychopper import utils, chopper, worker_pool
+from pychopper.common_structures import Seq
+
+nr_reads, window, threads = 2000, 150, 2
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    window = int(sys.argv[2])
+if len(sys.argv) > 3:
+    threads = int(sys.argv[3])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+reads = [Seq(n, n, s, None) for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads, median=1500)]
+primers = seu.get_primers(primer_file)
+config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+
+print("Reads: {}\tWindow: {}\tThreads: {}".format(nr_reads, window, threads))
+print("q\tWhole s\tEnds s\tSpeedup\tFallback\tSame segments")
+with worker_pool.start_pool(threads, {"primers": primers}, log=None) as pool:
+    for q in (0.2, 0.3, 0.4):
+        t0 = time.perf_counter()
+        full = [res[0] for _, res in chopper.chopper_edlib(reads, config, q * 1.2, q, pool, 200)]
+        t_full = time.perf_counter() - t0
+        window_sup = {"ends": 0, "fallback": 0, "short": 0}
+        t0 = time.perf_counter()
+        ends = [res[0] for _, res in chopper.chopper_edlib(reads, config, q * 1.2, q, pool, 200, end_window=window, window_sup=window_sup)]
+        t_ends = time.perf_counter() - t0
+        same = sum(1 for a, b in zip(full, ends) if a == b)
+        windowed = window_sup["ends"] + window_sup["fallback"]
+        print("{}\t{:.2f}\t{:.2f}\t{:.2f}x\t{:.1f}%\t{:.2f}%".format(
+            q, t_full, t_ends, t_full / t_ends, 100.0 * window_sup["fallback"] / max(windowed, 1), 100.0 * same / len(reads)))
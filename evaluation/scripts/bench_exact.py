@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Measure the exact primer match pre-pass on simulated SIRV cDNA reads of several error rates:
+the fraction of reads resolved without the edlib backend, the detection time with and without the
+pre-pass and the number of reads segmented differently.
+
+Usage: bench_exact.py [nr_reads] [q]
+"""
+
+import sys
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads, timeit
+from pychopper import seq_utils as seu
+from pychopper import chopper, utils, worker_pool
+from pychopper.alignment_hits import process_hits
+from pychopper.common_structures import Seq
+
+nr_reads, q = 2000, 0.3
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    q = float(sys.argv[2])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+worker_pool._init_worker({"primers": seu.get_primers(primer_file)})
+
+
+def detect(reads, exact, unit=1000):
+    "Run detection on work units as the workers do"
+    res = []
+    for i in range(0, len(reads), unit):
+        res.extend(chopper._staged_batch((reads[i:i + unit], ("edlib", (q * 1.2, False, q), config, q, None, exact))))
+    return res
+
+
+def segments(res):
+    return [chopper.analyse_hits(process_hits(hits, q), config)[0] for hits, _ in res]
+
+
+print("Reads: {}\tq: {}".format(nr_reads, q))
+print("Error rate\tExact\tBackend s\tPre-pass s\tSpeedup\tChanged reads")
+for error_rate in (0.01, 0.03, 0.06):
+    reads = [Seq(n, n, s, None) for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads,
+                                                                error_rate=error_rate, median=1000)]
+    t_full, full = timeit(detect, reads, False)
+    t_exact, exact = timeit(detect, reads, True)
+    nr_exact = sum(status == "exact" for _, status in exact)
+    changed = sum(a != b for a, b in zip(segments(full), segments(exact)))
+    print("{}\t{:.1f}%\t{:.3f}\t{:.3f}\t{:.2f}x\t{}".format(
+        error_rate, 100.0 * nr_exact / nr_reads, t_full, t_exact, t_full / t_exact, changed))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Measure input decoding: inline gzip.open versus the prefetching reader (gzip and BGZF).
+
+For every input the parse-only throughput is measured, then the parser is paired with a
+simulated backend which releases the GIL for a fixed time per batch of reads, like the main
+loop waiting for the worker pool. With inline decompression the wall time is the sum of decoding
+and backend time, with prefetching decoding overlaps the backend and the time the parser waits
+for input should be close to zero.
+
+Usage: bench_input.py [nr_reads] [backend_ms_per_batch]
+"""
+
+import os
+import sys
+import time
+import gzip
+import tempfile
+from bench_utils import timeit, write_random_fastq
+from pychopper import fastx_reader, fastx_writer, prefetch
+from pychopper import utils
+
+nr_reads, work_ms = 50000, 20.0
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    work_ms = float(sys.argv[2])
+BATCH = 1000
+
+tmp = tempfile.mkdtemp()
+plain = os.path.join(tmp, "bench.fq")
+write_random_fastq(plain, nr_reads)
+with open(plain, "rb") as fh:
+    data = fh.read()
+gz = plain + ".gz"
+with gzip.open(gz, "wb", compresslevel=6) as fh:
+    fh.write(data)
+pool = fastx_writer.compression_pool(os.cpu_count())
+bgzf = os.path.join(tmp, "bench.bgzf.fq.gz")
+fh = fastx_writer.open_output(bgzf, pool)
+fh.write(data)
+fh.close()
+
+
+def parse(opener):
+    fh = opener()
+    nr = sum(1 for _ in fastx_reader.readfx(fh))
+    fh.close()
+    return nr
+
+
+def pipeline(opener):
+    "Parse batches and wait work_ms per batch, returning the time spent waiting for input"
+    fh = opener()
+    parse_time, it = 0.0, utils.batch(fastx_reader.readfx(fh), BATCH)
+    while True:
+        t0 = time.perf_counter()
+        batch = next(it, None)
+        parse_time += time.perf_counter() - t0
+        if batch is None:
+            break
+        time.sleep(work_ms / 1000.0)
+    fh.close()
+    return parse_time
+
+
+inputs = [("gzip.open inline", lambda: gzip.open(gz, "rb")),
+          ("prefetch gzip", lambda: prefetch.open_input(gz)),
+          ("prefetch BGZF", lambda: prefetch.open_input(bgzf, pool)),
+          ("prefetch plain", lambda: prefetch.open_input(plain))]
+
+backend = work_ms / 1000.0 * ((nr_reads + BATCH - 1) // BATCH)
+print("Reads: {}\tUncompressed: {:.1f} MB\tThreads: {}\tBackend time: {:.2f}s".format(nr_reads, len(data) / 1e6, os.cpu_count(), backend))
+print("Input\tParse MB/s\tPipeline s\tParser blocked s\tBackend utilization")
+for name, opener in inputs:
+    dt, _ = timeit(parse, opener)
+    wall, blocked = timeit(pipeline, opener, repeat=1)
+    print("{}\t{:.1f}\t{:.2f}\t{:.2f}\t{:.0f}%".format(name, len(data) / 1e6 / dt, wall, blocked, 100 * backend / wall))
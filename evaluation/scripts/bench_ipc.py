@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Measure the inter-process communication overhead of the edlib backend. The old transport sent
+every read as a separate task with the primer dictionary pickled alongside it; the worker pool
+installs the primers once per worker and sends work units of reads referencing the context by key.
+Both transports are timed with no work in the workers (pure IPC) and with edlib primer detection,
+with the kit primers alone and with additional random primers (as with a barcode panel).
+
+Usage: bench_ipc.py [nr_reads] [threads] [work_unit]
+"""
+
+import sys
+import time
+import pickle
+import numpy as np
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads, random_seq
+from pychopper import seq_utils as seu
+from pychopper import edlib_backend, scheduler, worker_pool, utils
+from pychopper.common_structures import Seq, Hit
+from pychopper.parasail_backend import refine_locations
+
+nr_reads, threads, unit = 10000, 4, 1000
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    threads = int(sys.argv[2])
+if len(sys.argv) > 3:
+    unit = int(sys.argv[3])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+reads = [Seq(n, n, s, "5" * len(s)) for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads, median=1000)]
+max_ed = 0.3 * 1.2
+
+
+def legacy_null(params):
+    "Old transport, no work"
+    return []
+
+
+def legacy_detect(params):
+    "Old transport: one read per task with the primers and max_ed (the old backend function)"
+    read, (all_primers, max_ed) = params
+    all_locations = []
+    for primer_acc, primer_seq in all_primers.items():
+        ed, locations = edlib_backend._edlib_locations(primer_seq, read.Seq, int(max_ed * len(primer_seq)))
+        for refstart, refend in locations:
+            all_locations.append(Hit(read.Name, refstart, refend + 1, primer_acc, 0, len(primer_seq), ed / len(primer_seq)))
+    return refine_locations(read, all_primers, all_locations)
+
+
+def unit_null(params):
+    "Work units, no work"
+    return [[] for _ in params[0]]
+
+
+def run_legacy(pool, func, primers):
+    "Map one read per task as the old backend did"
+    res = list(pool.map(func, zip(reads, [(primers, max_ed)] * len(reads))))
+    assert len(res) == len(reads)
+
+
+def run_units(pool, func):
+    "Stream work units through the scheduler"
+    res = list(scheduler.stream_map(func, reads, pool, unit, 4 * threads, (max_ed, False, None)))
+    assert len(res) == len(reads)
+
+
+def sent_bytes(pool, primers, func):
+    "Size of the pickled task arguments of both transports"
+    legacy = sum(len(pickle.dumps((r, (primers, max_ed)))) for r in reads)
+    units = sum(len(pickle.dumps((pool.context_key, func, (chunk, (max_ed, False, None))))) for chunk in utils.batch(reads, unit))
+    return legacy, units
+
+
+rng = np.random.RandomState(7)
+kit_primers = seu.get_primers(primer_file)
+print("Reads: {}\tThreads: {}\tWork unit: {}".format(nr_reads, threads, unit))
+print("Primers\tWork\tTransport\tSeconds\tKB sent per 1000 reads\tSpeedup")
+for extra in (0, 96):
+    primers = dict(kit_primers)
+    for i in range(extra):
+        primers["decoy{}".format(i)] = random_seq(24, rng)
+    # Detection with the seed index disabled does the same work as the old backend:
+    with worker_pool.start_pool(threads, {"primers": primers, "min_seed_len": 1000}, log=None) as pool:
+        for work, (lfunc, ufunc) in (("none", (legacy_null, unit_null)), ("edlib", (legacy_detect, edlib_backend._find_locations_batch))):
+            t0 = time.perf_counter()
+            run_legacy(pool, lfunc, primers)
+            t_legacy = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            run_units(pool, ufunc)
+            t_units = time.perf_counter() - t0
+            lbytes, ubytes = sent_bytes(pool, primers, ufunc)
+            print("{}\t{}\tper read\t{:.3f}\t{:.1f}\t".format(len(primers), work, t_legacy, lbytes / nr_reads))
+            print("{}\t{}\twork units\t{:.3f}\t{:.1f}\t{:.2f}x".format(len(primers), work, t_units, ubytes / nr_reads, t_legacy / t_units))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare the primer location search of the bit-parallel backend (all primers and all reads of a work
+unit scanned together) against one edlib call per read and primer, on simulated SIRV cDNA reads of several
+median lengths. Checks that the locations are identical. A barcode set can be given as a primer file.
+
+Usage: bench_myers.py [nr_reads] [primer_fasta]
+"""
+
+import sys
+import edlib
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads, timeit
+from pychopper import seq_utils as seu
+from pychopper.myers_backend import MultiPrimerMatcher
+
+nr_reads = 1000
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    primer_file = sys.argv[2]
+
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+primers = seu.get_primers(primer_file)
+
+
+def edlib_locations(seqs, matcher):
+    res = []
+    for seq in seqs:
+        found = {}
+        for acc in matcher.names:
+            r = edlib.align(primers[acc], seq, mode="HW", task="locations", k=matcher.max_eds[acc])
+            if r["editDistance"] >= 0:
+                found[acc] = (r["editDistance"], r["locations"])
+        res.append(found)
+    return res
+
+
+def myers_locations(seqs, matcher, unit=1000):
+    "Scan work units as the workers do"
+    res = []
+    for i in range(0, len(seqs), unit):
+        res.extend(matcher.locations(seqs[i:i + unit]))
+    return res
+
+
+print("Reads: {}\tPrimers: {}".format(nr_reads, len(primers)))
+print("Median length\tq\tedlib s\tBit-parallel s\tSpeedup\tIdentical")
+for median in (300, 1000, 3000):
+    seqs = [s for _, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads, median=median)]
+    for q in (0.1, 0.3):
+        matcher = MultiPrimerMatcher(primers, q * 1.2)
+        t_edlib, ref = timeit(edlib_locations, seqs, matcher)
+        t_myers, res = timeit(myers_locations, seqs, matcher)
+        print("{}\t{}\t{:.3f}\t{:.3f}\t{:.2f}x\t{}".format(median, q, t_edlib, t_myers, t_edlib / t_myers, res == ref))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark writing FASTQ output: plain, gzip module and threaded BGZF.
+
+Usage: bench_output.py [nr_reads] [max_threads]
+"""
+
+import os
+import sys
+import gzip
+import tempfile
+import numpy as np
+from bench_utils import ont_read_lengths, random_seq, timeit
+from pychopper.common_structures import Seq
+from pychopper import seq_utils as seu
+from pychopper import fastx_writer
+
+nr_reads, max_threads = 50000, 8
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    max_threads = int(sys.argv[2])
+
+rng = np.random.RandomState(42)
+reads = []
+for i, l in enumerate(ont_read_lengths(nr_reads)):
+    reads.append(Seq("r{}".format(i), "r{}".format(i), random_seq(l, rng), "".join(chr(33 + q) for q in rng.randint(5, 30, size=l))))
+tmp = tempfile.mkdtemp()
+
+
+def per_record(fh):
+    for r in reads:
+        seu.writefq(r, fh)
+    fh.close()
+
+
+def batched(fh):
+    fh = fastx_writer.FastqWriter(fh)
+    for r in reads:
+        fh.write(r)
+    fh.close()
+
+
+total = sum(len(r.Seq) for r in reads)
+print("Reads: {}\tTotal bases: {:.1f} Mb".format(nr_reads, total / 1e6))
+print("Output\tSeconds\tMb/s\tSize(MB)")
+fname = os.path.join(tmp, "out.fq")
+jobs = [("plain per record", lambda: per_record(open(fname, "w")), fname),
+        ("plain batched", lambda: batched(open(fname, "w")), fname),
+        ("gzip module (level 6)", lambda: per_record(gzip.open(fname + ".gz", "wt", compresslevel=6)), fname + ".gz")]
+threads = 1
+while threads <= max_threads:
+    pool = fastx_writer.compression_pool(threads)
+    jobs.append(("BGZF {} threads".format(threads), lambda pool=pool: batched(fastx_writer.open_output(fname + ".gz", pool)), fname + ".gz"))
+    threads *= 2
+for name, job, out in jobs:
+    dt, _ = timeit(job, repeat=1)
+    print("{}\t{:.3f}\t{:.1f}\t{:.1f}".format(name, dt, total / 1e6 / dt, os.stat(out).st_size / 1e6))
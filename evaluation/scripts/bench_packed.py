@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare the packed work unit transport (sequence buffer out, hit array back) with pickling
+lists of Seq and Hit namedtuples: payload sizes, serialization time, memory held by the results
+of a work unit in the main process and wall time of edlib detection on a worker pool.
+
+Usage: bench_packed.py [nr_reads] [threads] [work_unit]
+"""
+
+import sys
+import time
+import pickle
+import tracemalloc
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads, timeit
+from pychopper import seq_utils as seu
+from pychopper import edlib_backend, packed_batch, scheduler, worker_pool, utils
+from pychopper.common_structures import Seq
+
+nr_reads, threads, unit = 10000, 4, 1000
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    threads = int(sys.argv[2])
+if len(sys.argv) > 3:
+    unit = int(sys.argv[3])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+reads = [Seq(n, "{} runid=0 read=1 ch=1 start_time=2020-01-01T00:00:00Z".format(n), s, "5" * len(s))
+         for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads, median=1000)]
+primers = seu.get_primers(primer_file)
+max_ed = 0.3 * 1.2
+chunks = list(utils.batch(reads, unit))
+
+worker_pool._init_worker({"primers": primers})
+hits = [edlib_backend._find_locations_batch((chunk, (max_ed, False, None))) for chunk in chunks]
+
+
+def roundtrip(objs):
+    "Pickle and unpickle objects, returning the total size"
+    return sum(len(pickle.dumps(pickle.loads(pickle.dumps(o)))) for o in objs)
+
+
+def held_memory(objs):
+    "Memory allocated by unpickling objects"
+    data = [pickle.dumps(o) for o in objs]
+    tracemalloc.start()
+    res = [pickle.loads(d) for d in data]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del res
+    return size
+
+
+packed_reads = [packed_batch.pack_reads(c) for c in chunks]
+packed_hits = [packed_batch.pack_hits(h) for h in hits]
+print("Reads: {}\tWork unit: {}\tHits: {}".format(nr_reads, unit, sum(len(x) for h in hits for x in h)))
+print("Payload\tFormat\tMB\tRound trip s\tPack+unpack s\tMB held")
+for name, plain, packed, pack, unpack in (
+        ("reads", chunks, packed_reads, lambda: [packed_batch.pack_reads(c) for c in chunks],
+         lambda: [packed_batch.unpack_reads(p) for p in packed_reads]),
+        ("hits", hits, packed_hits, lambda: [packed_batch.pack_hits(h) for h in hits],
+         lambda: [packed_batch.unpack_hits(c, p) for c, p in zip(chunks, packed_hits)])):
+    t_plain, size_plain = timeit(roundtrip, plain)
+    t_packed, size_packed = timeit(roundtrip, packed)
+    t_conv = timeit(pack)[0] + timeit(unpack)[0]
+    print("{}\tnamedtuples\t{:.2f}\t{:.3f}\t-\t{:.2f}".format(name, size_plain / 1e6, t_plain, held_memory(plain) / 1e6))
+    print("{}\tpacked\t{:.2f}\t{:.3f}\t{:.3f}\t{:.2f}".format(name, size_packed / 1e6, t_packed, t_conv, held_memory(packed) / 1e6))
+
+print("\nTransport\tPool wall time s")
+with worker_pool.start_pool(threads, {"primers": primers}, log=None) as pool:
+    for name, func, kwargs in (
+            ("namedtuples", edlib_backend._find_locations_batch, {}),
+            ("packed", edlib_backend._find_locations_packed,
+             {"pack": packed_batch.pack_reads, "unpack": packed_batch.unpack_hits})):
+        t0 = time.perf_counter()
+        res = list(scheduler.stream_map(func, reads, pool, unit, 4 * threads, (max_ed, False, None), **kwargs))
+        print("{}\t{:.3f}".format(name, time.perf_counter() - t0))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare the phmm backend searching whole reads with the end window mode on simulated
+SIRV cDNA reads: run time, fraction of reads falling back to a whole read search, number of
+classified reads and agreement of the resulting segments.
+
+Usage: bench_phmm_window.py [nr_reads] [E] [engine] [threads]
+"""
+
+import sys
+import time
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads
+from pychopper import utils, chopper, worker_pool
+from pychopper.common_structures import Seq
+
+nr_reads, E, engine, threads = 1000, 1.0, "nhmmscan", 2
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    E = float(sys.argv[2])
+if len(sys.argv) > 3:
+    engine = sys.argv[3]
+if len(sys.argv) > 4:
+    threads = int(sys.argv[4])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+phmm_file = path.join(base, "..", "pychopper", "phmm_data", "cDNA_SSP_VNP.hmm")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+
+
+def run(reads, pool, window=None, window_sup=None):
+    "Segment the reads, returning the run time and the segments of every read"
+    t0 = time.perf_counter()
+    stream = chopper.chopper_phmm(reads, config, E, threads, pool, 200, end_window=window, window_sup=window_sup)
+    res = [segments for _, (segments, _, _) in stream]
+    return time.perf_counter() - t0, res
+
+
+print("Reads: {}\tEngine: {}\tThreads: {}\tE: {}".format(nr_reads, engine, threads, E))
+print("Error rate\tWindow\tWhole s\tEnds s\tSpeedup\tFallback\tClassified whole\tClassified ends\tSame segments")
+with worker_pool.start_pool(threads, {"phmm_file": phmm_file, "phmm_engine": engine}, log=None) as pool:
+    for error_rate in (0.03, 0.06, 0.1):
+        reads = [Seq(n, n, s, None) for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads,
+                                                                    error_rate=error_rate, median=1500)]
+        t_full, full = run(reads, pool)
+        for window in (100, 150, 300):
+            window_sup = {"ends": 0, "fallback": 0, "short": 0}
+            t_ends, ends = run(reads, pool, window, window_sup)
+            windowed = window_sup["ends"] + window_sup["fallback"]
+            print("{}\t{}\t{:.2f}\t{:.2f}\t{:.2f}x\t{:.1f}%\t{}\t{}\t{:.2f}%".format(
+                error_rate, window, t_full, t_ends, t_full / t_ends, 100.0 * window_sup["fallback"] / max(windowed, 1),
+                sum(len(s) == 1 for s in full), sum(len(s) == 1 for s in ends),
+                100.0 * sum(a == b for a, b in zip(full, ends)) / nr_reads))
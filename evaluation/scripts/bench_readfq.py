@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare the throughput of the line based seq_utils.readfq parser and the
+block-buffered fastx_reader.readfx parser.
+
+Usage: bench_readfq.py [input_fastq]
+A synthetic FASTQ is generated if no input is given.
+"""
+
+import os
+import sys
+import tempfile
+from bench_utils import timeit, write_random_fastq
+from pychopper import seq_utils as seu
+from pychopper import fastx_reader
+
+if len(sys.argv) > 1:
+    fname = sys.argv[1]
+else:
+    fname = os.path.join(tempfile.mkdtemp(), "bench.fq")
+    write_random_fastq(fname, 50000)
+size = os.stat(fname).st_size
+
+
+def run_readfq(min_qual):
+    with open(fname, "r") as fh:
+        return sum(1 for _ in seu.readfq(fh, min_qual=min_qual))
+
+
+def run_readfx(min_qual):
+    with open(fname, "rb") as fh:
+        return sum(1 for _ in fastx_reader.readfx(fh, min_qual=min_qual))
+
+
+print("Input: {} ({:.1f} MB)".format(fname, size / 1e6))
+print("Parser\tmin_qual\tReads\tSeconds\tMB/s")
+for min_qual in (None, 7.0):
+    for name, func in (("readfq", run_readfq), ("readfx", run_readfx)):
+        dt, nr = timeit(func, min_qual)
+        print("{}\t{}\t{}\t{:.3f}\t{:.1f}".format(name, min_qual, nr, dt, size / 1e6 / dt))
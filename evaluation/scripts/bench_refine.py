@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare parasail refinement of edlib primer locations: refine_locations (traceback of every
+location, start offsets parsed from the cigar string) against refine_locations_profiled with cached
+primer profiles, with and without the score-only pass at the cutoff. Checks that the hits are identical.
+
+Usage: bench_refine.py [nr_reads]
+"""
+
+import sys
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads, timeit
+from pychopper import seq_utils as seu
+from pychopper import parasail_backend as pb
+from pychopper import edlib_backend, worker_pool
+from pychopper.common_structures import Seq
+
+nr_reads = 2000
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+reads = [Seq(n, n, s, None) for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads, median=1000)]
+primers = seu.get_primers(primer_file)
+worker_pool._init_worker({"primers": primers, "min_seed_len": 1000})
+
+
+def locations(read, max_ed):
+    "Unrefined edlib locations of all primers"
+    res = []
+    for acc, seq in primers.items():
+        ed, locs = edlib_backend._edlib_locations(seq, read.Seq, int(max_ed * len(seq)))
+        res.extend(pb.Hit(read.Name, s, e + 1, acc, 0, len(seq), ed / len(seq)) for s, e in locs)
+    return res
+
+
+def old(cases):
+    return [pb.refine_locations(r, primers, locs) for r, locs in cases]
+
+
+def profiled(cases, max_score=None):
+    profiles = pb.ProfileCache(primers, pb.DEFAULT_SUBS_MAT)
+    return [pb.refine_locations_profiled(r, primers, locs, profiles, max_score=max_score) for r, locs in cases]
+
+
+print("Reads: {}".format(nr_reads))
+print("q\tLocations\tPassing\tOld s\tProfiled s\tScore-first s\tSpeedup\tIdentical")
+for q in (0.1, 0.2, 0.3, 0.4):
+    cases = [(r, locations(r, q * 1.2)) for r in reads]
+    t_old, ref = timeit(old, cases)
+    t_prof, res_prof = timeit(profiled, cases)
+    t_first, res_first = timeit(profiled, cases, q)
+    n = sum(len(x) for x in ref)
+    passing = [[h for h in x if h.Score <= q] for x in ref]
+    ok = res_prof == ref and res_first == passing
+    print("{}\t{}\t{:.1f}%\t{:.3f}\t{:.3f}\t{:.3f}\t{:.2f}x\t{}".format(
+        q, n, 100.0 * sum(len(x) for x in passing) / max(n, 1), t_old, t_prof, t_first, t_old / min(t_prof, t_first), ok))
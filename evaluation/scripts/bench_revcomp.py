@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark reverse complement implementations on ONT-like read length distributions: the legacy
+per base version, compact_seq.reverse_complement, and sequences kept as ascii bytes (CompactSeq) or as
+2-bit codes, four bases per byte (PackedSeq).
+
+Usage: bench_revcomp.py [nr_reads] [median_length]
+"""
+
+import sys
+import numpy as np
+from six.moves import reduce
+from bench_utils import ont_read_lengths, random_seq, timeit
+from pychopper import seq_utils as seu
+from pychopper import compact_seq
+
+nr_reads, median = 2000, 1000
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    median = int(sys.argv[2])
+
+
+def legacy_reverse_complement(seq):
+    "The reverse complement as implemented before compact_seq"
+    if len(seq) == 0:
+        return seq
+    return reduce(lambda x, y: x + y, map(seu.base_complement, seq[::-1]))
+
+
+# 2-bit codes: A=0, C=1, G=2, T=3. The complement of a code is code ^ 3.
+_CODES = np.full(256, 255, dtype=np.uint8)
+for _i, _b in enumerate("ACGT"):
+    _CODES[ord(_b)] = _i
+_BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+
+class CompactSeq(object):
+    "A DNA sequence stored as ascii bytes"
+
+    __slots__ = ('data',)
+
+    def __init__(self, seq):
+        if isinstance(seq, str):
+            seq = seq.encode('ascii')
+        self.data = bytes(seq)
+
+    def __str__(self):
+        return self.data.decode('ascii')
+
+    def reverse_complement(self):
+        "Return the reverse complement"
+        return CompactSeq(compact_seq.reverse_complement(self.data))
+
+    def pack(self):
+        "Convert to 2-bit packed representation"
+        return PackedSeq.from_bytes(self.data)
+
+
+class PackedSeq(object):
+    """ A DNA sequence stored as 2-bit codes, four bases per byte. Characters other than
+    ACGT are stored separately as (position, character) arrays.
+    """
+
+    __slots__ = ('packed', 'length', 'other_pos', 'other_chr')
+
+    def __init__(self, packed, length, other_pos, other_chr):
+        self.packed = packed
+        self.length = length
+        self.other_pos = other_pos
+        self.other_chr = other_chr
+
+    @classmethod
+    def from_bytes(cls, data):
+        "Pack an ascii byte string"
+        raw = np.frombuffer(data, dtype=np.uint8)
+        codes = _CODES[raw]
+        other = np.flatnonzero(codes == 255)
+        other_chr = raw[other].copy()
+        codes[other] = 0
+        return cls(_pack_codes(codes), len(raw), other, other_chr)
+
+    def codes(self):
+        "Return the unpacked 2-bit codes"
+        p = self.packed
+        return np.stack([(p >> s) & 3 for s in (0, 2, 4, 6)], axis=1).ravel()[:self.length]
+
+    def __str__(self):
+        raw = _BASES[self.codes()]
+        raw[self.other_pos] = self.other_chr
+        return raw.tobytes().decode('ascii')
+
+    def reverse_complement(self):
+        "Return the reverse complement"
+        codes = self.codes()[::-1] ^ 3
+        pos = self.length - 1 - self.other_pos[::-1]
+        other_chr = np.frombuffer(compact_seq.reverse_complement(self.other_chr.tobytes()), dtype=np.uint8)
+        return PackedSeq(_pack_codes(codes), self.length, pos, other_chr)
+
+
+def _pack_codes(codes):
+    "Pack an array of 2-bit codes, four codes per byte"
+    c = np.zeros(4 * ((len(codes) + 3) // 4), dtype=np.uint8)
+    c[:len(codes)] = codes
+    c = c.reshape(-1, 4)
+    return c[:, 0] | (c[:, 1] << 2) | (c[:, 2] << 4) | (c[:, 3] << 6)
+
+
+rng = np.random.RandomState(42)
+lens = ont_read_lengths(nr_reads, median=median)
+seqs = [random_seq(length, rng) for length in lens]
+compact = [CompactSeq(s) for s in seqs]
+packed = [c.pack() for c in compact]
+for s in ("AACGTNx-", seqs[0]):
+    assert str(CompactSeq(s).reverse_complement()) == str(CompactSeq(s).pack().reverse_complement()) == legacy_reverse_complement(s)
+total = float(sum(lens))
+
+print("Reads: {}\tMedian length: {}\tMax length: {}\tTotal: {:.1f} Mb".format(nr_reads, int(np.median(lens)), max(lens), total / 1e6))
+print("Method\tSeconds\tMb/s\tBytes/base")
+for name, func, data, size in (
+        ("legacy reduce", legacy_reverse_complement, seqs, 1.0),
+        ("str translate", compact_seq.reverse_complement, seqs, 1.0),
+        ("CompactSeq", CompactSeq.reverse_complement, compact, 1.0),
+        ("PackedSeq", PackedSeq.reverse_complement, packed, 0.25)):
+    dt, _ = timeit(lambda: [func(s) for s in data], repeat=1 if name.startswith("legacy") else 3)
+    print("{}\t{:.3f}\t{:.1f}\t{}".format(name, dt, total / 1e6 / dt, size))
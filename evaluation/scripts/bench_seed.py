@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare primer detection in the edlib backend with and without the k-mer seed index on
+simulated SIRV cDNA reads, checking that the hits are identical.
+
+Usage: bench_seed.py [nr_reads] [median_length]
+"""
+
+import sys
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads, timeit
+from pychopper import seq_utils as seu
+from pychopper import edlib_backend, worker_pool
+from pychopper.seed_index import SeedIndex
+from pychopper.common_structures import Seq
+
+nr_reads, median = 2000, 1000
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    median = int(sys.argv[2])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+reads = [Seq(n, n, s, None) for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads, median=median)]
+primers = seu.get_primers(primer_file)
+
+
+def detect(max_ed, unit=1000):
+    "Run detection on work units as the workers do"
+    res = []
+    for i in range(0, len(reads), unit):
+        res.extend(edlib_backend._find_locations_batch((reads[i:i + unit], (max_ed, True, None))))
+    return res
+
+
+print("Reads: {}\tMedian length: {}".format(nr_reads, median))
+print("q\tSeeded primers\tFull scan s\tSeeded s\tSpeedup\tIdentical hits")
+for q in (0.05, 0.1, 0.15, 0.2, 0.3):
+    max_ed = q * 1.2
+    worker_pool._init_worker({"primers": primers, "min_seed_len": 1000})
+    t_full, full = timeit(detect, max_ed)
+    worker_pool._init_worker({"primers": primers})
+    t_seed, seeded = timeit(detect, max_ed)
+    nr_seeded = len(SeedIndex(primers, max_ed).seeded)
+    print("{}\t{}/{}\t{:.3f}\t{:.3f}\t{:.2f}x\t{}".format(q, nr_seeded, len(primers), t_full, t_seed, t_full / t_seed, full == seeded))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare segmenting the reads one at a time (process_hits and analyse_hits) with the batch
+segmentation engine on the edlib hits of simulated SIRV cDNA reads: time per read for several
+batch sizes and number of reads segmented differently, and time per read of scoring the autotuning
+cutoffs from the hit columns.
+
+Usage: bench_segmentation.py [nr_reads] [q]
+"""
+
+import sys
+import numpy as np
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads, timeit
+from pychopper import seq_utils as seu
+from pychopper import chopper, utils, worker_pool, edlib_backend, autotune
+from pychopper.alignment_hits import process_hits
+from pychopper.batch_segmentation import segment_batch
+from pychopper.common_structures import Seq
+
+nr_reads, q = 20000, 0.3
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    q = float(sys.argv[2])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+worker_pool._init_worker({"primers": seu.get_primers(primer_file)})
+
+
+def per_read(hit_lists):
+    return [chopper.analyse_hits(process_hits(hits, q), config) for hits in hit_lists]
+
+
+def score_per_read(hit_lists, cutoffs):
+    "Score cutoffs segmenting every read on its own"
+    class_reads = np.zeros(len(cutoffs), dtype=int)
+    for hits in hit_lists:
+        for i, qv in enumerate(cutoffs):
+            if len([x for x in chopper.analyse_hits(process_hits(hits, qv), config)[0] if x.Len > 0]) == 1:
+                class_reads[i] += 1
+    return class_reads
+
+
+def batched(hit_lists, size):
+    res = []
+    for i in range(0, len(hit_lists), size):
+        res.extend(segment_batch(hit_lists[i:i + size], config, q))
+    return res
+
+
+print("Reads: {}\tq: {}".format(nr_reads, q))
+print("Error rate\tHits per read\tPer read us\tBatch size\tBatch us\tSpeedup\tChanged reads")
+for error_rate in (0.01, 0.06, 0.1):
+    reads = [Seq(n, n, s, None) for n, s in simulate_cdna_reads(transcripts, read_fasta(primer_file), nr_reads,
+                                                                error_rate=error_rate, median=1000)]
+    hit_lists = edlib_backend._find_locations_batch((reads, (q * 1.2, False, q)))
+    t_loop, expected = timeit(per_read, hit_lists)
+    for size in (100, 1000, 10000):
+        t_batch, res = timeit(batched, hit_lists, size)
+        print("{}\t{:.2f}\t{:.2f}\t{}\t{:.2f}\t{:.2f}x\t{}".format(
+            error_rate, sum(len(h) for h in hit_lists) / nr_reads, t_loop * 1e6 / nr_reads, size,
+            t_batch * 1e6 / nr_reads, t_loop / t_batch, sum(a != b for a, b in zip(expected, res))))
+
+cutoffs = np.linspace(0.0, 1.0, num=20)
+t_loop, expected = timeit(score_per_read, hit_lists, cutoffs)
+t_batch, (res, _) = timeit(autotune.score_cutoffs, hit_lists, cutoffs, config)
+print("Scoring {} cutoffs: per read {:.2f} us, batch {:.2f} us ({:.2f}x), same counts: {}".format(
+    len(cutoffs), t_loop * 1e6 / nr_reads, t_batch * 1e6 / nr_reads, t_loop / t_batch, bool((expected == res).all())))
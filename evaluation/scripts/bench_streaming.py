@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Measure wall time and peak RSS of the pychopper command line (edlib backend) on simulated
+inputs of increasing size. With the streaming scheduler peak RSS should stay flat as the input
+grows, unless a single work unit (-B) covers the whole input.
+
+Usage: bench_streaming.py [nr_reads] [threads]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess as sp
+from os import path
+from bench_utils import read_fasta, simulate_cdna_reads, write_fastq
+
+nr_reads, threads = 5000, 4
+if len(sys.argv) > 1:
+    nr_reads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    threads = int(sys.argv[2])
+
+base = path.join(path.dirname(path.abspath(__file__)), "..")
+primer_file = path.join(base, "..", "pychopper", "primer_data", "cDNA_SSP_VNP.fas")
+transcripts = read_fasta(path.join(base, "data", "sirv_transcriptome.fas"))
+tmp = tempfile.mkdtemp()
+
+
+def run(fastq, extra):
+    "Run pychopper and return wall time and peak RSS in MB"
+    cmd = [sys.executable, "-m", "pychopper.scripts.pychopper", "-m", "edlib", "-q", "0.3", "-t", str(threads),
+           "-r", path.join(tmp, "report.pdf"), "-S", path.join(tmp, "stats.tsv")] + extra + [fastq, path.join(tmp, "out.fq")]
+    t0 = time.perf_counter()
+    proc = sp.Popen(cmd, stdout=sp.DEVNULL, stderr=sp.DEVNULL)
+    _, _, usage = os.wait4(proc.pid, 0)
+    return time.perf_counter() - t0, usage.ru_maxrss / 1024.0
+
+
+print("Reads\tOptions\tSeconds\tPeak RSS (MB)")
+for factor in (1, 4, 8):
+    n = nr_reads * factor
+    fastq = path.join(tmp, "sim_{}.fq".format(n))
+    write_fastq(fastq, simulate_cdna_reads(transcripts, read_fasta(primer_file), n, median=1000))
+    for extra in ([], ["-B", str(n), "-F", "1"]):
+        dt, rss = run(fastq, extra)
+        print("{}\t{}\t{:.2f}\t{:.1f}".format(n, " ".join(extra) or "default", dt, rss))
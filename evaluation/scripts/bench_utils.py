@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Helpers shared by the benchmark scripts: synthetic ONT-like reads and timing.
+"""
+
+import time
+import numpy as np
+from pychopper.tests.helpers import mutate
+
+BASES = np.array(list("ACGT"))
+
+
+def ont_read_lengths(n, median=1000, sigma=0.8, max_len=200000, seed=42):
+    "Draw read lengths from a log-normal distribution resembling ONT cDNA runs"
+    rng = np.random.RandomState(seed)
+    lens = rng.lognormal(np.log(median), sigma, size=n).astype(int)
+    return np.clip(lens, 50, max_len)
+
+
+def random_seq(length, rng):
+    "Generate a random DNA sequence"
+    return "".join(BASES[rng.randint(0, 4, size=length)])
+
+
+def write_random_fastq(fname, n, median=1000, seed=42):
+    "Write n random FASTQ records to a file and return the total number of bases"
+    rng = np.random.RandomState(seed)
+    total = 0
+    with open(fname, "w") as fh:
+        for i, l in enumerate(ont_read_lengths(n, median=median, seed=seed)):
+            qual = "".join(chr(33 + q) for q in rng.randint(2, 40, size=l))
+            fh.write("@read_{} runid=bench ch={}\n{}\n+\n{}\n".format(i, i % 512, random_seq(l, rng), qual))
+            total += l
+    return total
+
+
+def timeit(func, *args, repeat=3, **kwargs):
+    "Return the best wall clock time of repeated function calls and the result of the last call"
+    best, res = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = func(*args, **kwargs)
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, res
+
+
+def read_fasta(fname):
+    "Load sequences from a FASTA file into a dictionary"
+    res, name = {}, None
+    with open(fname, "r") as fh:
+        for line in fh:
+            line = line.strip()
+            if line.startswith(">"):
+                name = line[1:].split(" ", 1)[0]
+                res[name] = []
+            elif name is not None:
+                res[name].append(line)
+    return {k: "".join(v) for k, v in res.items()}
+
+
+def revcomp(seq):
+    "Reverse complement a DNA sequence"
+    return seq[::-1].translate(str.maketrans("ACGTacgt", "TGCAtgca"))
+
+
+def simulate_cdna_reads(transcripts, primers, n, error_rate=0.06, seed=42, missing_prop=0.1, concat_prop=0.03, median=None):
+    """ Simulate full-length cDNA reads: SSP + transcript + reverse complement of VNP, randomly oriented,
+    with short random flanks, some reads missing a primer and some concatemers.
+    Returns a list of (name, sequence) tuples.
+    """
+    rng = np.random.RandomState(seed)
+    names = sorted(transcripts.keys())
+    ssp, vnp = primers["SSP"], primers["VNP"]
+    lens = None if median is None else ont_read_lengths(n, median=median, seed=seed)
+    res = []
+    for i in range(n):
+        parts = []
+        for _ in range(2 if rng.rand() < concat_prop else 1):
+            tr = transcripts[names[rng.randint(0, len(names))]]
+            if lens is not None:
+                tr = (tr * (1 + lens[i] // len(tr)))[:lens[i]]
+            parts.append(ssp + tr + revcomp(vnp))
+        seq = "".join(parts)
+        if rng.rand() < missing_prop:
+            seq = seq[rng.randint(len(ssp), 2 * len(ssp)):]
+        if rng.rand() < 0.5:
+            seq = revcomp(seq)
+        seq = random_seq(rng.randint(0, 30), rng) + mutate(seq, error_rate, rng) + random_seq(rng.randint(0, 30), rng)
+        res.append(("sim_{}".format(i), seq))
+    return res
+
+
+def write_fastq(fname, reads, qual="5"):
+    "Write (name, sequence) tuples to a FASTQ file"
+    with open(fname, "w") as fh:
+        for name, seq in reads:
+            fh.write("@{}\n{}\n+\n{}\n".format(name, seq, qual * len(seq)))
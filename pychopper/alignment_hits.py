@@ -18,3 +18,14 @@ def process_hits(hits, max_score):
             else:
                 res.append(hit)
     return tuple(res)
+
+
+def merge_hits(primary, secondary):
+    """ Merge processed hits of two backends, the scores of which cannot be compared.
+    Hits of the secondary backend are kept and replace the overlapping hits of the primary one.
+    """
+    res = list(secondary)
+    for hit in primary:
+        if all(hit.RefEnd <= other.RefStart or other.RefEnd <= hit.RefStart for other in secondary):
+            res.append(hit)
+    return tuple(sorted(res, key=lambda x: (x.RefStart, x.RefEnd)))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from pychopper import hmmer_backend, edlib_backend, myers_backend
+from pychopper.batch_segmentation import hit_columns, segment_columns, strand_table
+
+""" Tuning of the cutoff parameter. The primers are detected once using the loosest cutoff
+and every candidate cutoff is scored by filtering the cached hits and re-running segmentation.
+"""
+
+
+def score_cutoffs(batch_hits, cutoffs, config, select=None):
+    """ Count the reads with a single usable segment and their total length for every cutoff.
+
+    :param batch_hits: Iterable of hit lists detected at the loosest cutoff.
+    :param cutoffs: Candidate cutoff values.
+    :param config: Primer configurations.
+    :param select: Optional function selecting the hits reported by the backend at a given cutoff.
+    :returns: Arrays with the number of classified reads and classified bases per cutoff.
+    :rtype: tuple
+    """
+    class_reads = np.zeros(len(cutoffs), dtype=int)
+    class_lens = np.zeros(len(cutoffs), dtype=int)
+    batch_hits = [hits for hits in batch_hits if len(hits) > 0]
+    columns = hit_columns(batch_hits) if select is None else None
+    for i, qv in enumerate(cutoffs):
+        if select is not None:
+            columns = hit_columns([select(hits, qv) for hits in batch_hits])
+        res = segment_columns(*columns[:5], strand_table(columns[5], config), qv)
+        lengths, counts = res[5], res[6]
+        # Reads with a single usable segment, the segments of a read being consecutive:
+        single = counts == 1
+        class_reads[i] = single.sum()
+        class_lens[i] = lengths[(np.cumsum(counts) - counts)[single]].sum()
+    return class_reads, class_lens
+
+
+def tune_phmm(reads, config, cutoffs, pool, min_batch):
+    "Score cutoffs using the profile HMM backend"
+    batch_hits = hmmer_backend.find_locations(reads, E=max(cutoffs), pool=pool, min_batch=min_batch)
+    return score_cutoffs(batch_hits, cutoffs, config)
+
+
+def tune_edlib(reads, primers, config, cutoffs, ed_factor, pool, min_batch, method="edlib"):
+    """ Score cutoffs using the edlib/parasail backend, the edlib max_ed being the cutoff times ed_factor.
+    The primer locations are found by the bit-parallel search if method is "myers".
+    The pool has to be started with the same primers.
+    """
+    backend = myers_backend if method == "myers" else edlib_backend
+    batch_hits = backend.find_locations(reads, max_ed=max(cutoffs) * ed_factor, pool=pool,
+                                        min_batch=min_batch, edit_distances=True, max_score=max(cutoffs))
+
+    def select(hits, qv):
+        return edlib_backend.within_max_ed(hits, primers, qv * ed_factor)
+
+    return score_cutoffs(batch_hits, cutoffs, config, select)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from pychopper.common_structures import Segment
+
+""" Segmentation of all reads of a batch at once, giving the same results as running
+alignment_hits.process_hits and chopper.analyse_hits on every read. The hits are flattened
+to CSR style columns (read offsets, coordinates, integer primer ids and scores).
+
+Overlap removal keeps a hit unless the next hit of the read passing the cutoff overlaps it with
+a lower score, as the last kept hit of process_hits is always the previous hit. Consecutive kept
+hits form the segments, their strand looked up in a primer id by primer id table. The
+include/exclude dynamic programming and its traceback are sequential within a read, so they
+run one segment position at a time over all reads having a segment at that position.
+"""
+
+
+def hit_columns(hit_lists):
+    """ Flatten lists of hits to CSR columns.
+
+    :param hit_lists: List of hit lists, one per read.
+    :returns: Read offsets, hit start, hit end, primer id, score arrays, the primer names indexed by id and the flat list of hits.
+    :rtype: tuple
+    """
+    offsets = np.zeros(len(hit_lists) + 1, dtype=np.int64)
+    np.cumsum(list(map(len, hit_lists)), out=offsets[1:])
+    flat = [hit for hits in hit_lists for hit in hits]
+    if len(flat) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return offsets, empty, empty, empty, np.zeros(0, dtype=np.float64), (), flat
+    _, starts, ends, queries, _, _, scores = zip(*flat)
+    names = tuple(dict.fromkeys(queries))
+    ids = {name: i for i, name in enumerate(names)}
+    primer = np.fromiter(map(ids.__getitem__, queries), dtype=np.int64, count=len(queries))
+    return (offsets, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64), primer,
+            np.array(scores, dtype=np.float64), names, flat)
+
+
+# Strands of the segment strand codes, 0 marking primer pairs which are not in the config:
+STRANDS = (None, "+", "-")
+
+
+def strand_table(names, config):
+    "Table of segment strand codes indexed by the primer ids of the first and second hit"
+    ids = {name: i for i, name in enumerate(names)}
+    table = np.zeros((len(names), len(names)), dtype=np.int8)
+    for (first, second), strand in config.items():
+        if first in ids and second in ids:
+            table[ids[first], ids[second]] = STRANDS.index(strand)
+    return table
+
+
+def _by_position(pos):
+    "Indices grouped by position and the bounds of every group"
+    order = np.argsort(pos, kind="stable")
+    bounds = np.searchsorted(pos[order], np.arange(int(pos.max()) + 2) if len(pos) > 0 else [0])
+    return order, bounds
+
+
+def segment_columns(offsets, starts, ends, primer, scores, table, cutoff=None):
+    """ Segment a batch of reads given as hit columns (see hit_columns).
+
+    :param offsets: Read offsets in the hit columns.
+    :param starts: Hit start coordinates.
+    :param ends: Hit end coordinates.
+    :param primer: Primer ids.
+    :param scores: Hit scores.
+    :param table: Segment strand codes by primer ids (see strand_table).
+    :param cutoff: Score cutoff of process_hits (None if the hits are processed already).
+    :returns: Indices of the kept hits by read, the number of kept hits per read, the hit indices of the
+        included segments (first and second hit, in the output order of analyse_hits), the segment strand codes
+        (see STRANDS) and lengths, the number of included segments per read and the last DP row per read.
+    :rtype: tuple
+    """
+    nr_reads = len(offsets) - 1
+    read = np.repeat(np.arange(nr_reads), np.diff(offsets))
+    kept = np.arange(len(starts))
+    if cutoff is not None:
+        # Sort by start and end within reads, keeping the input order of ties as sorted() does:
+        kept = np.lexsort((ends, starts, read))
+        kept = kept[~(scores[kept] > cutoff)]
+        prev, nxt = kept[:-1], kept[1:]
+        replaced = (read[nxt] == read[prev]) & (ends[prev] > starts[nxt]) & (scores[nxt] < scores[prev])
+        kept = kept[np.append(~replaced, True)] if len(kept) > 0 else kept
+    kept_counts = np.bincount(read[kept], minlength=nr_reads)
+
+    # Segments between consecutive kept hits of a read:
+    same = read[kept[1:]] == read[kept[:-1]]
+    first, second = kept[:-1][same], kept[1:][same]
+    strand = table[primer[first], primer[second]] if len(first) > 0 else np.zeros(0, dtype=np.int8)
+    length = np.where(strand > 0, starts[second] - ends[first], 0)
+    seg_counts = np.maximum(kept_counts - 1, 0)
+    seg_offsets = np.zeros(nr_reads + 1, dtype=np.int64)
+    np.cumsum(seg_counts, out=seg_offsets[1:])
+    seg_read = np.repeat(np.arange(nr_reads), seg_counts)
+    pos = np.arange(len(first)) - seg_offsets[seg_read]
+
+    # Fill in the DP rows (excluded, included) one position at a time:
+    excluded = np.zeros(len(first), dtype=np.int64)
+    included = np.where(pos == 0, length, 0).astype(np.int64)
+    order, bounds = _by_position(pos)
+    for j in range(1, len(bounds) - 1):
+        idx = order[bounds[j]:bounds[j + 1]]
+        excluded[idx] = np.maximum(excluded[idx - 1], included[idx - 1])
+        included[idx] = excluded[idx - 1] + length[idx]
+    best_included = included > excluded
+
+    # Traceback from the last segment of every read, an included segment being preceded by an excluded one:
+    last = seg_offsets[1:][seg_counts > 0] - 1
+    state = np.zeros(len(first), dtype=bool)
+    state[last] = best_included[last]
+    rpos = seg_counts[seg_read] - 1 - pos
+    order, bounds = _by_position(rpos)
+    for j in range(1, len(bounds) - 1):
+        idx = order[bounds[j]:bounds[j + 1]]
+        state[idx] = best_included[idx] & ~state[idx + 1]
+    tlen = np.zeros(nr_reads, dtype=np.int64)
+    tlen[seg_counts > 0] = best_included[last]
+
+    # Included segments with a positive length, last position first within a read:
+    sel = np.nonzero(state & (length > 0))[0]
+    sel = sel[np.lexsort((-pos[sel], seg_read[sel]))]
+    return (kept, kept_counts, first[sel], second[sel], strand[sel], length[sel],
+            np.bincount(seg_read[sel], minlength=nr_reads), tlen)
+
+
+def segment_batch(hit_lists, config, cutoff=None):
+    """ Segment a batch of reads, giving the same results as analyse_hits(process_hits(hits, cutoff), config) for every read.
+
+    :param hit_lists: List of hit lists, one per read.
+    :param config: Primer configurations.
+    :param cutoff: Score cutoff (None if the hits are processed already).
+    :returns: List of (segments, hits, tlen) tuples.
+    :rtype: list
+    """
+    offsets, starts, ends, primer, scores, names, flat = hit_columns(hit_lists)
+    kept, kept_counts, first, second, strand, length, seg_counts, tlen = segment_columns(
+        offsets, starts, ends, primer, scores, strand_table(names, config), cutoff)
+    segments = [Segment(*x) for x in zip(starts[first].tolist(), ends[first].tolist(), starts[second].tolist(),
+                                         ends[second].tolist(), [STRANDS[s] for s in strand.tolist()], length.tolist())]
+    kept_hits = [flat[i] for i in kept.tolist()]
+    hit_bounds = np.concatenate(([0], np.cumsum(kept_counts))).tolist()
+    seg_bounds = np.concatenate(([0], np.cumsum(seg_counts))).tolist()
+    tlen = tlen.tolist()
+    res = [((), (), 0)] * len(kept_counts)
+    # Reads with less than two kept hits have no segments:
+    for r in np.nonzero(kept_counts >= 2)[0].tolist():
+        res[r] = (tuple(segments[seg_bounds[r]:seg_bounds[r + 1]]), tuple(kept_hits[hit_bounds[r]:hit_bounds[r + 1]]), tlen[r])
+    return res
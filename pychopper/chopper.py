@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import time
 import numpy as np
-from pychopper import seq_utils as seu
-from pychopper import hmmer_backend, edlib_backend
-from pychopper.common_structures import Segment, Seq
-from pychopper.alignment_hits import process_hits
+from functools import partial
+from pychopper import compact_seq, utils, columnar
+from pychopper import hmmer_backend, edlib_backend, myers_backend, scheduler, packed_batch, phmm_topology
+from pychopper.exact_match import PrimerAutomaton
+from pychopper.worker_pool import get_context
+from pychopper.common_structures import Hit, Segment, Seq
+from pychopper.alignment_hits import process_hits, merge_hits
+from pychopper.batch_segmentation import segment_batch
 
 
 def _build_segments(hits, config):
@@ -90,23 +95,256 @@ def segments_to_reads(read, segments, keep_primers):
         if len(segments) > 1:
             sr_name += " rescue=1"
         sr_seq = read.Seq[Start:End]
-        sr = Seq(sr_id + read.Id, sr_name, sr_seq, read.Qual[Start:End] if read.Qual is not None else None)
+        sr_qual = read.Qual[Start:End] if read.Qual is not None else None
         if s.Strand == '-':
-            sr = seu.revcomp_seq(sr)
-        yield sr
+            sr_seq = compact_seq.reverse_complement(sr_seq)
+            if sr_qual is not None:
+                sr_qual = sr_qual[::-1]
+        yield Seq(sr_id + read.Id, sr_name, sr_seq, sr_qual)
 
 
-def chopper_phmm(reads, phmm_file, config, cutoff, threads, pool, min_batch):
-    "Segment using the profile HMM backend"
-    batch_hits = hmmer_backend.find_locations(reads, phmm_file, E=cutoff, pool=pool, min_batch=min_batch)
-    for i, hits in enumerate(batch_hits):
-        hits = process_hits(hits, cutoff)
-        yield reads[i], analyse_hits(hits, config)
+# Suffix of the read ids given to tail windows, so that head and tail hits are not merged by the backend:
+_TAIL_SUFFIX = ":tail"
 
 
-def chopper_edlib(reads, primers, config, max_ed, cutoff, pool, min_batch):
-    "Segment using the edlib/parasail backend"
-    batch_hits = edlib_backend.find_locations(reads, primers, max_ed=max_ed, pool=pool, min_batch=min_batch)
-    for i, hits in enumerate(batch_hits):
-        hits = process_hits(hits, cutoff)
-        yield reads[i], analyse_hits(hits, config)
+def _window_reads(read, window):
+    "Head and tail windows of a read"
+    tail = len(read.Seq) - window
+    return [Seq(read.Id, read.Name, read.Seq[:window], None),
+            Seq(read.Id + _TAIL_SUFFIX, read.Name, read.Seq[tail:], None)]
+
+
+def _shift_hits(hits, read, offset):
+    "Map hits in a tail window back to read coordinates"
+    return [h._replace(Ref=read.Id if h.Ref == read.Id + _TAIL_SUFFIX else h.Ref,
+                       RefStart=h.RefStart + offset, RefEnd=h.RefEnd + offset) for h in hits]
+
+
+def _window_clipped(head, tail, window, cutoff):
+    "Check whether a hit passing the cutoff reaches the inner end of its window, where the primer may be cut"
+    return any(h.Score <= cutoff and h.RefEnd >= window for h in head) or any(h.Score <= cutoff and h.RefStart <= 1 for h in tail)
+
+
+def _scale_evalues(hits, read, window):
+    "Scale the E-values of nhmmscan hits in a window to the length of the read, as if searched as a whole"
+    scale = len(read.Seq) / window
+    return [h._replace(Score=float("{:.2g}".format(h.Score * scale))) for h in hits]
+
+
+def _detect_edlib(reads, params):
+    return edlib_backend._find_locations_batch((reads, params))
+
+
+def _detect_myers(reads, params):
+    return myers_backend._find_locations_batch((reads, params))
+
+
+def _detect_phmm(reads, params):
+    if len(reads) == 0:
+        return []
+    return [list(h) for h in hmmer_backend._find_locations_single((reads, params))]
+
+
+_DETECTORS = {"edlib": _detect_edlib, "myers": _detect_myers, "phmm": _detect_phmm}
+_WINDOW_STATUSES = ("ends", "fallback", "short")
+_STATUSES = _WINDOW_STATUSES + ("exact", "full")
+
+
+def _end_window_batch(params):
+    """ Detect primers in the head and tail windows of the reads in a work unit. Reads for which the
+    window hits do not give a single usable segment, or reach the inner end of a window, are searched
+    again as a whole. The E-values of phmm window hits are scaled to the read length. Returns a list of
+    (hits, status) pairs, status being one of "ends", "fallback" or "short".
+    """
+    reads, (method, det_params, config, cutoff, window) = params
+    detect = _DETECTORS[method]
+    res = [None] * len(reads)
+    long_idx = [i for i, r in enumerate(reads) if len(r.Seq) > 2 * window]
+    win_hits = iter(detect([w for i in long_idx for w in _window_reads(reads[i], window)], det_params))
+    full_idx = [i for i, r in enumerate(reads) if len(r.Seq) <= 2 * window]
+    found = []
+    for i in long_idx:
+        read = reads[i]
+        head, tail = list(next(win_hits)), list(next(win_hits))
+        if method == "phmm":
+            # nhmmscan E-values grow with the length of the searched sequence:
+            head, tail = _scale_evalues(head, read, window), _scale_evalues(tail, read, window)
+        if _window_clipped(head, tail, window, cutoff):
+            full_idx.append(i)
+        else:
+            found.append((i, head + _shift_hits(tail, read, len(read.Seq) - window)))
+    for (i, hits), (segments, _, _) in zip(found, segment_batch([hits for _, hits in found], config, cutoff)):
+        if len(segments) == 1:
+            res[i] = (hits, "ends")
+        else:
+            full_idx.append(i)
+    long_set = set(long_idx)
+    for i, hits in zip(full_idx, detect([reads[i] for i in full_idx], det_params)):
+        res[i] = (hits, "fallback" if i in long_set else "short")
+    return res
+
+
+def _exact_hits(reads, method):
+    "Hits of the exact primer matches in a list of reads, using the automaton of the worker's primers"
+    ctx = get_context()
+    if "automaton" not in ctx:
+        ctx["automaton"] = PrimerAutomaton(ctx["primers"])
+    # nhmmscan hits start at the 1-based alignment start:
+    shift = 1 if method == "phmm" else 0
+    return [[Hit(read.Id, start + shift, end + shift, acc, 0, end - start, 0.0) for acc, start, end in matches]
+            for read, matches in zip(reads, ctx["automaton"].find([read.Seq for read in reads]))]
+
+
+def _staged_batch(params):
+    """ Detect primers in the reads of a work unit in stages. If exact is set, reads in which the exact primer
+    matches give a single usable segment are resolved without the backend. The other reads are searched in
+    end windows if a window size is given (see _end_window_batch), or as a whole. Returns a list of (hits, status)
+    pairs, status being "exact", "full" or one of the end window statuses.
+    """
+    reads, (method, det_params, config, cutoff, window, exact) = params
+    res = [None] * len(reads)
+    todo = list(range(len(reads)))
+    if exact:
+        todo = []
+        exact_hits = _exact_hits(reads, method)
+        for i, (hits, (segments, _, _)) in enumerate(zip(exact_hits, segment_batch(exact_hits, config, cutoff))):
+            if len(segments) == 1:
+                res[i] = (hits, "exact")
+            else:
+                todo.append(i)
+    rest = [reads[i] for i in todo]
+    if window is None:
+        found = [(hits, "full") for hits in _DETECTORS[method](rest, det_params)]
+    else:
+        found = _end_window_batch((rest, (method, det_params, config, cutoff, window)))
+    for i, r in zip(todo, found):
+        res[i] = r
+    return res
+
+
+def _staged_packed(params):
+    "Run _staged_batch on a packed work unit, returning packed hits and status codes"
+    packed, stage_params = params
+    res = _staged_batch((packed_batch.unpack_reads(packed), stage_params))
+    statuses = np.array([_STATUSES.index(status) for _, status in res], dtype=np.uint8)
+    return packed_batch.pack_hits([hits for hits, _ in res]), statuses
+
+
+def _unpack_staged(reads, packed):
+    "Unpack the (hits, status) pairs of a work unit"
+    hits, statuses = packed
+    return zip(packed_batch.unpack_hits(reads, hits), [_STATUSES[i] for i in statuses.tolist()])
+
+
+def _stream_staged(reads, method, det_params, config, cutoff, window, exact, pool, min_batch, max_in_flight, window_sup, exact_sup):
+    """ Stream (read, hits) pairs detected in stages (see _staged_batch), counting end window statuses in window_sup
+    and the reads resolved by exact matches or passed to the backend in exact_sup.
+    """
+    params = (method, det_params, config, cutoff, window, exact)
+    for read, (hits, status) in scheduler.stream_map(_staged_packed, reads, pool, min_batch, max_in_flight, params,
+                                                     pack=packed_batch.pack_reads, unpack=_unpack_staged):
+        if window_sup is not None and status in _WINDOW_STATUSES:
+            window_sup[status] = window_sup.get(status, 0) + 1
+        if exact_sup is not None:
+            key = "exact" if status == "exact" else "backend"
+            exact_sup[key] = exact_sup.get(key, 0) + 1
+        yield read, hits
+
+
+def _hybrid_batch(params):
+    """ Detect primers with edlib in the reads of a work unit, then with the profile HMM backend in the reads for
+    which the edlib hits do not give a single usable segment. The hits of both tiers are processed with their own
+    cutoff and merged (see merge_hits). Returns a list of processed hits, a list of tiers ("edlib" or "phmm")
+    and the time spent in each tier.
+    """
+    reads, (edlib_params, cutoff, E, config) = params
+    t0 = time.perf_counter()
+    res = [process_hits(hits, cutoff) for hits in _detect_edlib(reads, edlib_params)]
+    todo = [i for i, (segments, _, _) in enumerate(segment_batch(res, config)) if len(segments) != 1]
+    t1 = time.perf_counter()
+    for i, hits in zip(todo, _detect_phmm([reads[i] for i in todo], (E, 1))):
+        res[i] = merge_hits(res[i], process_hits(hits, E))
+    tiers = ["edlib"] * len(reads)
+    for i in todo:
+        tiers[i] = "phmm"
+    return res, tiers, (t1 - t0, time.perf_counter() - t1)
+
+
+def _hybrid_packed(params):
+    "Run _hybrid_batch on a packed work unit, returning packed hits, tier codes and tier timings"
+    packed, hybrid_params = params
+    hits, tiers, timings = _hybrid_batch((packed_batch.unpack_reads(packed), hybrid_params))
+    return packed_batch.pack_hits(hits), np.array([t == "phmm" for t in tiers], dtype=np.uint8), timings
+
+
+def _unpack_hybrid(reads, packed, tier_sup=None):
+    "Unpack the hits of a work unit, adding read counts and timings per tier to tier_sup"
+    hits, tiers, timings = packed
+    if tier_sup is not None:
+        forwarded = int(tiers.sum())
+        tier_sup["edlib_reads"] += len(reads)
+        tier_sup["edlib_seconds"] += timings[0]
+        tier_sup["phmm_reads"] += forwarded
+        tier_sup["phmm_seconds"] += timings[1]
+    return packed_batch.unpack_hits(reads, hits)
+
+
+def _segment_stream(stream, config, cutoff, batch_size):
+    "Segment a stream of (read, hits) pairs in batches of columnar hits (see columnar.segment_hits)"
+    for chunk in utils.batch(stream, batch_size):
+        reads, hit_lists = zip(*chunk)
+        yield from zip(reads, columnar.segment_hits(columnar.HitBatch.gather(hit_lists), config, cutoff).results())
+
+
+def chopper_hybrid(reads, config, max_ed, cutoff, E, pool, min_batch, max_in_flight=None, tier_sup=None):
+    """ Segment using the edlib/parasail backend, forwarding the reads without a single usable segment to
+    the profile HMM backend (see _hybrid_batch). The number of reads and the time spent in each tier are
+    added to tier_sup.
+    """
+    params = ((max_ed, False, cutoff), cutoff, E, config)
+    stream = scheduler.stream_map(_hybrid_packed, reads, pool, min_batch, max_in_flight, params,
+                                  pack=packed_batch.pack_reads, unpack=partial(_unpack_hybrid, tier_sup=tier_sup))
+    # The hits of both tiers are processed already:
+    return _segment_stream(stream, config, None, min_batch)
+
+
+def chopper_phmm(reads, config, cutoff, threads, pool, min_batch, max_in_flight=None, end_window=None, window_sup=None,
+                 exact=False, exact_sup=None, topology=None, sizer=None):
+    """ Segment using the profile HMM backend. The number of concurrent nhmmscan processes, their --cpu and
+    the batch size are taken from topology (see phmm_topology.plan), which by default runs one single threaded
+    process per thread in work units of min_batch reads. If a sizer is given, the batch size is adjusted
+    from the measured search times (see phmm_topology.BatchSizer).
+    If end_window is given, primers are searched in the head and tail windows of this size first (see _end_window_batch)
+    and read statuses are counted in window_sup. If exact is set, reads resolved by exact primer matches skip the backend
+    (see _staged_batch), the primer sequences being taken from the worker context, and are counted in exact_sup.
+    The staged searches use the batch size of the topology without adjustment.
+    """
+    if topology is None:
+        topology = phmm_topology.Topology(threads, 1, min_batch, min_batch)
+    if topology.processes < threads:
+        # The pool has a worker per thread, limit the work units in flight to run fewer processes:
+        max_in_flight = topology.processes if max_in_flight is None else min(max_in_flight, topology.processes)
+    if end_window is None and not exact:
+        stream = hmmer_backend.stream_locations(reads, E=cutoff, pool=pool, min_batch=topology.batch_size, max_in_flight=max_in_flight,
+                                                threads=topology.cpu, sizer=sizer)
+    else:
+        stream = _stream_staged(reads, "phmm", (cutoff, topology.cpu), config, cutoff, end_window, exact, pool, topology.batch_size,
+                                max_in_flight, window_sup, exact_sup)
+    return _segment_stream(stream, config, cutoff, topology.batch_size)
+
+
+def chopper_edlib(reads, config, max_ed, cutoff, pool, min_batch, max_in_flight=None, end_window=None, window_sup=None, refine_sup=None,
+                  method="edlib", exact=False, exact_sup=None):
+    """ Segment using the edlib/parasail backend, or the bit-parallel search giving the same locations if method is "myers".
+    If end_window is given, primers are searched in the head and tail windows of this size first (see _end_window_batch)
+    and read statuses are counted in window_sup. If exact is set, reads resolved by exact primer matches skip the backend
+    (see _staged_batch) and are counted in exact_sup. Otherwise the numbers of edlib locations and refined windows are counted in refine_sup.
+    """
+    if end_window is None and not exact:
+        backend = myers_backend if method == "myers" else edlib_backend
+        stream = backend.stream_locations(reads, max_ed=max_ed, pool=pool, min_batch=min_batch, max_in_flight=max_in_flight,
+                                          max_score=cutoff, refine_sup=refine_sup)
+    else:
+        stream = _stream_staged(reads, method, (max_ed, False, cutoff), config, cutoff, end_window, exact, pool, min_batch, max_in_flight,
+                                window_sup, exact_sup)
+    return _segment_stream(stream, config, cutoff, min_batch)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from pychopper.common_structures import Hit, Segment
+from pychopper.batch_segmentation import STRANDS, segment_columns
+
+""" Columnar hits and segments of a batch of reads. Primer names are replaced by integer ids of a
+registry, hits are held as NumPy columns with read offsets and segments as a structured array.
+The legacy Hit and Segment namedtuples are only built at the API boundary: every read gets a HitView,
+a read-only sequence creating its Hit tuples when accessed, and the tuple of its Segments.
+"""
+
+SEGMENT_DTYPE = np.dtype([
+    ("left", np.int32),
+    ("start", np.int32),
+    ("end", np.int32),
+    ("right", np.int32),
+    ("strand", np.int8),
+    ("len", np.int32),
+])
+
+
+class PrimerRegistry(object):
+    "Integer ids of primer names"
+    __slots__ = ("names", "ids")
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.id(name)
+
+    def id(self, name):
+        "Return the id of a primer name, registering it on first use"
+        pid = self.ids.get(name)
+        if pid is None:
+            pid = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return pid
+
+    def lookup(self, names):
+        "Array of the ids of primer names"
+        return np.array([self.id(name) for name in names], dtype=np.int32)
+
+    def config_table(self, config):
+        "Table of segment strand codes (see batch_segmentation.STRANDS) indexed by primer ids"
+        for pair in config:
+            self.lookup(pair)
+        table = np.zeros((len(self.names), len(self.names)), dtype=np.int8)
+        for (first, second), strand in config.items():
+            table[self.ids[first], self.ids[second]] = STRANDS.index(strand)
+        return table
+
+
+REGISTRY = PrimerRegistry()
+
+
+class HitBatch(object):
+    """ Hits of a batch of reads as columns. The hits of read i are the rows offsets[i] to offsets[i + 1],
+    refs holds the name of every read used as the Ref of its hits.
+    """
+    __slots__ = ("registry", "refs", "offsets", "starts", "ends", "primer", "query_starts", "query_ends", "scores", "_bounds", "_lists", "_queries")
+
+    def __init__(self, registry, refs, offsets, starts, ends, primer, query_starts, query_ends, scores):
+        self.registry = registry
+        self.refs = refs
+        self.offsets = offsets
+        self.starts = starts
+        self.ends = ends
+        self.primer = primer
+        self.query_starts = query_starts
+        self.query_ends = query_ends
+        self.scores = scores
+        self._bounds = offsets.tolist()
+        self._lists = None
+        self._queries = None
+
+    @classmethod
+    def from_packed(cls, reads, packed, registry=REGISTRY):
+        """ Hits of a work unit in the packed format (see packed_batch.pack_hits), without building Hit tuples.
+
+        :param reads: List of reads of the work unit, in the order they were packed.
+        :param packed: Hit array and tuple of primer names.
+        :param registry: Primer registry.
+        :returns: HitBatch.
+        :rtype: HitBatch
+        """
+        hits, names = packed
+        offsets = np.searchsorted(hits["read"], np.arange(len(reads) + 1))
+        primer = registry.lookup(names)[hits["primer"]] if len(names) > 0 else np.zeros(0, dtype=np.int32)
+        return cls(registry, [read.Name for read in reads], offsets, hits["ref_start"], hits["ref_end"], primer,
+                   hits["query_start"], hits["query_end"], hits["score"])
+
+    @classmethod
+    def from_lists(cls, hit_lists, registry=REGISTRY):
+        """ Hits given as lists of Hit tuples.
+
+        :param hit_lists: List of hit lists, one per read.
+        :param registry: Primer registry.
+        :returns: HitBatch.
+        :rtype: HitBatch
+        """
+        offsets = np.zeros(len(hit_lists) + 1, dtype=np.int64)
+        np.cumsum(list(map(len, hit_lists)), out=offsets[1:])
+        refs = [hits[0].Ref if len(hits) > 0 else None for hits in hit_lists]
+        flat = [hit for hits in hit_lists for hit in hits]
+        cols = list(zip(*flat)) if len(flat) > 0 else [()] * len(Hit._fields)
+        return cls(registry, refs, offsets, np.array(cols[1], dtype=np.int32), np.array(cols[2], dtype=np.int32),
+                   np.array([registry.id(q) for q in cols[3]], dtype=np.int32), np.array(cols[4], dtype=np.int32),
+                   np.array(cols[5], dtype=np.int32), np.array(cols[6], dtype=np.float64))
+
+    @classmethod
+    def gather(cls, hit_lists, registry=REGISTRY):
+        "Hits of a list of HitViews or lists of Hit tuples, slicing the batches of consecutive views"
+        if not all(isinstance(hits, HitView) for hits in hit_lists):
+            return cls.from_lists([list(hits) for hits in hit_lists], registry)
+        runs = []
+        for view in hit_lists:
+            if len(runs) > 0 and runs[-1][0] is view.batch and runs[-1][2] == view.index:
+                runs[-1][2] += 1
+            else:
+                runs.append([view.batch, view.index, view.index + 1])
+        if len(runs) == 1 and runs[0][1] == 0 and runs[0][2] == len(runs[0][0]):
+            return runs[0][0]
+        return cls.concat([batch.slice(start, stop) for batch, start, stop in runs], registry)
+
+    @classmethod
+    def concat(cls, batches, registry=REGISTRY):
+        "Concatenate the reads of hit batches sharing a registry"
+        offsets = [np.zeros(1, dtype=np.int64)]
+        total = 0
+        for batch in batches:
+            offsets.append(batch.offsets[1:] - batch.offsets[0] + total)
+            total += batch.offsets[-1] - batch.offsets[0]
+
+        def column(name):
+            return np.concatenate([getattr(b, name)[b.offsets[0]:b.offsets[-1]] for b in batches]) if len(batches) > 0 else np.zeros(0)
+
+        return cls(registry, [ref for b in batches for ref in b.refs], np.concatenate(offsets), column("starts"), column("ends"),
+                   column("primer"), column("query_starts"), column("query_ends"), column("scores"))
+
+    def slice(self, start, stop):
+        "Hits of the reads start to stop, sharing the columns"
+        return HitBatch(self.registry, self.refs[start:stop], self.offsets[start:stop + 1], self.starts, self.ends, self.primer,
+                        self.query_starts, self.query_ends, self.scores)
+
+    def take(self, rows, counts):
+        "Hits in the given rows, counts giving the number of rows of every read"
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return HitBatch(self.registry, self.refs, offsets, self.starts[rows], self.ends[rows], self.primer[rows],
+                        self.query_starts[rows], self.query_ends[rows], self.scores[rows])
+
+    def __len__(self):
+        return len(self.refs)
+
+    @property
+    def nbytes(self):
+        "Size of the columns in bytes"
+        return sum(getattr(self, name).nbytes for name in ("offsets", "starts", "ends", "primer", "query_starts", "query_ends", "scores"))
+
+    def read_hits(self, i):
+        "List of the Hit tuples of read i"
+        if self._lists is None:
+            self._lists = [getattr(self, name).tolist() for name in ("starts", "ends", "primer", "query_starts", "query_ends", "scores")]
+        starts, ends, primer, query_starts, query_ends, scores = self._lists
+        names, ref = self.registry.names, self.refs[i]
+        return [Hit(ref, starts[j], ends[j], names[primer[j]], query_starts[j], query_ends[j], scores[j])
+                for j in range(self._bounds[i], self._bounds[i + 1])]
+
+    def queries(self, i):
+        "List of the primer names of the hits of read i"
+        if self._queries is None:
+            names = self.registry.names
+            self._queries = [names[p] for p in self.primer.tolist()]
+        return self._queries[self._bounds[i]:self._bounds[i + 1]]
+
+    def views(self):
+        "List of the HitViews of all reads"
+        return [HitView(self, i) for i in range(len(self.refs))]
+
+
+class HitView(object):
+    "Read-only sequence of the Hit tuples of one read of a HitBatch, built when accessed"
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def __len__(self):
+        bounds = self.batch._bounds
+        return bounds[self.index + 1] - bounds[self.index]
+
+    def __iter__(self):
+        return iter(self.batch.read_hits(self.index))
+
+    def __getitem__(self, key):
+        return self.batch.read_hits(self.index)[key]
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "HitView({!r})".format(self.batch.read_hits(self.index))
+
+    @property
+    def queries(self):
+        "Primer names of the hits, without building Hit tuples"
+        return self.batch.queries(self.index)
+
+
+def queries(hits):
+    "Primer names of a HitView or a sequence of Hit tuples"
+    return hits.queries if isinstance(hits, HitView) else [hit.Query for hit in hits]
+
+
+class SegmentBatch(object):
+    """ Segments of a batch of reads as a structured array of SEGMENT_DTYPE. The segments of read i are the
+    rows offsets[i] to offsets[i + 1], hits holds the processed hits and tlen the last DP row of every read.
+    """
+    __slots__ = ("offsets", "segments", "hits", "tlen")
+
+    def __init__(self, offsets, segments, hits, tlen):
+        self.offsets = offsets
+        self.segments = segments
+        self.hits = hits
+        self.tlen = tlen
+
+    def __len__(self):
+        return len(self.tlen)
+
+    def results(self):
+        """ Convert to the legacy per read results of chopper.analyse_hits.
+
+        :returns: List of (segments, hits, tlen) tuples, with a tuple of Segments and a HitView per read.
+        :rtype: list
+        """
+        segs = self.segments
+        segments = [Segment(*x) for x in zip(segs["left"].tolist(), segs["start"].tolist(), segs["end"].tolist(), segs["right"].tolist(),
+                                             [STRANDS[s] for s in segs["strand"].tolist()], segs["len"].tolist())]
+        seg_bounds = self.offsets.tolist()
+        tlen = self.tlen.tolist()
+        res = [((), (), 0)] * len(tlen)
+        # Reads with less than two processed hits have no segments:
+        for r in np.nonzero(np.diff(self.hits.offsets) >= 2)[0].tolist():
+            res[r] = (tuple(segments[seg_bounds[r]:seg_bounds[r + 1]]), HitView(self.hits, r), tlen[r])
+        return res
+
+
+def segment_hits(batch, config, cutoff=None):
+    """ Segment a batch of reads, giving the same results as analyse_hits(process_hits(hits, cutoff), config) for every read.
+
+    :param batch: HitBatch.
+    :param config: Primer configurations.
+    :param cutoff: Score cutoff (None if the hits are processed already).
+    :returns: SegmentBatch.
+    :rtype: SegmentBatch
+    """
+    lo, hi = batch.offsets[0], batch.offsets[-1]
+    kept, kept_counts, first, second, strand, length, seg_counts, tlen = segment_columns(
+        batch.offsets - lo, batch.starts[lo:hi], batch.ends[lo:hi], batch.primer[lo:hi], batch.scores[lo:hi],
+        batch.registry.config_table(config), cutoff)
+    segments = np.empty(len(first), dtype=SEGMENT_DTYPE)
+    segments["left"] = batch.starts[lo:hi][first]
+    segments["start"] = batch.ends[lo:hi][first]
+    segments["end"] = batch.starts[lo:hi][second]
+    segments["right"] = batch.ends[lo:hi][second]
+    segments["strand"] = strand
+    segments["len"] = length
+    offsets = np.zeros(len(seg_counts) + 1, dtype=np.int64)
+    np.cumsum(seg_counts, out=offsets[1:])
+    return SegmentBatch(offsets, segments, batch.take(kept + lo, kept_counts), tlen)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+""" Reverse complement of str and bytes sequences through translation tables.
+"""
+
+_COMP_FROM = "ACGTXNacgtxn-"
+_COMP_TO = "TGCAXNtgcaxn-"
+_STR_TABLE = str.maketrans(_COMP_FROM, _COMP_TO)
+_BYTES_TABLE = bytes.maketrans(_COMP_FROM.encode(), _COMP_TO.encode())
+_KNOWN = _COMP_FROM.encode()
+
+
+def _warn_unknown(seq):
+    "Warn about characters which have no complement"
+    if isinstance(seq, str):
+        # Non-ascii characters have no complement, ascii strings are checked as bytes:
+        if seq.isascii() and len(seq.encode('ascii').translate(None, _KNOWN)) == 0:
+            return
+        unknown = set(seq) - set(_COMP_FROM)
+    else:
+        unknown = seq.translate(None, _KNOWN)
+        if len(unknown) == 0:
+            return
+        unknown = set(unknown.decode('latin-1'))
+    sys.stderr.write(
+        "WARNING: No reverse complement for {} found, returning argument.\n".format(",".join(sorted(unknown))))
+
+
+def reverse_complement(seq):
+    """ Return reverse complement of a string (base) sequence.
+
+    Characters without a complement are left unchanged, as seq_utils.base_complement does.
+
+    :param seq: Input sequence (str or bytes).
+    :returns: Reverse complement of input sequence.
+    :rtype: same as input
+    """
+    if isinstance(seq, str):
+        res = seq.translate(_STR_TABLE)[::-1]
+    else:
+        res = seq.translate(_BYTES_TABLE)[::-1]
+    _warn_unknown(seq)
+    return res
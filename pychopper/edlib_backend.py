@@ -1,40 +1,177 @@
 # -*- coding: utf-8 -*-
 
 import edlib
+from functools import partial
 
 from pychopper.common_structures import Hit
-from pychopper import utils
-from pychopper.parasail_backend import refine_locations
+from pychopper import scheduler, packed_batch
+from pychopper.parasail_backend import refine_locations_profiled
+from pychopper.seed_index import SeedIndex, MIN_SEED_LEN
+from pychopper.worker_pool import get_context
 
+# Padding of the windows of clustered edlib locations (None to refine every location):
+CLUSTER_PAD = 0
 
-def find_locations(reads, all_primers, max_ed, pool, min_batch):
-    "Find alignment hits of all primers in all reads using the edlib/parasail backend"
-    for batch in utils.batch(reads, min_batch):
-        for res in pool.map(_find_locations_single, zip(batch, [(all_primers, max_ed)] * len(batch))):
-            try:
-                yield res
-            except StopIteration:
-                return
 
+def stream_locations(reads, max_ed, pool, min_batch, edit_distances=False, max_in_flight=None, max_score=None, refine_sup=None):
+    """ Find alignment hits of all primers in a stream of reads using the edlib/parasail backend.
+    The primers are taken from the context of the worker pool. Reads are sent to the workers in
+    work units of min_batch reads (packed, see packed_batch), with at most max_in_flight work units
+    submitted at a time. If edit_distances is True, every hit is paired with the edlib edit distance of its location.
+    If max_score is given, hits with a refined score above it are dropped in the workers.
+    The numbers of edlib locations and refined windows are added to refine_sup if given.
+    Yields (read, hits) pairs in input order.
+    """
+    return scheduler.stream_map(_find_locations_packed, reads, pool, min_batch, max_in_flight, (max_ed, edit_distances, max_score),
+                                pack=packed_batch.pack_reads, unpack=partial(_unpack_hits, edit_distances=edit_distances, refine_sup=refine_sup))
 
-def _find_locations_single(params):
-    "Find alignment hits of all primers in a single reads using the edlib/parasail backend"
+
+def find_locations(reads, max_ed, pool, min_batch, edit_distances=False, max_in_flight=None, max_score=None):
+    """ Find alignment hits of all primers in all reads using the edlib/parasail backend.
+    The primers are taken from the context of the worker pool.
+    If edit_distances is True, every hit is paired with the edlib edit distance of its location.
+    If max_score is given, hits with a refined score above it are dropped in the workers.
+    """
+    for _, hits in stream_locations(reads, max_ed, pool, min_batch, edit_distances, max_in_flight, max_score):
+        yield hits
+
+
+def _find_locations_packed(params):
+    "Find alignment hits of all primers in a packed work unit, returning packed hits and refinement counts"
+    packed, read_params = params
+    counts = [0, 0]
+    hits = _find_locations_batch((packed_batch.unpack_reads(packed), read_params), counts)
+    return packed_batch.pack_hits(hits, read_params[1]) + (tuple(counts),)
+
+
+def _unpack_hits(reads, packed, edit_distances, refine_sup):
+    "Unpack the hits of a work unit, adding its refinement counts to refine_sup"
+    hits, names, counts = packed
+    if refine_sup is not None:
+        refine_sup["locations"] += counts[0]
+        refine_sup["windows"] += counts[1]
+    return packed_batch.unpack_hits(reads, (hits, names), edit_distances)
+
+
+def _find_locations_batch(params, counts=None):
+    "Find alignment hits of all primers in a work unit of reads, scanning the reads for seeds together"
+    reads, read_params = params
+    index = _seed_index(get_context(), read_params[0])
+    windows = index.windows([read.Seq for read in reads])
+    return [_find_locations_single((read, read_params), w, counts) for read, w in zip(reads, windows)]
+
+
+def _seed_index(ctx, max_ed):
+    "Return the seed index of the worker's primers for a maximum edit distance, building it on first use"
+    indices = ctx.setdefault("seed_indices", {})
+    if max_ed not in indices:
+        indices[max_ed] = SeedIndex(ctx["primers"], max_ed, ctx.get("min_seed_len", MIN_SEED_LEN))
+    return indices[max_ed]
+
+
+def _edlib_locations(primer_seq, seq, k):
+    "Edit distance and locations of the best alignments of a primer in a sequence"
+    result = edlib.align(primer_seq, seq, mode="HW", task="locations", k=k)
+    return result["editDistance"], result["locations"]
+
+
+def _window_locations(primer_seq, seq, k, windows):
+    """ Edit distance and locations of the best alignments of a primer, searching only the candidate
+    windows. Gives the same result as searching the whole sequence if the windows contain all alignments
+    with at most k edits.
+    """
+    best, locations = -1, []
+    for start, end in windows:
+        ed, wlocs = _edlib_locations(primer_seq, seq[start:end], k)
+        if ed < 0 or (best >= 0 and ed > best):
+            continue
+        if best < 0 or ed < best:
+            best, locations = ed, []
+        locations.extend((s + start, e + start) for s, e in wlocs)
+    return best, locations
+
+
+def _cluster_locations(locations, pad, seq_len):
+    "Merge overlapping or adjacent edlib locations (inclusive ends) into windows padded by pad bases"
+    clusters = []
+    for start, end in sorted(locations):
+        if len(clusters) > 0 and start <= clusters[-1][1] + 1:
+            clusters[-1][1] = max(clusters[-1][1], end)
+        else:
+            clusters.append([start, end])
+    return [(max(start - pad, 0), min(end + pad, seq_len - 1)) for start, end in clusters]
+
+
+def _find_locations_single(params, windows=None, counts=None):
+    """ Find alignment hits of all primers in a single reads using the edlib/parasail backend.
+    Seeded primers are only aligned to their candidate windows, which are looked up if not given.
+    Refinement counts are added to counts if given (see refine_primer_locations).
+    """
     read = params[0]
-    all_primers, max_ed = params[1]
+    max_ed, edit_distances, max_score = params[1]
+    ctx = get_context()
+    index = _seed_index(ctx, max_ed)
+    if windows is None:
+        windows = index.windows([read.Seq])[0]
+    primer_locations = []
+    for primer_acc, primer_seq in ctx["primers"].items():
+        primer_max_ed = index.max_eds[primer_acc]
+        if primer_acc in windows:
+            ed, locations = _window_locations(primer_seq, read.Seq, primer_max_ed, windows[primer_acc])
+        elif primer_acc in index.unseeded:
+            ed, locations = _edlib_locations(primer_seq, read.Seq, primer_max_ed)
+        else:
+            # No seed hit, the primer cannot align within max_ed:
+            continue
+        primer_locations.append((primer_acc, ed, locations))
+    return refine_primer_locations(read, primer_locations, ctx, edit_distances, max_score, counts)
+
+
+def refine_primer_locations(read, primer_locations, ctx, edit_distances=False, max_score=None, counts=None):
+    """ Refine edlib style primer locations of a read with parasail.
+
+    Overlapping locations of a primer are merged into a single window before refinement, the number
+    of locations and of refined windows are added to counts if given.
+
+    :param read: Read.
+    :param primer_locations: List of (primer accession, edit distance, list of (start, inclusive end) locations).
+    :param ctx: Worker context.
+    :param edit_distances: Pair every hit with the edit distance of its location.
+    :param max_score: Maximum normalized score of the returned hits (None to return all hits).
+    :param counts: List with the location and window counts to update.
+    :returns: List of refined hits.
+    :rtype: list
+    """
+    all_primers = ctx["primers"]
+    pad = ctx.get("cluster_pad", CLUSTER_PAD)
     all_locations = []
-    for primer_acc, primer_seq in all_primers.items():
-        primer_max_ed = int(max_ed * len(primer_seq))
-        result = edlib.align(primer_seq, read.Seq,
-                             mode="HW", task="locations", k=primer_max_ed)
-        ed = result["editDistance"]
-        locations = result["locations"]
+    all_eds = []
+    for primer_acc, ed, locations in primer_locations:
+        primer_seq = all_primers[primer_acc]
+        if counts is not None:
+            counts[0] += len(locations)
+        if pad is not None:
+            locations = _cluster_locations(locations, pad, len(read.Seq))
+        if counts is not None:
+            counts[1] += len(locations)
         if locations:
-            # all_locations[primer_acc] = []
             for refstart, refend in locations:
                 refend += 1
                 # ('Hit', 'Ref RefStart RefEnd Query QueryStart QueryEnd Score')
                 hit = Hit(read.Name, refstart, refend, primer_acc, 0,
                           len(primer_seq),  ed / len(primer_seq))
                 all_locations.append(hit)
-    refined_locations = refine_locations(read, all_primers, all_locations)
-    return refined_locations
+                all_eds.append(ed)
+    if not edit_distances:
+        return refine_locations_profiled(read, all_primers, all_locations, ctx["profiles"], ctx["aln_params"], max_score)
+    # Keep the edit distances of the hits surviving refinement:
+    res = []
+    for ed, hit in zip(all_eds, all_locations):
+        refined = refine_locations_profiled(read, all_primers, [hit], ctx["profiles"], ctx["aln_params"], max_score)
+        res.extend((ed, h) for h in refined)
+    return res
+
+
+def within_max_ed(hits, all_primers, max_ed):
+    "Select hits with edit distance pairs which would have been reported by edlib at a given max_ed"
+    return [h for ed, h in hits if ed <= int(max_ed * len(all_primers[h.Query]))]
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from collections import deque
+from pychopper.seed_index import _CODES
+
+""" Exact primer matching with an Aho-Corasick automaton. The automaton of all primers (including the
+reverse complements loaded by seq_utils.get_primers) is stored as a dense transition table over 2-bit
+codes, characters other than ACGT sending it back to the root. The reads of a work unit are concatenated
+and cut into overlapping chunks which are run through the automaton together, one NumPy step per base.
+Primers with characters other than ACGT are not matched.
+"""
+
+CHUNK_SIZE = 256
+
+
+class PrimerAutomaton(object):
+    "Aho-Corasick automaton of the primer sequences"
+
+    def __init__(self, primers, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.names = [acc for acc, seq in primers.items() if len(seq) > 0 and set(seq) <= set("ACGT")]
+        self.lengths = np.array([len(primers[acc]) for acc in self.names], dtype=np.int64)
+        # Build the trie of the primers:
+        goto, out = [[-1] * 4], [[]]
+        for p, acc in enumerate(self.names):
+            state = 0
+            for c in primers[acc]:
+                b = "ACGT".index(c)
+                if goto[state][b] < 0:
+                    goto[state][b] = len(goto)
+                    goto.append([-1] * 4)
+                    out.append([])
+                state = goto[state][b]
+            out[state].append(p)
+        # Add failure transitions breadth first, states inheriting the outputs of their failure state:
+        fail = [0] * len(goto)
+        queue = deque()
+        for b in range(4):
+            if goto[0][b] < 0:
+                goto[0][b] = 0
+            else:
+                queue.append(goto[0][b])
+        while len(queue) > 0:
+            state = queue.popleft()
+            out[state] = out[state] + out[fail[state]]
+            for b in range(4):
+                nxt = goto[state][b]
+                if nxt < 0:
+                    goto[state][b] = goto[fail[state]][b]
+                else:
+                    fail[nxt] = goto[fail[state]][b]
+                    queue.append(nxt)
+        # Renumber the states so that the ones with outputs come last (the root has none and stays first),
+        # and by their row offset in the flattened table, so that a step is a single lookup:
+        order = sorted(range(len(goto)), key=lambda x: len(out[x]) > 0)
+        new_id = np.empty(len(goto), dtype=np.int32)
+        new_id[order] = np.arange(len(goto), dtype=np.int32) * 5
+        self.delta = np.zeros((len(goto), 5), dtype=np.int32)
+        self.delta[:, :4] = new_id[np.array(goto, dtype=np.int32)[order]]
+        self.delta = self.delta.ravel()
+        out = [out[x] for x in order]
+        self.first_out = 5 * sum(len(o) == 0 for o in out)
+        self.out_ptr = np.concatenate(([0], np.cumsum([len(o) for o in out]))).astype(np.int64)
+        self.out_idx = np.array([p for o in out for p in o], dtype=np.int64)
+        self.overlap = int(self.lengths.max()) - 1 if len(self.names) > 0 else 0
+
+    def find(self, seqs):
+        """ Find the exact matches of all primers in a list of sequences.
+
+        :param seqs: List of sequences.
+        :returns: List with a list of (primer accession, start, end) matches sorted by start for each sequence.
+        :rtype: list
+        """
+        res = [[] for _ in seqs]
+        if len(self.names) == 0 or len(seqs) == 0:
+            return res
+        # Reads are separated by a character which resets the automaton:
+        offsets = np.concatenate(([0], np.cumsum([len(s) + 1 for s in seqs])))
+        codes = _CODES[np.frombuffer("\n".join(seqs).encode("latin-1"), dtype=np.uint8)]
+        size = self.chunk_size
+        lanes = (len(codes) + size - 1) // size
+        # Chunk c starts overlap bases early, so that it sees all matches ending in [c * size, (c + 1) * size):
+        padded = np.full(self.overlap + lanes * size, 4, dtype=np.uint8)
+        padded[self.overlap:self.overlap + len(codes)] = codes
+        # Copy the strided chunk view to contiguous steps, steps reading strided rows are much slower:
+        cols = np.lib.stride_tricks.as_strided(padded, shape=(self.overlap + size, lanes), strides=(1, size), writeable=False).astype(np.int32)
+        state = np.zeros(lanes, dtype=np.int32)
+        cell = np.empty_like(state)
+        states = np.empty((size, lanes), dtype=np.int32)
+        for j in range(self.overlap):
+            np.add(state, cols[j], out=cell)
+            np.take(self.delta, cell, out=state)
+        for j in range(size):
+            np.add(state, cols[self.overlap + j], out=cell)
+            np.take(self.delta, cell, out=states[j])
+            state = states[j]
+        step, lane = np.nonzero(states >= self.first_out)
+        found = states[step, lane] // 5
+        end = lane.astype(np.int64) * size + step + 1
+        # Expand states matching several primers:
+        counts = self.out_ptr[found + 1] - self.out_ptr[found]
+        first = np.repeat(self.out_ptr[found] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        primer = self.out_idx[first]
+        end = np.repeat(end, counts)
+        start = end - self.lengths[primer]
+        read = np.searchsorted(offsets, start, side='right') - 1
+        order = np.lexsort((primer, start))
+        for r, p, s in zip(read[order].tolist(), primer[order].tolist(), (start - offsets[read])[order].tolist()):
+            res[r].append((self.names[p], s, s + int(self.lengths[p])))
+        return res
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import io
+from functools import partial
+from itertools import chain, compress, repeat
+from numpy.random import random
+from pychopper.common_structures import Seq
+from pychopper import seq_utils as seu
+from pychopper import utils
+
+""" Block-buffered FASTA/FASTQ parsing over binary file handles.
+"""
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+_new_seq = partial(tuple.__new__, Seq)
+
+
+def _iter_blocks(fh, block_size):
+    "Read decoded blocks from a binary file handle, making sure that every block ends at a line boundary"
+    while True:
+        b = fh.read(block_size)
+        if not b:
+            return
+        if not b.endswith(b'\n'):
+            b += fh.readline()
+        yield b.decode()
+
+
+def _split_lines(block):
+    "Split a block into lines, dropping the empty string after the final newline"
+    lines = block.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def _build_records(names, seqs, quals, sample):
+    "Build sequence records from parallel lists of names, sequences and qualities"
+    if quals is None:
+        quals = repeat(None, len(names))
+    if sample is not None:
+        keep = list(random(len(names)) < sample)
+        names = list(compress(names, keep))
+        seqs = compress(seqs, keep)
+        quals = compress(quals, keep)
+    ids = [n.partition(' ')[0] for n in names]
+    return list(map(_new_seq, zip(ids, names, seqs, quals)))
+
+
+def _fastq_blocks(blocks):
+    """ Split blocks into four line FASTQ records. Yields lists of names, sequences and qualities
+    followed by the list of lines which could not be parsed as four line records.
+    """
+    pending = []
+    for block in blocks:
+        lines = pending + _split_lines(block)
+        n = len(lines) - len(lines) % 4
+        heads, seqs, plus, quals = lines[0:n:4], lines[1:n:4], lines[2:n:4], lines[3:n:4]
+        if not (all(map(str.startswith, heads, repeat('@'))) and all(map(str.startswith, plus, repeat('+')))
+                and list(map(len, seqs)) == list(map(len, quals))):
+            yield None, lines
+            return
+        pending = lines[n:]
+        if n > 0:
+            yield ('\n'.join(heads)[1:].split('\n@'), seqs, quals), None
+    yield None, pending
+
+
+def _fasta_blocks(blocks):
+    "Split blocks into FASTA records, yielding lists of names and sequences"
+    carry = ''
+    for block in chain(blocks, [None]):
+        if block is None:
+            chunk, carry = carry, ''
+        else:
+            data = carry + block
+            last = data.rfind('\n>')
+            if last < 0:
+                carry = data
+                continue
+            chunk, carry = data[:last + 1], data[last + 1:]
+        if len(chunk) == 0:
+            continue
+        names, seqs = [], []
+        for rec in chunk[1:].split('\n>'):
+            name, _, body = rec.partition('\n')
+            names.append(name)
+            seqs.append(body.replace('\n', ''))
+        yield names, seqs
+
+
+class _ChainRaw(io.RawIOBase):
+    "Minimal raw binary stream over an iterator of byte strings"
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buff = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self._buff) == 0:
+            try:
+                self._buff = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buff))
+        b[:n] = self._buff[:n]
+        self._buff = self._buff[n:]
+        return n
+
+
+def _text_lines(lines, blocks):
+    "Turn unparsed lines and the remaining blocks into a text stream suitable for seq_utils.readfq"
+    chunks = chain([''.join(line + '\n' for line in lines)], blocks)
+    return io.TextIOWrapper(io.BufferedReader(_ChainRaw(c.encode() for c in chunks)), encoding='utf8')
+
+
+def _filter_records(records, min_qual, rfq_sup, fh_fail):
+    """ Apply the mean quality filter to a list of records and keep track of read counts as
+    seq_utils.readfq does. Mean qualities are computed for the whole batch at once and reads failing
+    the filter are written to the QC fail handle in bulk.
+    """
+    if "total" in rfq_sup:
+        rfq_sup["total"] += len(records)
+    fq = [r for r in records if r.Qual is not None]
+    if len(fq) == 0:
+        return records
+    if min_qual is None:
+        passed = len(fq)
+    else:
+        mask = seu.mean_qual_mask([r.Qual for r in fq], min_qual)
+        passed = int(mask.sum())
+        if passed < len(fq):
+            if fh_fail is not None:
+                seu.writefq_batch(list(compress(fq, ~mask)), fh_fail)
+            if len(fq) == len(records):
+                records = list(compress(records, mask))
+            else:
+                fail = set(map(id, compress(fq, ~mask)))
+                records = [r for r in records if id(r) not in fail]
+    if "pass" in rfq_sup:
+        rfq_sup["pass"] += passed
+    return records
+
+
+def readfx(fh, sample=None, min_qual=None, rfq_sup={}, block_size=DEFAULT_BLOCK_SIZE):
+    """ Parse FASTA/FASTQ records from a binary file handle.
+
+    Drop-in replacement for seq_utils.readfq: the input is read in large blocks which are
+    split into records in bulk. Four line FASTQ and FASTA are parsed by the fast path, any other
+    layout (i.e. multi-line FASTQ) is handed over to seq_utils.readfq from the first offending block.
+    The QC fail output in rfq_sup["out_fq"] is either a file name or an open text handle which is left
+    open for the caller.
+    """
+    fh_fail = None
+    own_fail = False
+    if ("out_fq" in rfq_sup) and (rfq_sup["out_fq"] is not None):
+        fh_fail = rfq_sup["out_fq"]
+        if not hasattr(fh_fail, "write"):
+            fh_fail = open(fh_fail, "w")
+            own_fail = True
+
+    blocks = _iter_blocks(fh, block_size)
+    first = ''
+    for first in blocks:
+        first = first.lstrip()
+        if len(first) > 0:
+            break
+    blocks = chain([first], blocks)
+
+    if first[:1] == '>':
+        for names, seqs in _fasta_blocks(blocks):
+            yield from _filter_records(_build_records(names, seqs, None, sample), min_qual, rfq_sup, fh_fail)
+    else:
+        lines = []
+        if first[:1] == '@':
+            for parsed, lines in _fastq_blocks(blocks):
+                if parsed is None:
+                    break
+                yield from _filter_records(_build_records(*parsed, sample=sample), min_qual, rfq_sup, fh_fail)
+        if len(lines) > 0 or first[:1] != '@':
+            # Not a four line FASTQ, fall back to the line based parser:
+            records = seu.readfq(_text_lines(lines, blocks), sample=sample)
+            for batch in utils.batch(records, 10000):
+                yield from _filter_records(batch, min_qual, rfq_sup, fh_fail)
+
+    if fh_fail is not None:
+        fh_fail.flush()
+        if own_fail:
+            fh_fail.close()
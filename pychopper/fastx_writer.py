@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import zlib
+import struct
+from collections import deque
+import concurrent.futures
+from pychopper import seq_utils as seu
+
+""" Output handles: batched FASTQ formatting and BGZF compression on background threads.
+"""
+
+# Maximum uncompressed payload of a BGZF block, as used by htslib:
+BGZF_BLOCK_SIZE = 65280
+_BGZF_HEADER = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+_BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def compress_block(data, level=6):
+    "Compress a chunk of at most BGZF_BLOCK_SIZE bytes into a BGZF block"
+    comp = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = comp.compress(data) + comp.flush()
+    return b"".join((_BGZF_HEADER, struct.pack("<H", len(cdata) + 25), cdata,
+                     struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data))))
+
+
+class BgzfWriter(object):
+    """ Text file-like object writing BGZF compressed data. Full blocks are compressed by the threads
+    of a pool while the caller keeps writing, and are written out in order.
+    """
+
+    def __init__(self, fh, pool, level=6, max_pending=64):
+        self._fh = fh
+        self._pool = pool
+        self._level = level
+        self._max_pending = max_pending
+        self._buff = []
+        self._size = 0
+        self._pending = deque()
+
+    def write(self, s):
+        b = s.encode() if isinstance(s, str) else s
+        self._buff.append(b)
+        self._size += len(b)
+        if self._size >= BGZF_BLOCK_SIZE:
+            data = b"".join(self._buff)
+            n = len(data) - len(data) % BGZF_BLOCK_SIZE
+            view = memoryview(data)
+            for i in range(0, n, BGZF_BLOCK_SIZE):
+                self._submit(view[i:i + BGZF_BLOCK_SIZE].tobytes())
+            self._buff = [data[n:]]
+            self._size = len(data) - n
+        self._drain(self._max_pending)
+
+    def _submit(self, data):
+        self._pending.append(self._pool.submit(compress_block, data, self._level))
+
+    def _drain(self, limit):
+        "Write out finished blocks, waiting for the oldest ones while more than limit are in flight"
+        while len(self._pending) > 0 and (len(self._pending) > limit or self._pending[0].done()):
+            self._fh.write(self._pending.popleft().result())
+
+    def flush(self):
+        if self._size > 0:
+            self._submit(b"".join(self._buff))
+            self._buff, self._size = [], 0
+        self._drain(0)
+        self._fh.flush()
+
+    def close(self):
+        self.flush()
+        self._fh.write(_BGZF_EOF)
+        self._fh.close()
+
+
+class FastqWriter(object):
+    "Buffer reads and write them to a text handle as FASTQ in batches"
+
+    def __init__(self, fh, batch_size=1000):
+        self._fh = fh
+        self._batch_size = batch_size
+        self._reads = []
+
+    def write(self, read):
+        self._reads.append(read)
+        if len(self._reads) >= self._batch_size:
+            self._write_batch()
+
+    def _write_batch(self):
+        seu.writefq_batch(self._reads, self._fh)
+        self._reads = []
+
+    def flush(self):
+        self._write_batch()
+        self._fh.flush()
+
+    def close(self):
+        self.flush()
+        self._fh.close()
+
+
+def compression_pool(threads):
+    "Create a thread pool for compressing output blocks"
+    return concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads))
+
+
+def open_output(fname, pool=None, level=6):
+    """ Open an output file for writing text. Files ending in .gz are BGZF compressed
+    using the threads of pool, '-' stands for the standard output.
+    """
+    if fname == "-":
+        return sys.stdout
+    if fname.endswith(".gz"):
+        if pool is None:
+            pool = compression_pool(1)
+        return BgzfWriter(open(fname, "wb"), pool, level)
+    return open(fname, "w")
@@ -2,12 +2,35 @@
 
 import sys
 import os
-import re
+import io
+import shutil
+import hashlib
+import tempfile
+import threading
+import time
 import subprocess as sp
 import itertools
 from collections import defaultdict
 from pychopper.common_structures import Hit
-from pychopper import utils
+from pychopper import scheduler, packed_batch
+from pychopper.worker_pool import get_context
+
+try:
+    from pyhmmer import plan7, easel
+except ImportError:
+    plan7 = easel = None
+
+""" nhmmscan is run without a shell on every work unit. The reads are encoded to FASTA in bulk and written
+by a thread while the tabular output is parsed line by line. The profile HMM file is checked once per worker.
+A process cannot be kept alive across work units: nhmmscan writes its table through a block buffered file
+stream which is only flushed at exit, so the end of a batch cannot be detected before closing the input.
+
+The pyhmmer engine runs the same search in process with the HMMER library, the models being loaded once per worker.
+"""
+
+NHMMSCAN_ARGS = ["--notextw", "--max", "--watson", "-o", "/dev/null", "--tblout", "/dev/stdout"]
+PRESS_SUFFIXES = (".h3f", ".h3i", ".h3m", ".h3p")
+ENGINES = ("nhmmscan", "pyhmmer")
 
 
 def _parse_hmmscan_tab(lines, reads):
@@ -19,7 +42,7 @@ def _parse_hmmscan_tab(lines, reads):
             continue
         if line.startswith('#'):
             continue
-        tmp = re.split(r'\s+', line)
+        tmp = line.split()
         hit = Hit(tmp[2], int(tmp[6]), int(tmp[7]) + 1, tmp[0], int(tmp[4]), int(tmp[5]) + 1, float(tmp[12]))
         res.append(hit)
 
@@ -30,30 +53,180 @@ def _parse_hmmscan_tab(lines, reads):
         yield buff[r.Id]
 
 
-def find_locations(reads, phmm_file, E, pool, min_batch):
-    "Find alignment hits of all primers in all reads using the pHMM/nhmmscan backend"
-    batches = list(utils.batch(reads, min_batch))
-    for res in pool.map(_find_locations_single, zip(batches, [(phmm_file, E, 1)] * len(batches))):
-        for h in res:
-            yield list(h)
+def stream_locations(reads, E, pool, min_batch, max_in_flight=None, threads=1, sizer=None):
+    """ Find alignment hits of all primers in a stream of reads using the pHMM/nhmmscan backend.
+    The profile HMM file is taken from the context of the worker pool. Reads are sent to the workers
+    in work units of min_batch reads (packed, see packed_batch), with at most max_in_flight work units
+    submitted at a time, and searched by nhmmscan with threads CPUs. If a sizer is given (see
+    phmm_topology.BatchSizer), it sets the size of every work unit and records their search times.
+    Yields (read, hits) pairs in input order.
+    """
+    if sizer is None:
+        return scheduler.stream_map(_find_locations_packed, reads, pool, min_batch, max_in_flight, (E, threads),
+                                    pack=packed_batch.pack_reads, unpack=packed_batch.unpack_hits)
 
+    def unpack(chunk, res):
+        packed, seconds = res
+        sizer.record(len(chunk), seconds)
+        return packed_batch.unpack_hits(chunk, packed)
 
-def _find_locations_single(params):
-    "Find alignment hits of all primers in a single reads using the pHMM/nhmmscan backend"
-    reads = params[0]
-    phmm_file, E, threads = params[1]
+    return scheduler.stream_map(_find_locations_timed, reads, pool, sizer, max_in_flight, (E, threads),
+                                pack=packed_batch.pack_reads, unpack=unpack)
+
+
+def find_locations(reads, E, pool, min_batch, max_in_flight=None):
+    """ Find alignment hits of all primers in all reads using the pHMM/nhmmscan backend.
+    The profile HMM file is taken from the context of the worker pool.
+    """
+    for _, hits in stream_locations(reads, E, pool, min_batch, max_in_flight):
+        yield list(hits)
+
+
+def _find_locations_packed(params):
+    "Find alignment hits of all primers in a packed work unit, returning packed hits"
+    packed, read_params = params
+    return packed_batch.pack_hits(_find_locations_single((packed_batch.unpack_reads(packed), read_params)))
+
+
+def _find_locations_timed(params):
+    "Find alignment hits in a packed work unit, returning packed hits and the search time"
+    start = time.perf_counter()
+    packed = _find_locations_packed(params)
+    return packed, time.perf_counter() - start
+
+
+def is_pressed(phmm_file):
+    "Check whether a profile HMM file has an hmmpress index"
+    return all(os.path.isfile(phmm_file + x) for x in PRESS_SUFFIXES)
+
+
+def pressed_model(phmm_file, cache_dir=None):
+    """ Return a profile HMM file with an hmmpress index. Files without an index are copied
+    to the cache directory, under the hash of their content, and pressed there once.
+
+    :param phmm_file: Profile HMM file.
+    :param cache_dir: Cache directory (~/.cache/pychopper by default).
+    :returns: Path of the pressed file.
+    :rtype: str
+    """
     if not os.path.isfile(phmm_file):
         raise Exception("Profile HMM file is invalid: " + phmm_file)
-    cmd = "nhmmscan --notextw --max -E {} --cpu {} --watson -o /dev/null --tblout /dev/stdout {} -"
-    cmd = cmd.format(E, threads, phmm_file)
-    with sp.Popen(cmd, shell=True, stdin=sp.PIPE, stdout=sp.PIPE) as proc:
-        in_data = ""
-        for read in reads:
-            in_data += ">{}\n{}\n".format(read.Id, read.Seq)
-        dout, derr = proc.communicate(in_data.encode())
-
-    if derr is not None:
-        print("Failed to run hmmscan with model {} and read {}:".format(phmm_file, read.Name), file=sys.stderr)
-        sys.exit(1)
-
-    return list(_parse_hmmscan_tab(dout.decode().split("\n"), reads))
+    if is_pressed(phmm_file):
+        return phmm_file
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "pychopper")
+    with open(phmm_file, "rb") as fh:
+        digest = hashlib.sha1(fh.read()).hexdigest()
+    target_dir = os.path.join(cache_dir, digest)
+    target = os.path.join(target_dir, os.path.basename(phmm_file))
+    if is_pressed(target):
+        return target
+    # Press in a temporary directory which is then renamed, so concurrent runs never see a partial index:
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        shutil.copyfile(phmm_file, os.path.join(tmp_dir, os.path.basename(phmm_file)))
+        sp.run(["hmmpress", os.path.join(tmp_dir, os.path.basename(phmm_file))], stdout=sp.DEVNULL, check=True)
+        try:
+            os.rename(tmp_dir, target_dir)
+        except OSError:
+            # Pressed by a concurrent run:
+            pass
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target
+
+
+class NhmmscanRunner(object):
+    "Runs nhmmscan on batches of reads with a fixed profile HMM file and parameters"
+
+    def __init__(self, phmm_file, E, threads):
+        if not os.path.isfile(phmm_file):
+            raise Exception("Profile HMM file is invalid: " + phmm_file)
+        self.phmm_file = phmm_file
+        self.cmd = ["nhmmscan"] + NHMMSCAN_ARGS + ["-E", str(E), "--cpu", str(threads), phmm_file, "-"]
+
+    def scan(self, reads):
+        "Return a list of hits per read"
+        data = "".join([">{}\n{}\n".format(read.Id, read.Seq) for read in reads]).encode()
+        with sp.Popen(self.cmd, stdin=sp.PIPE, stdout=sp.PIPE) as proc:
+            writer = threading.Thread(target=_write_input, args=(proc.stdin, data))
+            writer.start()
+            res = list(_parse_hmmscan_tab(io.TextIOWrapper(proc.stdout), reads))
+            writer.join()
+        if proc.returncode != 0:
+            print("Failed to run nhmmscan with model {} (exit status {})".format(self.phmm_file, proc.returncode), file=sys.stderr)
+            sys.exit(1)
+        return res
+
+
+def _write_input(fh, data):
+    "Write the input of a process and close it, the process may exit early on errors"
+    try:
+        fh.write(data)
+        fh.close()
+    except BrokenPipeError:
+        pass
+
+
+class PyhmmerRunner(object):
+    """ Scans batches of reads in process with pyhmmer, giving the same hits as NhmmscanRunner.
+    Every model is searched against all reads of a batch at once. nhmmscan searches each read on its own,
+    its E-values being proportional to the read length, so the E-values of the batch search are scaled by
+    the length of the read over the total length, then rounded to two digits as in the nhmmscan table.
+    """
+
+    def __init__(self, phmm_file, E, threads):
+        if plan7 is None:
+            raise Exception("The pyhmmer phmm engine requires the pyhmmer package!")
+        if not os.path.isfile(phmm_file):
+            raise Exception("Profile HMM file is invalid: " + phmm_file)
+        with plan7.HMMFile(phmm_file) as fh:
+            self.hmms = list(fh)
+        # Model names are bytes before pyhmmer 0.11:
+        self.names = [hmm.name.decode() if isinstance(hmm.name, bytes) else hmm.name for hmm in self.hmms]
+        self.alphabet = self.hmms[0].alphabet
+        self.E = E
+        # Equivalent of nhmmscan --max --watson, reporting thresholds are applied after scaling:
+        self.pipeline = plan7.LongTargetsPipeline(self.alphabet, strand="watson", bias_filter=False, F1=1.0, F2=1.0, F3=1.0)
+
+    def scan(self, reads):
+        "Return a list of hits per read"
+        res = [[] for _ in reads]
+        total = sum(len(read.Seq) for read in reads)
+        if total == 0:
+            return res
+        seqs = easel.TextSequenceBlock([easel.TextSequence(name=str(i).encode(), sequence=read.Seq)
+                                        for i, read in enumerate(reads)]).digitize(self.alphabet)
+        # The batch E-values of hits passing the per-read cutoff are at most E * total / shortest length:
+        self.pipeline.E = self.pipeline.domE = self.E * total / max(min(len(read.Seq) for read in reads), 1)
+        for hmm, name in zip(self.hmms, self.names):
+            # The pipeline accumulates the searched length used by the E-values, reset it for every model:
+            self.pipeline.clear()
+            for hit in self.pipeline.search_hmm(hmm, seqs):
+                i = int(hit.name)
+                evalue = hit.evalue * len(reads[i].Seq) / total
+                if evalue > self.E:
+                    continue
+                aln = hit.best_domain.alignment
+                res[i].append(Hit(reads[i].Id, aln.target_from, aln.target_to + 1, name, aln.hmm_from, aln.hmm_to + 1,
+                                  float("{:.2g}".format(evalue))))
+        for hits in res:
+            hits.sort(key=lambda h: h.Score)
+        return res
+
+
+def _runner(ctx, E, threads):
+    "Return the phmm runner of the worker for a cutoff and number of threads, creating it on first use"
+    runners = ctx.setdefault("phmm_runners", {})
+    if (E, threads) not in runners:
+        engine = PyhmmerRunner if ctx.get("phmm_engine") == "pyhmmer" else NhmmscanRunner
+        runners[E, threads] = engine(ctx["phmm_file"], E, threads)
+    return runners[E, threads]
+
+
+def _find_locations_single(params):
+    "Find alignment hits of all primers in a batch of reads using the pHMM/nhmmscan backend"
+    reads = params[0]
+    E, threads = params[1]
+    return _runner(get_context(), E, threads).scan(reads)
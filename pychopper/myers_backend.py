@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from functools import partial
+
+from pychopper import scheduler, packed_batch, edlib_backend
+from pychopper.worker_pool import get_context
+
+""" Bit-parallel multi-primer search (Myers' algorithm) giving the same locations as edlib in HW mode.
+All primers are packed side by side into 64-bit words and the reads of a work unit are cut into chunks
+which are scanned together with NumPy, each step processing one base of every chunk for all primers.
+Chunks overlap by the longest possible primer alignment, so every alignment within the maximum edit
+distance ends in a chunk which contains all of it. The start of every best location is found by a
+second, backward scan from its end, as edlib does. Locations are refined as in the edlib backend.
+"""
+
+CHUNK_SIZE = 256
+MAX_LANES = 16384
+WORD_SIZE = 64
+
+_ONE = np.uint64(1)
+_ALL = ~np.uint64(0)
+
+
+class MultiPrimerMatcher(object):
+    "Primers packed into 64-bit words for bit-parallel approximate search"
+
+    def __init__(self, primers, max_ed, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.names = [acc for acc, seq in primers.items() if len(seq) <= WORD_SIZE]
+        # Longer primers do not fit in a word and are searched with edlib:
+        self.long = [acc for acc, seq in primers.items() if len(seq) > WORD_SIZE]
+        self.max_eds = {acc: int(max_ed * len(seq)) for acc, seq in primers.items()}
+        seqs = [primers[acc] for acc in self.names]
+        self.lengths = np.array([len(s) for s in seqs], dtype=np.int64)
+        self.ks = np.array([self.max_eds[acc] for acc in self.names], dtype=np.int64)
+        self.overlap = int(max(self.lengths + self.ks)) - 1 if len(seqs) > 0 else 0
+        # Pack the primers into words, bit i of a primer's segment standing for its base i:
+        seg_word, offsets, word, offset = [], [], -1, WORD_SIZE
+        for m in self.lengths.tolist():
+            if offset + m > WORD_SIZE:
+                word, offset = word + 1, 0
+            seg_word.append(word)
+            offsets.append(offset)
+            offset += m
+        nr_words = word + 1
+        self.seg_word = np.array(seg_word, dtype=np.int64)
+        self.seg_top = np.array([o + m - 1 for o, m in zip(offsets, self.lengths.tolist())], dtype=np.uint64)
+        self.peq = np.zeros((256, nr_words), dtype=np.uint64)
+        self.high = np.zeros(nr_words, dtype=np.uint64)
+        self.low = np.zeros(nr_words, dtype=np.uint64)
+        # Match masks of the reversed primers, one primer per word:
+        self.rpeq = np.zeros((len(seqs), 256), dtype=np.uint64)
+        for i, (seq, w, o) in enumerate(zip(seqs, self.seg_word.tolist(), offsets)):
+            for j, c in enumerate(seq.encode("latin-1")):
+                self.peq[c, w] |= _ONE << np.uint64(o + j)
+                self.rpeq[i, c] |= _ONE << np.uint64(len(seq) - 1 - j)
+            self.high[w] |= _ONE << np.uint64(o + len(seq) - 1)
+            self.low[w] |= _ONE << np.uint64(o)
+
+    def _forward(self, buf):
+        "Scan chunks (columns of buf) for all primers, returning scores after the overlap (steps x chunks x primers)"
+        steps, lanes = buf.shape
+        nr_words = self.peq.shape[1]
+        not_high, not_low = ~self.high, ~self.low
+        pv = np.full((lanes, nr_words), _ALL)
+        mv = np.zeros((lanes, nr_words), dtype=np.uint64)
+        eq, xv, x, y, ph, mh = (np.empty_like(pv) for _ in range(6))
+        dp = np.empty((lanes, len(self.names)), dtype=np.uint64)
+        dm = np.empty_like(dp)
+        score = np.tile(self.lengths.astype(np.int8), (lanes, 1))
+        res = np.empty((steps - self.overlap, lanes, len(self.names)), dtype=np.int8)
+        for j in range(steps):
+            np.take(self.peq, buf[j], axis=0, out=eq)
+            np.bitwise_or(eq, mv, out=xv)
+            # Xh = (((Eq & Pv) + Pv) ^ Pv) | Eq, the addition not carrying across primer segments:
+            np.bitwise_and(eq, pv, out=x)
+            np.bitwise_xor(x, pv, out=y)
+            np.bitwise_and(y, self.high, out=y)
+            np.bitwise_and(x, not_high, out=x)
+            np.bitwise_and(pv, not_high, out=ph)
+            np.add(x, ph, out=x)
+            np.bitwise_xor(x, y, out=x)
+            np.bitwise_xor(x, pv, out=x)
+            np.bitwise_or(x, eq, out=x)
+            # Ph = Mv | ~(Xh | Pv), Mh = Pv & Xh:
+            np.bitwise_or(x, pv, out=y)
+            np.invert(y, out=y)
+            np.bitwise_or(y, mv, out=ph)
+            np.bitwise_and(pv, x, out=mh)
+            # The last row of every segment gives the score change:
+            np.right_shift(ph[:, self.seg_word], self.seg_top, out=dp)
+            np.right_shift(mh[:, self.seg_word], self.seg_top, out=dm)
+            np.bitwise_and(dp, _ONE, out=dp)
+            np.bitwise_and(dm, _ONE, out=dm)
+            score += dp.astype(np.int8)
+            score -= dm.astype(np.int8)
+            if j >= self.overlap:
+                res[j - self.overlap] = score
+            # Alignments start anywhere in the read, no carry into the first row of a segment:
+            np.left_shift(ph, _ONE, out=ph)
+            np.bitwise_and(ph, not_low, out=ph)
+            np.left_shift(mh, _ONE, out=mh)
+            np.bitwise_and(mh, not_low, out=mh)
+            np.bitwise_or(xv, ph, out=y)
+            np.invert(y, out=y)
+            np.bitwise_or(y, mh, out=pv)
+            np.bitwise_and(ph, xv, out=mv)
+        return res
+
+    def _starts(self, flat, ends, primer, best, limit):
+        "Find alignment starts by scanning backwards from the ends, keeping the longest best alignment as edlib does"
+        m = self.lengths[primer]
+        top = (m - 1).astype(np.uint64)
+        pv = np.full(len(ends), _ALL)
+        mv = np.zeros(len(ends), dtype=np.uint64)
+        score = m.copy()
+        last = np.zeros(len(ends), dtype=np.int64)
+        for t in range(self.overlap + 1):
+            eq = self.rpeq[primer, flat[ends - t]]
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | ~(xh | pv)
+            mh = pv & xh
+            score += ((ph >> top) & _ONE).astype(np.int64) - ((mh >> top) & _ONE).astype(np.int64)
+            # The alignment has to end at the end location, the first row is not free:
+            ph = (ph << _ONE) | _ONE
+            mh = mh << _ONE
+            pv = mh | ~(xv | ph)
+            mv = ph & xv
+            last = np.where((score == best) & (t <= limit), t, last)
+        return last
+
+    def locations(self, seqs):
+        """ Find the best locations of all primers in a list of sequences.
+
+        :param seqs: List of sequences.
+        :returns: List with a dictionary of (edit distance, list of (start, inclusive end) locations) per
+            primer for each sequence, primers without a location within their maximum edit distance being left out.
+        :rtype: list
+        """
+        res = [{} for _ in seqs]
+        if len(self.names) == 0 or len(seqs) == 0:
+            return res
+        ov, size = self.overlap, self.chunk_size
+        lens = np.array([len(s) for s in seqs], dtype=np.int64)
+        # Sequences are preceded by ov bytes (code 0, matching no primer base) in a flat buffer:
+        offsets = np.concatenate(([0], np.cumsum(lens + ov)))
+        flat = np.zeros(offsets[-1] + size, dtype=np.uint8)
+        data = np.frombuffer("".join(seqs).encode("latin-1"), dtype=np.uint8)
+        flat[np.repeat(offsets[:-1] + ov - np.concatenate(([0], np.cumsum(lens)[:-1])), lens) + np.arange(len(data))] = data
+        # Cut the sequences into chunks, every chunk is preceded by ov bases of context:
+        nr_chunks = (lens + size - 1) // size
+        lane_seq = np.repeat(np.arange(len(seqs)), nr_chunks)
+        lane_start = (np.arange(len(lane_seq)) - np.repeat(np.cumsum(nr_chunks) - nr_chunks, nr_chunks)) * size
+        best = np.full((len(seqs), len(self.names)), np.iinfo(np.int8).max, dtype=np.int8)
+        found = []
+        for b in range(0, len(lane_seq), MAX_LANES):
+            lanes = slice(b, b + MAX_LANES)
+            buf = flat[(offsets[lane_seq[lanes]] + lane_start[lanes])[None, :] + np.arange(ov + size)[:, None]]
+            scores = self._forward(buf)
+            pos = lane_start[lanes][None, :] + np.arange(size)[:, None]
+            scores[pos >= lens[lane_seq[lanes]][None, :]] = np.iinfo(np.int8).max
+            np.minimum.at(best, lane_seq[lanes], scores.min(axis=0))
+            found.append((scores, lane_seq[lanes], pos))
+        ok = best <= self.ks[None, :]
+        # Best end locations of every sequence and primer:
+        e_seq, e_primer, e_end = [], [], []
+        for scores, seqs_idx, pos in found:
+            step, lane, primer = np.nonzero((scores == best[seqs_idx][None, :, :]) & ok[seqs_idx][None, :, :])
+            e_seq.append(seqs_idx[lane])
+            e_primer.append(primer)
+            e_end.append(pos[step, lane])
+        e_seq, e_primer, e_end = (np.concatenate(x) for x in (e_seq, e_primer, e_end))
+        order = np.lexsort((e_end, e_primer, e_seq))
+        e_seq, e_primer, e_end = e_seq[order], e_primer[order], e_end[order]
+        e_best = best[e_seq, e_primer].astype(np.int64)
+        e_start = e_end - self._starts(flat, offsets[e_seq] + ov + e_end, e_primer, e_best, e_end)
+        for s, p, start, end, ed in zip(e_seq.tolist(), e_primer.tolist(), e_start.tolist(), e_end.tolist(), e_best.tolist()):
+            acc = self.names[p]
+            if acc not in res[s]:
+                res[s][acc] = (ed, [])
+            res[s][acc][1].append((start, end))
+        return res
+
+
+def stream_locations(reads, max_ed, pool, min_batch, edit_distances=False, max_in_flight=None, max_score=None, refine_sup=None):
+    """ Find alignment hits of all primers in a stream of reads using the bit-parallel search and parasail.
+    Takes the same parameters and gives the same hits as edlib_backend.stream_locations.
+    """
+    return scheduler.stream_map(_find_locations_packed, reads, pool, min_batch, max_in_flight, (max_ed, edit_distances, max_score),
+                                pack=packed_batch.pack_reads,
+                                unpack=partial(edlib_backend._unpack_hits, edit_distances=edit_distances, refine_sup=refine_sup))
+
+
+def find_locations(reads, max_ed, pool, min_batch, edit_distances=False, max_in_flight=None, max_score=None):
+    """ Find alignment hits of all primers in all reads using the bit-parallel search and parasail.
+    Takes the same parameters and gives the same hits as edlib_backend.find_locations.
+    """
+    for _, hits in stream_locations(reads, max_ed, pool, min_batch, edit_distances, max_in_flight, max_score):
+        yield hits
+
+
+def _find_locations_packed(params):
+    "Find alignment hits of all primers in a packed work unit, returning packed hits and refinement counts"
+    packed, read_params = params
+    counts = [0, 0]
+    hits = _find_locations_batch((packed_batch.unpack_reads(packed), read_params), counts)
+    return packed_batch.pack_hits(hits, read_params[1]) + (tuple(counts),)
+
+
+def _matcher(ctx, max_ed):
+    "Return the matcher of the worker's primers for a maximum edit distance, building it on first use"
+    matchers = ctx.setdefault("matchers", {})
+    if max_ed not in matchers:
+        matchers[max_ed] = MultiPrimerMatcher(ctx["primers"], max_ed, ctx.get("chunk_size", CHUNK_SIZE))
+    return matchers[max_ed]
+
+
+def _find_locations_batch(params, counts=None):
+    "Find alignment hits of all primers in a work unit of reads, scanning the reads together"
+    reads, read_params = params
+    max_ed, edit_distances, max_score = read_params
+    ctx = get_context()
+    matcher = _matcher(ctx, max_ed)
+    res = []
+    for read, found in zip(reads, matcher.locations([read.Seq for read in reads])):
+        primer_locations = []
+        for primer_acc, primer_seq in ctx["primers"].items():
+            if primer_acc in found:
+                primer_locations.append((primer_acc,) + found[primer_acc])
+            elif primer_acc in matcher.long:
+                ed, locations = edlib_backend._edlib_locations(primer_seq, read.Seq, matcher.max_eds[primer_acc])
+                primer_locations.append((primer_acc, ed, locations))
+        res.append(edlib_backend.refine_primer_locations(read, primer_locations, ctx, edit_distances, max_score, counts))
+    return res
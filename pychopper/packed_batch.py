@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from pychopper import columnar
+from pychopper.common_structures import Hit, Seq
+
+""" Wire format of backend work units. Reads are sent to the workers as their concatenated sequences
+and an offsets array, names and qualities stay in the main process. Hits come back as a structured
+NumPy array with one row per hit, referencing the read by its index in the work unit and the primer
+by its index in a tuple of primer names.
+"""
+
+HIT_DTYPE = np.dtype([
+    ("read", np.int32),
+    ("ref_start", np.int32),
+    ("ref_end", np.int32),
+    ("primer", np.int32),
+    ("query_start", np.int32),
+    ("query_end", np.int32),
+    ("score", np.float64),
+    ("edit_distance", np.int32),
+])
+
+
+def pack_reads(reads):
+    """ Pack the sequences of a work unit.
+
+    :param reads: List of reads.
+    :returns: Concatenated sequences (bytes) and array of read offsets (one more than the number of reads).
+    :rtype: tuple
+    """
+    offsets = np.zeros(len(reads) + 1, dtype=np.int64)
+    np.cumsum([len(r.Seq) for r in reads], out=offsets[1:])
+    return "".join(r.Seq for r in reads).encode("latin-1"), offsets
+
+
+def unpack_reads(packed):
+    "Unpack the sequences of a work unit as reads named by their index"
+    data, offsets = packed
+    seqs = data.decode("latin-1")
+    bounds = offsets.tolist()
+    return [Seq(str(i), str(i), seqs[bounds[i]:bounds[i + 1]], None) for i in range(len(bounds) - 1)]
+
+
+def pack_hits(hit_lists, edit_distances=False):
+    """ Pack the hits of a work unit.
+
+    :param hit_lists: List of hit lists, one per read.
+    :param edit_distances: The hits are (edit distance, hit) pairs.
+    :returns: Hit array of HIT_DTYPE and tuple of primer names.
+    :rtype: tuple
+    """
+    names, ids, rows = [], {}, []
+    for i, hits in enumerate(hit_lists):
+        for hit in hits:
+            ed = -1
+            if edit_distances:
+                ed, hit = hit
+            pid = ids.get(hit.Query)
+            if pid is None:
+                pid = ids[hit.Query] = len(names)
+                names.append(hit.Query)
+            rows.append((i, hit.RefStart, hit.RefEnd, pid, hit.QueryStart, hit.QueryEnd, hit.Score, ed))
+    return np.array(rows, dtype=HIT_DTYPE), tuple(names)
+
+
+def unpack_hits(reads, packed, edit_distances=False):
+    """ Unpack the hits of a work unit.
+
+    :param reads: List of reads of the work unit, in the order they were packed.
+    :param packed: Hit array and tuple of primer names.
+    :param edit_distances: Return (edit distance, hit) pairs.
+    :returns: List of hit lists, one per read. Without edit distances, these are HitViews of a columnar
+        HitBatch (see columnar), which build their Hit tuples when accessed.
+    :rtype: list
+    """
+    if not edit_distances:
+        return columnar.HitBatch.from_packed(reads, packed).views()
+    hits, names = packed
+    bounds = np.searchsorted(hits["read"], np.arange(len(reads) + 1)).tolist()
+    cols = [hits[f].tolist() for f in ("ref_start", "ref_end", "primer", "query_start", "query_end", "score", "edit_distance")]
+    res = []
+    for i, read in enumerate(reads):
+        read_hits = []
+        for j in range(bounds[i], bounds[i + 1]):
+            hit = Hit(read.Name, cols[0][j], cols[1][j], names[cols[2][j]], cols[3][j], cols[4][j], cols[5][j])
+            read_hits.append((cols[6][j], hit))
+        res.append(read_hits)
+    return res
@@ -56,3 +56,71 @@ def refine_locations(read, all_primers, locations, aln_params=DEFAULT_ALIGN_PARA
         rloc = Hit(loc.Ref, loc.RefStart + aln["ref_start"], loc.RefStart + aln["ref_end"], loc.Query, aln["query_start"], aln["query_end"], rscore)
         proc_locations.append(rloc)
     return proc_locations
+
+
+# BAM operation codes of the insertion and deletion cigar operations (MIDNSHP=X):
+_CIGAR_INS, _CIGAR_DEL = 1, 2
+
+
+class ProfileCache(dict):
+    "Parasail query profiles of primers, created on first use"
+
+    def __init__(self, all_primers, subs_mat):
+        super().__init__()
+        self.primers = all_primers
+        self.subs_mat = subs_mat
+
+    def __missing__(self, primer_acc):
+        profile = parasail.profile_create_32(self.primers[primer_acc], self.subs_mat)
+        self[primer_acc] = profile
+        return profile
+
+
+def refine_locations_profiled(read, all_primers, locations, profiles, aln_params=DEFAULT_ALIGN_PARAMS, max_score=None):
+    """ Refine alignment edges based on local alignment, giving the same hits as refine_locations.
+
+    The primer profiles are reused across calls. If max_score is given, the alignment score is computed
+    first and hits with a normalized score above max_score are dropped without running the traceback.
+
+    :param read: Read.
+    :param all_primers: Dictionary of primer sequences.
+    :param locations: Hits to refine.
+    :param profiles: ProfileCache of the primers.
+    :param aln_params: Alignment parameters.
+    :param max_score: Maximum normalized score of the returned hits (None to return all hits).
+    :returns: List of refined hits.
+    :rtype: list
+    """
+    seq = read.Seq
+    gap_open, gap_extend = aln_params['gap_open'], aln_params['gap_extend']
+
+    proc_locations = []
+    for loc in locations:
+        ref = seq[loc.RefStart:loc.RefEnd]
+        if len(ref) == 0:
+            continue
+        profile = profiles[loc.Query]
+        best = float(aln_params['match'] * len(all_primers[loc.Query]))
+        if max_score is not None:
+            # The striped score-only kernel can underestimate scores when gap_open == gap_extend, scan agrees with the traceback:
+            score = parasail.sw_scan_profile_32(profile, ref, gap_open, gap_extend).score
+            if (best - score) / best > max_score:
+                continue
+        aln = parasail.sw_trace_striped_profile_32(profile, ref, gap_open, gap_extend)
+        if aln.score <= 0:
+            # No base of the window matches the primer, the cigar is empty:
+            continue
+        # Read the cigar structure directly, building the Cigar.seq array or the cigar string is costly:
+        cigar = aln.cigar.pointer[0]
+        if cigar.len == 0:
+            continue
+        ref_start, query_start = cigar.beg_ref, cigar.beg_query
+        # Skip a leading insertion or deletion, as process_alignment does:
+        first = cigar.seq[0]
+        if first & 0xf == _CIGAR_INS:
+            query_start += first >> 4
+        elif first & 0xf == _CIGAR_DEL:
+            ref_start += first >> 4
+        rloc = Hit(loc.Ref, loc.RefStart + ref_start, loc.RefStart + aln.end_ref + 1, loc.Query, query_start, aln.end_query + 1, (best - aln.score) / best)
+        proc_locations.append(rloc)
+    return proc_locations
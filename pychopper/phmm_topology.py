@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import math
+from collections import namedtuple
+
+""" Topology of the phmm backend: the number of concurrent nhmmscan processes, the --cpu of each
+process and the number of reads per work unit. Every work unit starts a process which loads the models,
+so work units should carry enough bases to amortize the start. nhmmscan threads share the models of a
+single read, so threads beyond the number of models are idle and several processes are preferred over
+threads; threads are only given to processes when the input is too small to keep every core busy.
+The batch size is adjusted between work units, so that a work unit takes about TARGET_SECONDS at the
+throughput measured on the previous ones.
+"""
+
+Topology = namedtuple("Topology", "processes cpu batch_size max_batch_size")
+
+MIN_BATCH_BASES = 200000
+MAX_BATCH_BASES = 50000000
+BATCHES_PER_PROCESS = 4
+MAX_CPU = 4
+DEFAULT_READ_LENGTH = 1000
+TARGET_SECONDS = 5.0
+
+
+def plan(cores, nr_reads=None, lengths=None, max_batch=1000, max_cpu=MAX_CPU):
+    """ Pick the phmm topology for an input.
+
+    :param cores: Number of cores available.
+    :param nr_reads: Number of input reads (None if unknown).
+    :param lengths: Lengths of a sample of input reads (None if unknown).
+    :param max_batch: Maximum number of reads in the first work units.
+    :param max_cpu: Maximum --cpu of a process (the number of models searched per read).
+    :returns: Topology, with the limit of the adjusted batch size.
+    :rtype: Topology
+    """
+    cores = max(1, cores)
+    mean_length = max(1.0, sum(lengths) / len(lengths)) if lengths else DEFAULT_READ_LENGTH
+    # Bound the bases held by a work unit:
+    max_batch_size = max(1, int(MAX_BATCH_BASES / mean_length))
+    max_batch = max(1, min(max_batch, max_batch_size))
+    if nr_reads is None:
+        return Topology(cores, 1, max_batch, max_batch_size)
+    nr_reads = max(1, nr_reads)
+    # One process per core, unless there are too few bases to give every process a worthwhile batch:
+    processes = max(1, min(cores, nr_reads, int(nr_reads * mean_length / MIN_BATCH_BASES)))
+    cpu = max(1, min(cores // processes, max_cpu))
+    # A few batches per process balance the load, each large enough to amortize the start:
+    per_process = int(math.ceil(nr_reads / processes))
+    batch_size = max(int(math.ceil(per_process / BATCHES_PER_PROCESS)), int(MIN_BATCH_BASES / mean_length))
+    batch_size = max(1, min(batch_size, per_process, max_batch))
+    # Adjusted batches stay small enough to keep all processes busy until the end:
+    max_batch_size = max(batch_size, min(max_batch_size, int(math.ceil(per_process / 2))))
+    return Topology(processes, cpu, batch_size, max_batch_size)
+
+
+class BatchSizer(object):
+    """ Size of the next work unit, adjusted from the measured throughput of finished ones.
+    The size changes by at most a factor of two per work unit and stays in [1, max_batch].
+    """
+
+    def __init__(self, batch_size, max_batch, target_seconds=TARGET_SECONDS):
+        self.batch_size = batch_size
+        self.initial_size = batch_size
+        self.max_batch = max(max_batch, batch_size)
+        self.target_seconds = target_seconds
+        self.reads = 0
+        self.seconds = 0.0
+
+    def __call__(self):
+        return self.batch_size
+
+    def record(self, nr_reads, seconds):
+        "Record the time taken by a work unit and adjust the batch size"
+        self.reads += nr_reads
+        self.seconds += seconds
+        if nr_reads == 0 or seconds <= 0:
+            return
+        target = nr_reads * self.target_seconds / seconds
+        self.batch_size = int(max(1, self.batch_size / 2, min(target, 2 * self.batch_size, self.max_batch)))
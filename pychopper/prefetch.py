@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+import io
+import sys
+import zlib
+import struct
+import threading
+import queue
+from collections import deque
+from time import perf_counter
+
+""" Input prefetching: a background thread reads (and decompresses) the input into a bounded queue
+which is consumed by the parser. BGZF blocks are inflated in parallel on a thread pool, other gzip
+streams are inflated sequentially by the background thread.
+"""
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_QUEUE_SIZE = 16
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def is_bgzf(head):
+    "Check if a byte string starts with a BGZF block header"
+    if len(head) < 18 or head[:4] != b"\x1f\x8b\x08\x04":
+        return False
+    return head[12:14] == b"BC"
+
+
+def _bgzf_blocks(fh):
+    "Iterate over the raw deflate payloads of BGZF blocks"
+    while True:
+        head = fh.read(12)
+        if len(head) == 0:
+            return
+        if len(head) < 12 or head[:4] != b"\x1f\x8b\x08\x04":
+            raise ValueError("Invalid or truncated BGZF block header!")
+        xlen = struct.unpack("<H", head[10:12])[0]
+        extra = fh.read(xlen)
+        bsize, pos = None, 0
+        while pos + 4 <= len(extra):
+            slen = struct.unpack("<H", extra[pos + 2:pos + 4])[0]
+            if extra[pos:pos + 2] == b"BC":
+                bsize = struct.unpack("<H", extra[pos + 4:pos + 6])[0] + 1
+            pos += 4 + slen
+        if bsize is None:
+            raise ValueError("Gzip member without BGZF block size in a BGZF file!")
+        rest = fh.read(bsize - 12 - xlen)
+        if len(rest) < bsize - 12 - xlen:
+            raise ValueError("Truncated BGZF block!")
+        yield rest[:-8], rest[-8:]
+
+
+def _inflate_block(payload, footer):
+    "Inflate and check a BGZF block"
+    data = zlib.decompress(payload, -15)
+    crc, size = struct.unpack("<II", footer)
+    if len(data) != size or (zlib.crc32(data) & 0xffffffff) != crc:
+        raise ValueError("BGZF block failed integrity check!")
+    return data
+
+
+def _gzip_chunks(fh, chunk_size):
+    "Inflate a (possibly multi-member) gzip stream chunk by chunk"
+    d = zlib.decompressobj(31)
+    started = False
+    for chunk in _raw_chunks(fh, chunk_size):
+        while len(chunk) > 0:
+            started = True
+            out = d.decompress(chunk)
+            if len(out) > 0:
+                yield out
+            if not d.eof:
+                break
+            # Start of the next gzip member, skipping zero padding as the gzip module does:
+            chunk = d.unused_data.lstrip(b"\x00")
+            d = zlib.decompressobj(31)
+            started = False
+    if started and not d.eof:
+        raise EOFError("Compressed input ended before the end-of-stream marker was reached!")
+
+
+def _raw_chunks(fh, chunk_size):
+    "Read chunks of a binary file handle"
+    while True:
+        chunk = fh.read(chunk_size)
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+class _PrefetchRaw(io.RawIOBase):
+    "Raw binary stream over the chunks produced by a background thread"
+
+    def __init__(self, fh, pool, chunk_size, queue_size):
+        self._fh = fh
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._buff = memoryview(b"")
+        self._eof = False
+        self.wait_time = 0.0
+        self._thread = threading.Thread(target=self._produce, args=(pool, chunk_size, queue_size), daemon=True)
+        self._thread.start()
+
+    def _chunks(self, pool, chunk_size, queue_size):
+        head = self._fh.peek(18)[:18] if hasattr(self._fh, "peek") else b""
+        if pool is not None and is_bgzf(head):
+            pending = deque()
+            for block in _bgzf_blocks(self._fh):
+                pending.append(pool.submit(_inflate_block, *block))
+                while len(pending) > queue_size or (len(pending) > 0 and pending[0].done()):
+                    yield pending.popleft().result()
+            while len(pending) > 0:
+                yield pending.popleft().result()
+        elif head[:2] == _GZIP_MAGIC:
+            yield from _gzip_chunks(self._fh, chunk_size)
+        else:
+            yield from _raw_chunks(self._fh, chunk_size)
+
+    def _produce(self, pool, chunk_size, queue_size):
+        try:
+            for chunk in self._chunks(pool, chunk_size, queue_size):
+                if len(chunk) > 0:
+                    self._queue.put(chunk)
+                if self._stop.is_set():
+                    return
+            self._queue.put(None)
+        except Exception as e:
+            self._queue.put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self._buff) == 0:
+            if self._eof:
+                return 0
+            t0 = perf_counter()
+            chunk = self._queue.get()
+            self.wait_time += perf_counter() - t0
+            if chunk is None:
+                self._eof = True
+                return 0
+            if isinstance(chunk, Exception):
+                self._eof = True
+                raise chunk
+            self._buff = memoryview(chunk)
+        n = min(len(b), len(self._buff))
+        b[:n] = self._buff[:n]
+        self._buff = self._buff[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            # Unblock the producer if it is waiting on a full queue:
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._fh.close()
+        super().close()
+
+
+def open_input(fname, pool=None, chunk_size=DEFAULT_CHUNK_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
+    """ Open an input file for reading binary data through a prefetching background thread.
+
+    Gzip input is recognized by its magic bytes and decompressed in the background. BGZF blocks are
+    decompressed in parallel using the threads of pool. '-' stands for the standard input.
+    The total time the consumer spent waiting for data is available as the wait_time attribute of the
+    raw stream of the returned handle.
+
+    :param fname: Input file name.
+    :param pool: Thread pool used for BGZF decompression (None to decompress on the background thread).
+    :param chunk_size: Size of raw chunks read from the input.
+    :param queue_size: Maximum number of decompressed chunks prefetched.
+    :returns: Buffered binary handle.
+    """
+    fh = sys.stdin.buffer if fname == "-" else open(fname, "rb")
+    return io.BufferedReader(_PrefetchRaw(fh, pool, chunk_size, queue_size), buffer_size=chunk_size)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from itertools import islice
+from pychopper import utils, worker_pool
+
+""" Streaming execution of backend work units on a worker pool. The input is consumed lazily:
+at most max_in_flight work units are submitted at any time, so a slow consumer holds back the
+reader, and results are delivered in input order. On pools started by worker_pool.start_pool the
+work units run with the backend context of the pool, which is referenced by its key only.
+"""
+
+
+def stream_map(func, items, pool, chunk_size, max_in_flight=None, params=None, pack=None, unpack=None):
+    """ Apply func to chunks of items on a pool, keeping a bounded number of chunks in flight.
+
+    :param func: Function called in the workers with a (chunk, params) tuple, returning a list with one result per item.
+    :param items: Iterable of input items.
+    :param pool: Executor.
+    :param chunk_size: Number of items per work unit, or a function returning the size of the next work unit.
+    :param max_in_flight: Maximum number of submitted work units (None for no limit).
+    :param params: Parameters passed to func along with every chunk.
+    :param pack: Function converting a chunk to the payload sent to func (None to send the chunk).
+    :param unpack: Function called with a chunk and the result of func, returning one result per item (None to use the result).
+    :returns: Generator of (item, result) pairs in input order.
+    """
+    key = getattr(pool, "context_key", None)
+    pending = deque()
+
+    def results(chunk, future):
+        res = future.result()
+        return zip(chunk, res if unpack is None else unpack(chunk, res))
+
+    chunks = _sized_batches(items, chunk_size) if callable(chunk_size) else utils.batch(items, chunk_size)
+    for chunk in chunks:
+        payload = chunk if pack is None else pack(chunk)
+        if key is None:
+            future = pool.submit(func, (payload, params))
+        else:
+            future = pool.submit(worker_pool.run_in_context, key, func, (payload, params))
+        pending.append((chunk, future))
+        # Deliver finished work units in order, block when too many are in flight:
+        while len(pending) > 0 and (pending[0][1].done() or (max_in_flight is not None and len(pending) >= max_in_flight)):
+            yield from results(*pending.popleft())
+    while len(pending) > 0:
+        yield from results(*pending.popleft())
+
+
+def _sized_batches(items, size):
+    "Split items into lists, the size of each list being given by calling size"
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, max(1, size())))
+        if len(chunk) == 0:
+            return
+        yield chunk
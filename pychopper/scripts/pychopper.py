@@ -7,16 +7,17 @@ import sys
 import numpy as np
 import pandas as pd
 from collections import OrderedDict, defaultdict
-import concurrent.futures
 import tqdm
-import gzip
 
 from pychopper import seq_utils as seu
 from pychopper import utils
-from pychopper import chopper, report
+from pychopper import chopper, report, fastx_reader, fastx_writer, prefetch, autotune, worker_pool, hmmer_backend, phmm_topology, columnar
 import pychopper.phmm_data as phmm_data
 import pychopper.primer_data as primer_data
 
+# Seed of the reservoir sampling drawing the autotuning sample:
+AUTOTUNE_SEED = 42
+
 
 def _new_stats():
     "Initialize a new statistic dictionary"
@@ -39,7 +40,7 @@ def _update_stats(st, d_fh, segments, hits, usable_len, read):
     "Update stats dictionary with properties of a read"
     st["PassReads"] += 1
     if len(hits) > 0:
-        h = ",".join([x.Query for x in hits])
+        h = ",".join(columnar.queries(hits))
         st["Hits"][h] += 1
     if len(segments) == 0:
         st["Classification"]["Unusable"] += 1
@@ -108,6 +109,26 @@ def _process_stats(st):
         res["Category"] += ["Hits"]
         res["Name"] += [k]
         res["Value"] += [v]
+    for k, v in st.get('EndWindow', {}).items():
+        res["Category"] += ["EndWindow"]
+        res["Name"] += [k]
+        res["Value"] += [v]
+    for k, v in st.get('Refinement', {}).items():
+        res["Category"] += ["Refinement"]
+        res["Name"] += [k]
+        res["Value"] += [v]
+    for k, v in st.get('ExactMatch', {}).items():
+        res["Category"] += ["ExactMatch"]
+        res["Name"] += [k]
+        res["Value"] += [v]
+    for k, v in st.get('Hybrid', {}).items():
+        res["Category"] += ["Hybrid"]
+        res["Name"] += [k]
+        res["Value"] += [v]
+    for k, v in st.get('PhmmTopology', {}).items():
+        res["Category"] += ["PhmmTopology"]
+        res["Name"] += [k]
+        res["Value"] += [v]
     res = pd.DataFrame(res)
     return res
 
@@ -192,13 +213,6 @@ def _plot_stats(st, pdf, q, q_bak):
     R.close()
 
 
-def _opener(filename, mode, encoding='utf8'):
-    if filename.endswith('.gz'):
-        return gzip.open(filename, mode + 't', encoding=encoding)
-    else:
-        return open(filename, mode, encoding=encoding)
-
-
 def main():
     """
     Parse command line arguments.
@@ -248,7 +262,10 @@ def main():
         help="Write reads failing mean quality filter to this file.")
     parser.add_argument(
         '-Y', metavar='autotune_nr', type=float, default=10000,
-        help="Approximate number of reads used for tuning the cutoff parameter (10000).")
+        help="Number of reads sampled for tuning the cutoff parameter (10000).")
+    parser.add_argument(
+        '-W', metavar='autotune_bases', type=int, default=100000000,
+        help="Maximum number of bases buffered for tuning the cutoff parameter on standard input (100000000).")
     parser.add_argument(
         '-L', metavar='autotune_samples', type=int, default=30,
         help="Number of samples taken when tuning cutoff parameter (30).")
@@ -257,7 +274,7 @@ def main():
         help="Write alignment scores to this BED file.")
     parser.add_argument(
         '-m', metavar='method', type=str, default="phmm",
-        help="Detection method: phmm or edlib (phmm).")
+        help="Detection method: phmm, edlib, myers (bit-parallel search giving the same primer locations as edlib) or hybrid (edlib, then phmm for the reads without a single usable segment) (phmm).")
     parser.add_argument(
         '-x', metavar='rescue', type=str, default=None,
         help="Protocol-specific read rescue: DCS109 (None).")
@@ -268,21 +285,40 @@ def main():
         '-t', metavar='threads', type=int, default=8,
         help="Number of threads to use (8).")
     parser.add_argument(
-        '-B', metavar='batch_size', type=int, default=1000000,
-        help="Maximum number of reads processed in each batch (1000000).")
+        '-B', metavar='batch_size', type=int, default=1000,
+        help="Maximum number of reads in a work unit sent to a worker (1000).")
+    parser.add_argument(
+        '-F', metavar='in_flight', type=int, default=None,
+        help="Maximum number of work units in flight (4 x threads).")
+    parser.add_argument(
+        '-e', metavar='end_window', type=int, default=None,
+        help="Search primers in the first and last end_window bases of reads first, falling back to the whole read if no single segment is found (None).")
+    parser.add_argument(
+        '-P', metavar='phmm_engine', type=str, default="nhmmscan", choices=hmmer_backend.ENGINES,
+        help="Engine of the phmm backend: nhmmscan (subprocess) or pyhmmer (in process, requires pyhmmer) (nhmmscan).")
+    parser.add_argument(
+        '-E', metavar='phmm_cutoff', type=float, default=1.0,
+        help="E-value cutoff of the phmm tier in hybrid mode, -q being the cutoff of the edlib tier (1.0).")
+    parser.add_argument(
+        '-X', action='store_true', default=False,
+        help="Segment reads in which exact primer matches give a single usable segment without running the detection backend.")
     parser.add_argument(
         '-D', metavar='read stats', type=str, default=None,
         help="Tab separated file with per-read stats (None).")
     parser.add_argument('input_fastx', metavar='input_fastx', type=str,
                         help="Input file.")
     parser.add_argument('output_fastx', metavar='output_fastx', nargs="?",
-                        type=str, default="-", help="Output file.")
+                        type=str, default="-", help="Output file (compressed if the name ends in .gz).")
 
     args = parser.parse_args()
 
-    if args.m == "phmm":
+    if args.m in ("phmm", "hybrid") and args.P == "nhmmscan":
         utils.check_command("nhmmscan -h > /dev/null")
         utils.check_min_hmmer_version(3, 2)
+    if args.P == "pyhmmer" and hmmer_backend.plan7 is None:
+        sys.exit('the pyhmmer phmm engine (-P pyhmmer) requires the pyhmmer package')
+    if args.m == "hybrid" and (args.e is not None or args.X):
+        sys.exit('end windows (-e) and the exact match pre-pass (-X) are not supported in hybrid mode')
 
     CONFIG = "+:SSP,-VNP|-:VNP,-SSP"
     if args.c is not None:
@@ -310,16 +346,16 @@ def main():
 
     if args.g is None:
         args.g = kits[args.k]["HMM"]
-    elif args.m != 'phmm':
+    elif args.m not in ('phmm', 'hybrid'):
         sys.exit(
-            'if using -g option, phmm backend should be used (-m phmm)'
+            'if using -g option, phmm backend should be used (-m phmm or -m hybrid)'
         )
 
     if args.b is None:
         args.b = kits[args.k]["FAS"]
-    elif args.m != 'edlib':
+    elif args.m not in ('edlib', 'myers', 'hybrid') and not args.X:
         sys.exit(
-            'if using -b option, edlib backend should be used (-m edlib)'
+            'if using -b option, edlib backend should be used (-m edlib, -m myers or -m hybrid)'
         )
 
     if args.x is not None and args.x in ('DCS109'):
@@ -330,33 +366,30 @@ def main():
     sys.stderr.write("Using kit: {}\n".format(args.k))
     sys.stderr.write("Configurations to consider: \"{}\"\n".format(CONFIG))
 
-    in_fh = sys.stdin
-    if args.input_fastx != '-':
-        in_fh = _opener(args.input_fastx, "r")
-
-    out_fh = sys.stdout
-    if args.output_fastx != '-':
-        out_fh = open(args.output_fastx, "w")
+    # Thread pool for decompressing BGZF input and compressing outputs ending in .gz:
+    cpool = fastx_writer.compression_pool(args.t)
 
-    u_fh = None
-    if args.u is not None:
-        u_fh = open(args.u, "w")
+    def _fastq_output(fname):
+        if fname is None:
+            return None
+        return fastx_writer.FastqWriter(fastx_writer.open_output(fname, cpool))
 
-    l_fh = None
-    if args.l is not None:
-        l_fh = open(args.l, "w")
+    out_fh = _fastq_output(args.output_fastx)
+    u_fh = _fastq_output(args.u)
+    l_fh = _fastq_output(args.l)
+    w_fh = _fastq_output(args.w)
 
-    w_fh = None
-    if args.w is not None:
-        w_fh = open(args.w, "w")
+    k_fh = None
+    if args.K is not None:
+        k_fh = fastx_writer.open_output(args.K, cpool)
 
     a_fh = None
     if args.A is not None:
-        a_fh = open(args.A, "w")
+        a_fh = fastx_writer.open_output(args.A, cpool)
 
     d_fh = None
     if args.D is not None:
-        d_fh = open(args.D, "w")
+        d_fh = fastx_writer.open_output(args.D, cpool)
         d_fh.write("Read\tLength\tStatus\tStart\tEnd\tStrand\n")
 
     st = _new_stats()
@@ -367,130 +400,160 @@ def main():
     if args.q is None and args.Y <= 0:
         sys.stderr.write("Please specifiy either -q or -Y!")
 
-    if args.m == "edlib":
+    # Counts of reads resolved from end windows, needing a whole read search or too short for windows:
+    window_sup = OrderedDict([("ends", 0), ("fallback", 0), ("short", 0)])
+    # Counts of edlib locations and of the merged windows refined by parasail:
+    refine_sup = OrderedDict([("locations", 0), ("windows", 0)])
+    # Counts of reads resolved by exact primer matches and passed to the backend:
+    exact_sup = OrderedDict([("exact", 0), ("backend", 0)])
+    # Counts of reads and detection time (summed over the workers) per tier in hybrid mode:
+    tier_sup = OrderedDict([("edlib_reads", 0), ("edlib_seconds", 0.0), ("phmm_reads", 0), ("phmm_seconds", 0.0)])
+    phmm_topo, sizer = None, None
+
+    all_primers = None
+    if args.m in ("edlib", "myers", "hybrid") or args.X:
         all_primers = seu.get_primers(args.b)
 
     if args.m == "phmm":
-        def backend(x, pool, q=None, mb=None):
-            return chopper.chopper_phmm(x, args.g, config, q, args.t, pool, mb)
-    elif args.m == "edlib":
-        def backend(x, pool, q=None, mb=None):
-            return chopper.chopper_edlib(x, all_primers, config, q * 1.2, q,
-                                         pool, mb)
+        def backend(x, pool, q=None, mb=None, mf=None):
+            return chopper.chopper_phmm(x, config, q, args.t, pool, mb, mf, args.e, window_sup, args.X, exact_sup, phmm_topo, sizer)
+
+        def tuner(x, pool, cutoffs, mb):
+            return autotune.tune_phmm(x, config, cutoffs, pool, mb)
+    elif args.m in ("edlib", "myers"):
+        def backend(x, pool, q=None, mb=None, mf=None):
+            return chopper.chopper_edlib(x, config, q * 1.2, q, pool, mb, mf, args.e, window_sup, refine_sup, args.m, args.X, exact_sup)
+
+        def tuner(x, pool, cutoffs, mb):
+            return autotune.tune_edlib(x, all_primers, config, cutoffs, 1.2,
+                                       pool, mb, args.m)
+    elif args.m == "hybrid":
+        def backend(x, pool, q=None, mb=None, mf=None):
+            return chopper.chopper_hybrid(x, config, q * 1.2, q, args.E, pool, mb, mf, tier_sup)
+
+        def tuner(x, pool, cutoffs, mb):
+            return autotune.tune_edlib(x, all_primers, config, cutoffs, 1.2,
+                                       pool, mb)
     else:
         raise Exception("Invalid backend!")
 
-    # Pick the -q maximizing the number of classified reads using grid search:
-    nr_records = None
-    tune_df = None
-    q_bak = args.q
-
-    if args.q is None:
-        nr_cutoffs = args.L
-        cutoffs = np.linspace(0.0, 1.0, num=nr_cutoffs)
-        cutoffs = cutoffs / cutoffs[-1]
+    if args.m in ("phmm", "hybrid") and args.P == "nhmmscan":
+        # Custom models without an hmmpress index are pressed once into the cache:
+        args.g = hmmer_backend.pressed_model(args.g)
+
+    # The same pool of workers is used by the tuning and the main pass:
+    with worker_pool.start_pool(
+            args.t, {"primers": all_primers, "phmm_file": args.g, "phmm_engine": args.P}) as executor:
+        # Open the input after forking the workers, as it starts the prefetching thread:
+        in_fh = prefetch.open_input(args.input_fastx, cpool)
+        rfq_sup = {"out_fq": k_fh, "pass": 0, "total": 0}
+        reads = fastx_reader.readfx(in_fh, min_qual=args.Q, rfq_sup=rfq_sup)
+
+        # Pick the -q maximizing the number of classified reads using grid search:
+        nr_records = None
+        read_sample = None
+        tune_df = None
+        q_bak = args.q
+
+        if args.q is None:
+            nr_cutoffs = args.L
+            cutoffs = np.linspace(0.0, 1.0, num=nr_cutoffs)
+            cutoffs = cutoffs / cutoffs[-1]
+            if args.m == "phmm":
+                cutoffs = np.linspace(10 ** -5, 5.0, num=nr_cutoffs)
+            if args.input_fastx == "-":
+                # Streamed input cannot be read twice, tune on a buffer of the first reads instead:
+                read_sample, reads = utils.warmup_buffer(
+                    reads, int(args.Y), args.W, size=lambda r: len(r.Seq))
+                sys.stderr.write(
+                    "Tuning the cutoff parameter (q) on the first {} reads of the input passing quality filters (Q >= {}).\n".format(
+                        len(read_sample), args.Q))
+            else:
+                sys.stderr.write("Sampling {} reads passing quality filters (Q >= {}) from input file: {}\n".format(
+                    int(args.Y), args.Q, args.input_fastx))
+                sample_sup = {"total": 0}
+                with prefetch.open_input(args.input_fastx, cpool) as sample_fh:
+                    read_sample, nr_records = utils.reservoir_sample(
+                        fastx_reader.readfx(sample_fh, min_qual=args.Q, rfq_sup=sample_sup),
+                        int(args.Y), seed=AUTOTUNE_SEED)
+                opt_batch = int(nr_records / args.t)
+                if opt_batch < args.B:
+                    args.B = opt_batch
+                sys.stderr.write(
+                    "Total fastq records in input file: {} ({} passing quality filters)\n".format(
+                        sample_sup["total"], nr_records))
+                sys.stderr.write(
+                    "Tuning the cutoff parameter (q) on {} sampled reads ({:.1f}%).\n".format(
+                        len(read_sample), len(read_sample) * 100.0 / max(nr_records, 1)))
+            sys.stderr.write("Optimizing over {} cutoff values.\n".format(args.L))
+            class_reads, class_readLens = tuner(
+                read_sample, executor, cutoffs,
+                max(1000, int(len(read_sample) / args.t)))
+            best_qi = np.argmax(class_readLens)
+            args.q = cutoffs[best_qi]
+            tune_df = OrderedDict([("Category", []), ("Name", []), ("Value", [])])
+            for i, c in enumerate(cutoffs):
+                tune_df["Category"] += ["AutotuneSample"]
+                tune_df["Name"] += [c]
+                tune_df["Value"] += [class_reads[i]]
+
+            tune_df["Category"] += ["Parameter"]
+            tune_df["Name"] += ["Cutoff(q)"]
+            tune_df["Value"] += [args.q]
+            if best_qi == (len(class_reads) - 1):
+                sys.stderr.write(
+                    "Best cuttoff value is at the edge of the search interval! Using tuned value is not safe! Please pick a q value manually and QC your data!\n")
+            sys.stderr.write(
+                "Best cutoff (q) value is {:.4g} with {:.0f}% of the reads classified.\n".format(
+                    args.q, class_reads[best_qi] * 100 / len(read_sample)))
+
+        if nr_records is not None:
+            input_size = nr_records
+            if args.B > nr_records:
+                args.B = nr_records
+            if args.B == 0:
+                args.B = 1
+        if args.F is None:
+            args.F = 4 * args.t
         if args.m == "phmm":
-            cutoffs = np.linspace(10 ** -5, 5.0, num=nr_cutoffs)
-        class_reads = []
-        class_readLens = []
-        nr_records = utils.count_fastq_records(args.input_fastx,
-                                               opener=_opener)
-        opt_batch = int(nr_records / args.t)
-        if opt_batch < args.B:
-            args.B = opt_batch
-        target_prop = 1.0
-        if nr_records > args.Y:
-            target_prop = args.Y / float(nr_records)
-        if target_prop > 1.0:
-            target_prop = 1.0
-        sys.stderr.write("Counting fastq records in input file: {}\n".format(
-            args.input_fastx))
-        sys.stderr.write(
-            "Total fastq records in input file: {}\n".format(nr_records))
-        read_sample = list(
-            seu.readfq(_opener(args.input_fastx, "r"), sample=target_prop,
-                       min_qual=args.Q))
-        sys.stderr.write(
-            "Tuning the cutoff parameter (q) on {} sampled reads ({:.1f}%) passing quality filters (Q >= {}).\n".format(
-                len(read_sample), target_prop * 100.0, args.Q))
-        sys.stderr.write("Optimizing over {} cutoff values.\n".format(args.L))
-        for qv in tqdm.tqdm(cutoffs):
-            clsLen = 0
-            cls = 0
-            with concurrent.futures.ProcessPoolExecutor(
-                    max_workers=args.t) as executor:
-                for batch in utils.batch(read_sample, int((len(read_sample)))):
-                    for read, (segments, hits, usable_len) in backend(batch,
-                                                                      executor,
-                                                                      qv,
-                                                                      max(1000,
-                                                                          int((
-                                                                              len(read_sample)) / args.t))):
-                        flt = list([x.Len for x in segments if x.Len > 0])
-                        if len(flt) == 1:
-                            clsLen += sum(flt)
-                            cls += 1
-            class_reads.append(cls)
-            class_readLens.append(clsLen)
-        best_qi = np.argmax(class_readLens)
-        args.q = cutoffs[best_qi]
-        tune_df = OrderedDict([("Category", []), ("Name", []), ("Value", [])])
-        for i, c in enumerate(cutoffs):
-            tune_df["Category"] += ["AutotuneSample"]
-            tune_df["Name"] += [c]
-            tune_df["Value"] += [class_reads[i]]
-
-        tune_df["Category"] += ["Parameter"]
-        tune_df["Name"] += ["Cutoff(q)"]
-        tune_df["Value"] += [args.q]
-        if best_qi == (len(class_reads) - 1):
+            # Pick the number of concurrent searches, their threads and the batch size from the input:
+            lengths = None if read_sample is None else [len(r.Seq) for r in read_sample]
+            phmm_topo = phmm_topology.plan(args.t, nr_records, lengths, args.B, 1 if args.P == "pyhmmer" else phmm_topology.MAX_CPU)
+            if args.e is None and not args.X:
+                sizer = phmm_topology.BatchSizer(phmm_topo.batch_size, phmm_topo.max_batch_size)
+            args.B = phmm_topo.batch_size
             sys.stderr.write(
-                "Best cuttoff value is at the edge of the search interval! Using tuned value is not safe! Please pick a q value manually and QC your data!\n")
+                "Running {} concurrent {} searches with {} threads each, batch size {}{}.\n".format(
+                    phmm_topo.processes, args.P, phmm_topo.cpu, phmm_topo.batch_size,
+                    "" if sizer is None else " adjusted up to {}".format(phmm_topo.max_batch_size)))
         sys.stderr.write(
-            "Best cutoff (q) value is {:.4g} with {:.0f}% of the reads classified.\n".format(
-                args.q, class_reads[best_qi] * 100 / len(read_sample)))
-
-    if nr_records is not None:
-        input_size = nr_records
-        if args.B > nr_records:
-            args.B = nr_records
-        if args.B == 0:
-            args.B = 1
-    sys.stderr.write(
-        "Processing the whole dataset using a batch size of {}:\n".format(
-            args.B))
-    pbar = tqdm.tqdm(total=input_size)
-    min_batch_size = max(int(args.B / args.t), 1)
-    rfq_sup = {"out_fq": args.K, "pass": 0, "total": 0}
-    with concurrent.futures.ProcessPoolExecutor(
-            max_workers=args.t) as executor:
-        for batch in utils.batch(
-                seu.readfq(in_fh, min_qual=args.Q, rfq_sup=rfq_sup), args.B):
-            for read, (segments, hits, usable_len) in backend(batch, executor,
-                                                              q=args.q,
-                                                              mb=min_batch_size):
-                if args.A is not None:
-                    for h in hits:
-                        a_fh.write(utils.hit2bed(h, read) + "\n")
-                _update_stats(st, d_fh, segments, hits, usable_len, read)
-                if args.u is not None and len(segments) == 0:
-                    seu.writefq(read, u_fh)
-                for trim_read in chopper.segments_to_reads(read, segments,
-                                                           args.p):
-                    if args.l is not None and len(trim_read.Seq) < args.z:
-                        st["LenFail"] += 1
-                        seu.writefq(trim_read, l_fh)
-                        continue
-                    if len(segments) == 1:
-                        seu.writefq(trim_read, out_fh)
-                    if args.w is not None and len(segments) > 1:
-                        seu.writefq(trim_read, w_fh)
-                if nr_records is None:
-                    pbar.update(seu.record_size(read, 'fastq'))
-                else:
-                    pbar.update(1)
+            "Processing the whole dataset using a batch size of {} with at most {} batches in flight:\n".format(
+                args.B, args.F))
+        pbar = tqdm.tqdm(total=input_size)
+        for read, (segments, hits, usable_len) in backend(reads, executor, q=args.q, mb=args.B, mf=args.F):
+            if args.A is not None:
+                for h in hits:
+                    a_fh.write(utils.hit2bed(h, read) + "\n")
+            _update_stats(st, d_fh, segments, hits, usable_len, read)
+            if args.u is not None and len(segments) == 0:
+                u_fh.write(read)
+            for trim_read in chopper.segments_to_reads(read, segments,
+                                                       args.p):
+                if args.l is not None and len(trim_read.Seq) < args.z:
+                    st["LenFail"] += 1
+                    l_fh.write(trim_read)
+                    continue
+                if len(segments) == 1:
+                    out_fh.write(trim_read)
+                if args.w is not None and len(segments) > 1:
+                    w_fh.write(trim_read)
+            if nr_records is None:
+                pbar.update(seu.record_size(read, 'fastq'))
+            else:
+                pbar.update(1)
     pbar.close()
     sys.stderr.write("Finished processing file: {}\n".format(args.input_fastx))
+    sys.stderr.write("Time spent waiting for input: {:.2f}s\n".format(in_fh.raw.wait_time))
     fail_nr = rfq_sup["total"] - rfq_sup["pass"]
     fail_pc = (fail_nr * 100 / rfq_sup["total"])
     st["QcFail"] = fail_nr
@@ -500,24 +563,56 @@ def main():
     sys.stderr.write(
         "Output fragments failing length filter (length < {}): {}\n".format(
             args.z, st["LenFail"]))
+    if args.e is not None:
+        windowed = window_sup["ends"] + window_sup["fallback"]
+        sys.stderr.write(
+            "Reads searched in end windows (size {}): {}, falling back to whole read search: {} ({:.2f}%)\n".format(
+                args.e, windowed, window_sup["fallback"], window_sup["fallback"] * 100.0 / max(windowed, 1)))
+        st["EndWindow"] = window_sup
+    elif args.m in ("edlib", "myers") and not args.X:
+        saved = refine_sup["locations"] - refine_sup["windows"]
+        sys.stderr.write(
+            "Edlib locations: {}, refined in {} merged windows ({:.2f} alignments saved per read)\n".format(
+                refine_sup["locations"], refine_sup["windows"], saved / max(rfq_sup["pass"], 1)))
+        st["Refinement"] = refine_sup
+    if args.m == "hybrid":
+        sys.stderr.write(
+            "Hybrid detection: edlib tier {} reads in {:.2f}s, phmm tier {} reads ({:.2f}%) in {:.2f}s\n".format(
+                tier_sup["edlib_reads"], tier_sup["edlib_seconds"], tier_sup["phmm_reads"],
+                tier_sup["phmm_reads"] * 100.0 / max(tier_sup["edlib_reads"], 1), tier_sup["phmm_seconds"]))
+        st["Hybrid"] = tier_sup
+    if sizer is not None:
+        sys.stderr.write(
+            "Final phmm batch size: {} reads ({:.1f} reads/s per search)\n".format(
+                sizer.batch_size, sizer.reads / max(sizer.seconds, 1e-9)))
+    if phmm_topo is not None:
+        st["PhmmTopology"] = OrderedDict([("processes", phmm_topo.processes), ("cpu", phmm_topo.cpu),
+                                          ("initial_batch", phmm_topo.batch_size),
+                                          ("final_batch", phmm_topo.batch_size if sizer is None else sizer.batch_size)])
+    if args.X:
+        sys.stderr.write(
+            "Reads resolved by exact primer matches: {} ({:.2f}%)\n".format(
+                exact_sup["exact"], exact_sup["exact"] * 100.0 / max(exact_sup["exact"] + exact_sup["backend"], 1)))
+        st["ExactMatch"] = exact_sup
 
     # Save stats as TSV:
     stdf = None
     if args.S is not None or args.r is not None:
         stdf = _process_stats(st)
         if tune_df is not None:
-            stdf = stdf.append(pd.DataFrame(tune_df))
+            stdf = pd.concat([stdf, pd.DataFrame(tune_df)])
 
     _detect_anomalies(st, config)
 
     if args.S is not None:
         stdf.to_csv(args.S, sep="\t", index=False)
 
-    for fh in (in_fh, out_fh, u_fh, l_fh, w_fh, a_fh, d_fh):
+    for fh in (in_fh, out_fh, u_fh, l_fh, w_fh, k_fh, a_fh, d_fh):
         if fh is None:
             continue
         fh.flush()
         fh.close()
+    cpool.shutdown()
 
     if args.r is not None:
         _plot_stats(stdf, args.r, args.q, q_bak)
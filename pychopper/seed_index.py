@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from collections import defaultdict
+
+""" Exact seeds for primer search with edlib. A primer of length L is split into e + 1 non-overlapping
+pieces of length L // (e + 1), where e is the maximum edit distance. By the pigeonhole principle any
+alignment with at most e edits contains one of the pieces without errors, so only the read windows
+around exact piece matches need to be aligned. Primers for which the pieces would be shorter than
+the minimum seed length (or which contain characters other than ACGT) are searched in the whole read.
+
+The reads of a work unit are scanned together: they are concatenated, converted to 2-bit codes and
+all k-mers are compared to the pieces with NumPy.
+"""
+
+MIN_SEED_LEN = 6
+BITMAP_MAX_K = 10
+
+_CODES = np.full(256, 4, dtype=np.uint8)
+for _i, _b in enumerate("ACGT"):
+    _CODES[ord(_b)] = _i
+
+
+def _kmers(codes, k):
+    "Encode all k-mers of an array of 2-bit codes as integers, characters other than ACGT being read as A"
+    dtype = np.uint32 if k <= 16 else np.uint64
+    n = len(codes) - k + 1
+    if n <= 0:
+        return np.zeros(0, dtype=dtype)
+    # Build the k-mers by doubling: m-mers are combined into 2m-mers, then the binary
+    # decomposition of k is assembled from the powers of two.
+    part = (codes & 3).astype(dtype)
+    kmers, done, m = None, 0, 1
+    while True:
+        if k & m:
+            if kmers is None:
+                kmers = part[:len(codes) - m + 1]
+            else:
+                kmers = (kmers[:len(codes) - done - m + 1] << dtype(2 * m)) | part[done:len(codes) - m + 1]
+            done += m
+        if 2 * m > k:
+            break
+        part = (part[:-m] << dtype(2 * m)) | part[m:]
+        m *= 2
+    return kmers[:n]
+
+
+def _encode(seq):
+    "Convert a sequence to 2-bit codes, characters other than ACGT being coded as 4"
+    return _CODES[np.frombuffer(seq.encode('latin-1'), dtype=np.uint8)]
+
+
+def kmer_codes(seq, k):
+    """ Encode all k-mers of a sequence as integers.
+
+    :param seq: Sequence (str).
+    :param k: K-mer length (at most 32).
+    :returns: Array of k-mer codes and a boolean array marking k-mers with characters other than ACGT.
+    :rtype: tuple
+    """
+    codes = _encode(seq)
+    kmers = _kmers(codes, k)
+    bad = np.concatenate(([0], np.cumsum(codes == 4, dtype=np.int64)))
+    return kmers, bad[k:] != bad[:len(kmers)]
+
+
+class SeedIndex(object):
+    "Exact primer pieces indexed by their 2-bit k-mer codes"
+
+    def __init__(self, primers, max_ed, min_seed_len=MIN_SEED_LEN):
+        self.lengths = {acc: len(seq) for acc, seq in primers.items()}
+        self.max_eds = {acc: int(max_ed * len(seq)) for acc, seq in primers.items()}
+        self.seeded = []
+        self.unseeded = []
+        by_len = defaultdict(list)
+        for acc, seq in primers.items():
+            e = self.max_eds[acc]
+            k = len(seq) // (e + 1)
+            if k < min_seed_len or k > 32 or not set(seq) <= set("ACGT"):
+                self.unseeded.append(acc)
+                continue
+            for i in range(e + 1):
+                code = int(_kmers(_encode(seq[i * k:(i + 1) * k]), k)[0])
+                # A piece at offset o matching at read position p gives the window [p - o - e, p - o + L + e):
+                by_len[k].append((code, len(self.seeded), -i * k - e, -i * k + len(seq) + e))
+            self.seeded.append(acc)
+        # Pieces are kept sorted by code. Small k also use a presence bitmap over all k-mers:
+        self.tables = []
+        for k, entries in sorted(by_len.items()):
+            codes, acc_idx, lo, hi = (np.array(x) for x in zip(*sorted(entries)))
+            codes = codes.astype(np.uint32 if k <= 16 else np.uint64)
+            bitmap = None
+            if k <= BITMAP_MAX_K:
+                bitmap = np.zeros(4 ** k, dtype=bool)
+                bitmap[codes] = True
+            self.tables.append((k, codes, bitmap, acc_idx, lo, hi))
+
+    def windows(self, seqs):
+        """ Find the read windows which may contain an alignment of a seeded primer.
+
+        :param seqs: List of read sequences.
+        :returns: List with a dictionary of merged (start, end) windows per seeded primer for each read.
+        :rtype: list
+        """
+        res = [{} for _ in seqs]
+        if len(self.tables) == 0 or len(seqs) == 0:
+            return res
+        # Reads are separated by a character which invalidates the k-mers spanning two reads:
+        lens = np.array([len(s) for s in seqs], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lens + 1)))
+        codes = _encode("\n".join(seqs))
+        bad = np.concatenate((np.flatnonzero(codes == 4), [len(codes)]))
+        found = []
+        for k, table, bitmap, acc_idx, lo, hi in self.tables:
+            kmers = _kmers(codes, k)
+            if bitmap is not None:
+                hit = bitmap[kmers]
+            else:
+                hit = table[np.minimum(np.searchsorted(table, kmers), len(table) - 1)] == kmers
+            pos = np.flatnonzero(hit)
+            pos = pos[bad[np.searchsorted(bad, pos)] >= pos + k]
+            # Expand k-mer hits to all pieces with the same code:
+            first = np.searchsorted(table, kmers[pos], side='left')
+            counts = np.searchsorted(table, kmers[pos], side='right') - first
+            rep = np.repeat(np.arange(len(pos)), counts)
+            entry = first[rep] + np.arange(len(rep)) - np.repeat(np.cumsum(counts) - counts, counts)
+            read = np.searchsorted(offsets, pos[rep], side='right') - 1
+            local = pos[rep] - offsets[read]
+            found.append((read, acc_idx[entry], np.maximum(local + lo[entry], 0), np.minimum(local + hi[entry], lens[read])))
+        read, acc, start, end = (np.concatenate(x) for x in zip(*found))
+        if len(read) == 0:
+            return res
+        # Sort by read, primer and start then merge overlapping windows:
+        order = np.lexsort((start, acc, read))
+        read, acc, start, end = read[order], acc[order], start[order], end[order]
+        group = read * len(self.seeded) + acc
+        shift = group * (int(lens.max()) + 1)
+        reach = np.maximum.accumulate(end + shift) - shift
+        new = np.ones(len(read), dtype=bool)
+        new[1:] = (group[1:] != group[:-1]) | (start[1:] > reach[:-1])
+        idx = np.flatnonzero(new)
+        merged_end = np.maximum.reduceat(end, idx)
+        for r, a, s, e in zip(read[idx].tolist(), acc[idx].tolist(), start[idx].tolist(), merged_end.tolist()):
+            res[r].setdefault(self.seeded[a], []).append((s, e))
+        return res
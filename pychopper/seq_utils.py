@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from six.moves import reduce
 from numpy.random import random
 from math import log
 import sys
+import numpy as np
 from pychopper.common_structures import Seq
+from pychopper import compact_seq
 
 """ Utilities manipulating biological sequences and formats. Extensions to biopython functionality.
 """
@@ -44,9 +45,7 @@ def reverse_complement(seq):
     :rtype: str
 
     """
-    if len(seq) == 0:
-        return seq
-    return reduce(lambda x, y: x + y, map(base_complement, seq[::-1]))
+    return compact_seq.reverse_complement(seq)
 
 
 def readfq(fp, sample=None, min_qual=None, rfq_sup={}):  # this is a generator function
@@ -118,12 +117,17 @@ def writefq(r, fh):
     fh.write("@{}\n{}\n+\n{}\n".format(r.Name, r.Seq, q))
 
 
+def writefq_batch(reads, fh):
+    "Write a list of reads to a fastq file using a single write"
+    fh.write("".join(["@{}\n{}\n+\n{}\n".format(r.Name, r.Seq, r.Qual if r.Qual is not None else "!" * len(r.Seq)) for r in reads]))
+
+
 def revcomp_seq(seq):
     """ Reverse complement sequence record """
     qual = seq.Qual
     if qual is not None:
         qual = qual[::-1]
-    return Seq(seq.Id, seq.Name, reverse_complement(seq.Seq), qual)
+    return Seq(seq.Id, seq.Name, compact_seq.reverse_complement(seq.Seq), qual)
 
 
 def get_runid(desc):
@@ -154,7 +158,7 @@ def get_primers(primers):
     all_primers = {}
     for primer in readfq(open(primers, 'r')):
         all_primers[primer.Name] = primer.Seq
-        all_primers['-' + primer.Name] = reverse_complement(primer.Seq)
+        all_primers['-' + primer.Name] = compact_seq.reverse_complement(primer.Seq)
     return all_primers
 
 
@@ -178,3 +182,45 @@ def mean_qual(quals, qround=False, tab=errs_tab(128)):
             return mq
     else:
         return 0.0
+
+
+def _byte_errs_tab(tab):
+    "Index an error rate table by the ascii code of the quality character, as mean_qual does"
+    return np.array([tab[c - 33] if c - 33 < len(tab) else np.nan for c in range(256)])
+
+
+def mean_quals(quals, tab=_byte_errs_tab(errs_tab(128))):
+    """Calculate the average basecall quality of a batch of reads.
+    The quality strings are packed into a single byte buffer, converted to error
+    probabilities by a table lookup and reduced per read. The result agrees with
+    mean_qual up to floating point rounding of the summation.
+
+    :param quals: List of ascii quality strings.
+    :returns: Array of mean qualities.
+    :rtype: numpy.ndarray
+    """
+    lens = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+    res = np.zeros(len(quals), dtype=float)
+    nz = lens > 0
+    if not np.any(nz):
+        return res
+    buff = np.frombuffer("".join(quals).encode('latin-1'), dtype=np.uint8)
+    errs = tab[buff]
+    offsets = np.cumsum(lens) - lens
+    sums = np.add.reduceat(errs, offsets[nz])
+    res[nz] = -10 * np.log10(sums / lens[nz])
+    return res
+
+
+def mean_qual_mask(quals, min_qual):
+    """Return a boolean mask of the quality strings passing the mean quality filter.
+    Reads with a vectorized mean quality within rounding distance of min_qual are
+    re-evaluated with mean_qual, so the decisions are identical to mean_qual(q) >= min_qual.
+    """
+    mq = mean_quals(quals)
+    mask = mq >= min_qual
+    lens = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+    tol = 1e-12 + 1e-14 * lens
+    for i in np.flatnonzero(np.abs(mq - min_qual) <= tol):
+        mask[i] = not (mean_qual(quals[i]) < min_qual)
+    return mask
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+from pychopper.compact_seq import reverse_complement
+
+""" Primer sequences and read simulation shared by the tests.
+"""
+
+SSP = "TTTCTGTTGGTGCTGATATTGCTTT"
+# Full length VNP, its first 22 bases and the poly-T VNP of the cDNA_SSP_VNP primer set:
+VNP = "ACTTGCCTGTCGCTCTATCTTCGAGGAGAGTCCGCCGCCCGCAAGTTT"
+VNP_SHORT = VNP[:22]
+VNP_POLYT = VNP_SHORT + "T" * 9
+
+
+def primer_set(vnp=VNP):
+    "SSP and the given VNP with their reverse complements, keyed as by seq_utils.get_primers"
+    return {"SSP": SSP, "-SSP": reverse_complement(SSP), "VNP": vnp, "-VNP": reverse_complement(vnp)}
+
+
+def mutate(seq, rate, rng):
+    "Introduce substitutions, insertions and deletions at the specified total rate"
+    res = []
+    for b in seq:
+        r = rng.rand()
+        if r < rate / 3:
+            res.append("ACGT"[rng.randint(0, 4)])
+        elif r < 2 * rate / 3:
+            res.append(b)
+            res.append("ACGT"[rng.randint(0, 4)])
+        elif r >= rate:
+            res.append(b)
+    return "".join(res)
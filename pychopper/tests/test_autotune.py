@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import unittest
+import concurrent.futures
+import numpy as np
+
+from pychopper import seq_utils as seu
+from pychopper import utils, chopper, autotune, worker_pool
+from pychopper.common_structures import Seq
+from pychopper.tests.helpers import SSP, VNP, primer_set
+
+INSERT = "GCTTGTCCGCGAGTGTCAACCGGGTTTTACAAAGGAGAACTTCCAACATCAGTGTATGGGATGTTTCAAA"
+
+
+class TestAutotune(unittest.TestCase):
+
+    def testSinglePassMatchesPerCutoff(self):
+        primers = primer_set()
+        config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+        seqs = [
+            SSP + INSERT + seu.reverse_complement(VNP),
+            VNP + INSERT + seu.reverse_complement(SSP),
+            SSP[3:] + INSERT[:40] + "A" + INSERT[41:] + seu.reverse_complement(VNP)[:-6],
+            SSP[:10] + "G" + SSP[12:] + INSERT + seu.reverse_complement(VNP[5:]),
+            INSERT + seu.reverse_complement(VNP),
+            INSERT,
+        ]
+        reads = [Seq(str(i), str(i), s, None) for i, s in enumerate(seqs)]
+        cutoffs = np.linspace(0.0, 1.0, num=8)
+        context = {"primers": primers}
+        with worker_pool.start_pool(2, context, executor=concurrent.futures.ThreadPoolExecutor, log=None) as pool:
+            expected = []
+            for qv in cutoffs:
+                cls, cls_len = 0, 0
+                for read, (segments, hits, usable_len) in chopper.chopper_edlib(reads, config, qv * 1.2, qv, pool, 2):
+                    flt = [x.Len for x in segments if x.Len > 0]
+                    if len(flt) == 1:
+                        cls += 1
+                        cls_len += flt[0]
+                expected.append((cls, cls_len))
+            class_reads, class_lens = autotune.tune_edlib(reads, primers, config, cutoffs, 1.2, pool, 2)
+        self.assertEqual(list(zip(class_reads.tolist(), class_lens.tolist())), expected)
+        self.assertGreater(max(class_reads), 2)
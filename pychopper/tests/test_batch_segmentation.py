@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+
+from pychopper import utils
+from pychopper.batch_segmentation import segment_batch
+from pychopper.alignment_hits import process_hits
+from pychopper.chopper import analyse_hits
+from pychopper.common_structures import Hit
+
+PRIMERS = ("SSP", "-SSP", "VNP", "-VNP", "X")
+
+
+def _random_hits(rng, nr_reads, max_hits, length=2000):
+    "Random hits with overlaps, tied coordinates and tied scores"
+    res = []
+    for i in range(nr_reads):
+        hits = []
+        for _ in range(rng.randint(0, max_hits + 1)):
+            start = int(rng.randint(0, length // 10)) * 10
+            end = start + int(rng.choice([5, 10, 25, 30]))
+            score = float(rng.choice([0.0, 0.1, 0.2, 0.3, 0.5])) if rng.rand() < 0.5 else float(rng.rand())
+            hits.append(Hit(str(i), start, end, PRIMERS[rng.randint(0, len(PRIMERS))], 0, end - start, score))
+        res.append(hits)
+    return res
+
+
+class TestBatchSegmentation(unittest.TestCase):
+
+    def setUp(self):
+        self.config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+
+    def _check(self, hit_lists, config, cutoff):
+        expected = [analyse_hits(process_hits(hits, cutoff), config) for hits in hit_lists]
+        self.assertEqual(segment_batch(hit_lists, config, cutoff), expected)
+
+    def testRandom(self):
+        rng = np.random.RandomState(5)
+        for max_hits in (0, 1, 2, 4, 8, 30):
+            hit_lists = _random_hits(rng, 300, max_hits)
+            for cutoff in (0.0, 0.25, 0.5, 1.0):
+                self._check(hit_lists, self.config, cutoff)
+
+    def testConfigs(self):
+        rng = np.random.RandomState(9)
+        hit_lists = _random_hits(rng, 200, 6, length=400)
+        for config in ("+:SSP,-VNP|-:VNP,-SSP", "+:SSP,-SSP", "+:SSP,-VNP|-:VNP,-SSP|+:X,X", "+:A,B"):
+            self._check(hit_lists, utils.parse_config_string(config), 0.5)
+
+    def testProcessed(self):
+        # Without a cutoff the hits are used as they are, as by analyse_hits:
+        hit_lists = [process_hits(hits, 0.5) for hits in _random_hits(np.random.RandomState(1), 200, 8)]
+        self.assertEqual(segment_batch(hit_lists, self.config), [analyse_hits(hits, self.config) for hits in hit_lists])
+
+    def testEdgeCases(self):
+        self.assertEqual(segment_batch([], self.config, 0.5), [])
+        self.assertEqual(segment_batch([[], []], self.config, 0.5), [((), (), 0), ((), (), 0)])
+        hits = [Hit("r", 0, 25, "SSP", 0, 25, 0.1), Hit("r", 500, 525, "-VNP", 0, 25, 0.2)]
+        self._check([hits, hits[:1], [h._replace(Score=0.9) for h in hits], hits[::-1]], self.config, 0.5)
+        # Segments of zero or negative length are not reported:
+        self._check([[hits[0], hits[0]._replace(Query="-VNP", RefStart=20)]], self.config, 0.5)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+
+from pychopper import utils, packed_batch
+from pychopper.columnar import PrimerRegistry, HitBatch, HitView, segment_hits, queries
+from pychopper.alignment_hits import process_hits
+from pychopper.chopper import analyse_hits
+from pychopper.common_structures import Hit, Seq
+from pychopper.tests.test_batch_segmentation import _random_hits
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+        self.hit_lists = _random_hits(np.random.RandomState(3), 200, 8)
+        self.reads = [Seq(str(i), str(i), "", None) for i in range(len(self.hit_lists))]
+
+    def testRegistry(self):
+        registry = PrimerRegistry(["VNP"])
+        self.assertEqual(registry.lookup(["SSP", "VNP", "SSP"]).tolist(), [1, 0, 1])
+        table = registry.config_table(self.config)
+        self.assertEqual(registry.names, ["VNP", "SSP", "-VNP", "-SSP"])
+        self.assertEqual(table.tolist(), [[0, 0, 0, 2], [0, 0, 1, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+
+    def testViews(self):
+        views = packed_batch.unpack_hits(self.reads, packed_batch.pack_hits(self.hit_lists))
+        self.assertTrue(all(isinstance(v, HitView) for v in views))
+        self.assertEqual(views, self.hit_lists)
+        for view, hits in zip(views, self.hit_lists):
+            self.assertEqual(len(view), len(hits))
+            self.assertEqual(view[-1:], hits[-1:])
+            self.assertEqual(queries(view), queries(hits))
+
+    def testGather(self):
+        registry = PrimerRegistry()
+        first = HitBatch.from_lists(self.hit_lists[:120], registry).views()
+        second = HitBatch.from_lists(self.hit_lists[120:], registry).views()
+        self.assertIs(HitBatch.gather(first, registry), first[0].batch)
+        gathered = HitBatch.gather(first[50:] + second[:30], registry)
+        self.assertEqual(gathered.views(), self.hit_lists[50:150])
+        mixed = HitBatch.gather(first[:10] + self.hit_lists[10:20], registry)
+        self.assertEqual(mixed.views(), self.hit_lists[:20])
+
+    def testSegment(self):
+        registry = PrimerRegistry()
+        views = HitBatch.from_lists(self.hit_lists, registry).views()
+        for cutoff in (0.25, 0.5, 1.0):
+            expected = [analyse_hits(process_hits(hits, cutoff), self.config) for hits in self.hit_lists]
+            self.assertEqual(segment_hits(HitBatch.gather(views[30:170], registry), self.config, cutoff).results(), expected[30:170])
+        processed = [process_hits(hits, 0.5) for hits in self.hit_lists]
+        self.assertEqual(segment_hits(HitBatch.from_lists(processed, registry), self.config).results(),
+                         [analyse_hits(hits, self.config) for hits in processed])
+        empty = HitBatch.from_lists([[], [Hit("r", 0, 25, "SSP", 0, 25, 0.1)]], registry)
+        self.assertEqual(segment_hits(empty, self.config, 0.5).results(), [((), (), 0), ((), (), 0)])
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import unittest
+from os import path
+
+from pychopper import edlib_backend, worker_pool, utils
+from pychopper import seq_utils as seu
+from pychopper.alignment_hits import process_hits
+from pychopper.chopper import analyse_hits
+from pychopper.common_structures import Seq
+from pychopper.compact_seq import reverse_complement
+from pychopper.scripts import pychopper as script
+from pychopper.tests.helpers import SSP
+
+INSERT = "ACGTTGCAGGCATCGATCCGATGCATGCTAGCTAGGATCGATCGGCTAGCTAGCATGCAGTCGATCGTAGCTAGCTGACTGATCGATCGTACG"
+
+
+class TestClusterLocations(unittest.TestCase):
+
+    def testCluster(self):
+        locs = [(12, 40), (10, 36), (41, 60), (100, 120), (62, 70)]
+        self.assertEqual(edlib_backend._cluster_locations(locs, 0, 200), [(10, 60), (62, 70), (100, 120)])
+        self.assertEqual(edlib_backend._cluster_locations(locs, 5, 118), [(5, 65), (57, 75), (95, 117)])
+        self.assertEqual(edlib_backend._cluster_locations([], 5, 100), [])
+
+    def testCounts(self):
+        # A truncated primer gives several equally good end positions:
+        read = Seq("r", "r", "GCGC" + SSP[:-2] + "GCGC", None)
+        worker_pool._init_worker({"primers": {"SSP": SSP}, "min_seed_len": 1000})
+        try:
+            counts = [0, 0]
+            hits = edlib_backend._find_locations_single((read, (0.2, False, None)), None, counts)
+            self.assertEqual(counts, [3, 1])
+            self.assertEqual(len(hits), 1)
+            self.assertEqual((hits[0].RefStart, hits[0].RefEnd, hits[0].QueryEnd), (4, 4 + len(SSP) - 2, len(SSP) - 2))
+        finally:
+            worker_pool._init_worker({})
+
+
+class TestClusteredReporting(unittest.TestCase):
+    """ Merging the edlib locations of a primer leaves the segments unchanged, but process_hits keeps
+    overlapping hits of equal scores, so refining every location reported the same primer several times
+    in the -A BED output and in the hit statistics.
+    """
+
+    def setUp(self):
+        self.primers = seu.get_primers(path.join(path.dirname(__file__), "..", "primer_data", "cDNA_SSP_VNP.fas"))
+        self.config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+        ssp = self.primers["SSP"][:-2]
+        # Full length read with a truncated SSP, and an unusable read with the truncated SSP only:
+        self.reads = [Seq("full", "full", "GCGC" + ssp + INSERT + reverse_complement(self.primers["VNP"]) + "AAAAGCGC", None),
+                      Seq("ssp", "ssp", "GCGC" + ssp + INSERT + "GCGC", None)]
+
+    def tearDown(self):
+        worker_pool._init_worker({})
+
+    def _report(self, pad):
+        worker_pool._init_worker({"primers": self.primers, "min_seed_len": 1000, "cluster_pad": pad})
+        st, bed, segs = script._new_stats(), [], []
+        for read in self.reads:
+            hits = edlib_backend._find_locations_single((read, (0.3, False, None)))
+            segments, hits, usable_len = analyse_hits(process_hits(hits, 0.3), self.config)
+            bed.extend(utils.hit2bed(h, read) for h in hits)
+            script._update_stats(st, None, segments, hits, usable_len, read)
+            segs.append(segments)
+        return segs, bed, st
+
+    def testReporting(self):
+        segs, bed, st = self._report(0)
+        self.assertEqual(bed, ["full\t4\t28\tSSP\t11\t+", "full\t121\t152\tVNP\t100\t-"])
+        self.assertEqual(dict(st["Hits"]), {"SSP,-VNP": 1})
+        self.assertEqual(dict(st["UnclassHitNr"]), {0: 1})
+        # Refining every location gives the same segments, with the SSP hit repeated:
+        legacy_segs, legacy_bed, legacy_st = self._report(None)
+        self.assertEqual(legacy_segs, segs)
+        self.assertEqual(legacy_bed, bed[:1] * 4 + bed[1:] + ["ssp\t4\t28\tSSP\t11\t+"] * 4)
+        self.assertEqual(dict(legacy_st["Hits"]), {"SSP,SSP,SSP,SSP,-VNP": 1, "SSP,SSP,SSP,SSP": 1})
+        self.assertEqual(dict(legacy_st["UnclassHitNr"]), {4: 1})
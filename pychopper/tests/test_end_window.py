@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import unittest
+import concurrent.futures
+import numpy as np
+
+from pychopper import seq_utils as seu
+from pychopper import utils, chopper, worker_pool
+from pychopper.common_structures import Hit, Seq
+from pychopper.tests.helpers import SSP, VNP, primer_set
+
+
+class TestEndWindow(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(2)
+        self.primers = primer_set()
+        self.config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+
+        def insert(n):
+            return "".join(rng.choice(list("ACGT"), size=n))
+
+        seqs = [
+            insert(20) + SSP + insert(1000) + seu.reverse_complement(VNP) + insert(10),
+            seu.reverse_complement(SSP + insert(700) + seu.reverse_complement(VNP)),
+            # Concatemer, the end windows see a single segment:
+            SSP + insert(600) + seu.reverse_complement(VNP) + SSP + insert(600) + seu.reverse_complement(VNP),
+            # Missing primer at the end, needs a whole read search:
+            SSP + insert(1000),
+            # Short read, searched as a whole:
+            SSP + insert(100) + seu.reverse_complement(VNP),
+            # Primer cut by the end of the head window, needs a whole read search:
+            insert(180) + SSP + insert(800) + seu.reverse_complement(VNP),
+        ]
+        self.reads = [Seq(str(i), str(i), s, None) for i, s in enumerate(seqs)]
+
+    def _run(self, **kwargs):
+        with worker_pool.start_pool(2, {"primers": self.primers}, executor=concurrent.futures.ThreadPoolExecutor, log=None) as pool:
+            return [res for _, res in chopper.chopper_edlib(self.reads, self.config, 0.36, 0.3, pool, 2, **kwargs)]
+
+    def testEndWindow(self):
+        full = self._run()
+        window_sup = {}
+        ends = self._run(end_window=200, window_sup=window_sup)
+        self.assertEqual(window_sup, {"ends": 3, "fallback": 2, "short": 1})
+        for i in (0, 1, 3, 4, 5):
+            self.assertEqual(ends[i][0], full[i][0])
+        self.assertEqual(len(full[2][0]), 2)
+        self.assertEqual(len(ends[2][0]), 1)
+        self.assertEqual((ends[2][0][0].Start, ends[2][0][0].End),
+                         (min(x.Start for x in full[2][0]), max(x.End for x in full[2][0])))
+
+    def testScaleEvalues(self):
+        read = Seq("r", "r", "A" * 1000, None)
+        hits = [Hit("r", 3, 28, "SSP", 1, 26, 1.2e-05), Hit("r", 60, 80, "VNP", 1, 21, 0.5)]
+        self.assertEqual(chopper._scale_evalues(hits, read, 150), [hits[0]._replace(Score=8e-05), hits[1]._replace(Score=3.3)])
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import re
+import unittest
+import numpy as np
+
+from pychopper import chopper, utils, worker_pool
+from pychopper.exact_match import PrimerAutomaton
+from pychopper.common_structures import Seq
+from pychopper.tests.helpers import SSP, VNP_SHORT, primer_set
+
+
+class TestExactMatch(unittest.TestCase):
+
+    def testFind(self):
+        rng = np.random.RandomState(3)
+        primers = {"SSP": SSP, "a": "ACGTAC", "b": "GTA", "c": "CGTACG", "d": "ACNGT"}
+        seqs = []
+        for n in rng.randint(0, 500, size=300):
+            seq = "".join(rng.choice(list("ACGTN"), p=[0.3, 0.2, 0.2, 0.25, 0.05], size=n))
+            pos = rng.randint(0, len(seq) + 1)
+            seqs.append(seq[:pos] + SSP + seq[pos:] if rng.rand() < 0.5 else seq)
+        for chunk_size in (3, 16, 256):
+            automaton = PrimerAutomaton(primers, chunk_size)
+            self.assertEqual(automaton.names, ["SSP", "a", "b", "c"])
+            for seq, found in zip(seqs, automaton.find(seqs)):
+                expected = sorted((m.start(), acc, m.start() + len(primers[acc])) for acc in automaton.names
+                                  for m in re.finditer("(?={})".format(primers[acc]), seq))
+                self.assertEqual(sorted((s, acc, e) for acc, s, e in found), expected)
+
+    def testStaged(self):
+        rng = np.random.RandomState(7)
+        config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+        primers = primer_set(VNP_SHORT)
+        reads = []
+        for i in range(40):
+            insert = "".join(rng.choice(list("ACGT"), size=300))
+            vnp = primers["-VNP"] if i % 4 else primers["-VNP"][:10] + "A" + primers["-VNP"][11:]
+            reads.append(Seq(str(i), str(i), "GG" + SSP + insert + vnp + "CC", None))
+        worker_pool._init_worker({"primers": primers})
+        try:
+            params = ("edlib", (0.36, False, 0.3), config, 0.3, None)
+            full = chopper._staged_batch((reads, params + (False,)))
+            exact = chopper._staged_batch((reads, params + (True,)))
+            self.assertEqual([status for _, status in exact], ["full" if i % 4 == 0 else "exact" for i in range(40)])
+            for (hits_full, _), (hits_exact, _) in zip(full, exact):
+                self.assertEqual(chopper.analyse_hits(hits_full, config)[0], chopper.analyse_hits(hits_exact, config)[0])
+        finally:
+            worker_pool._init_worker({})
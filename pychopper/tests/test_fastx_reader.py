@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import tempfile
+import unittest
+from os import path
+
+from pychopper import seq_utils as seu
+from pychopper import fastx_reader
+
+
+class TestFastxReader(unittest.TestCase):
+
+    def _compare(self, text, **kwargs):
+        "Check that readfx yields the same records as readfq for all block sizes"
+        expected = list(seu.readfq(io.StringIO(text), **kwargs))
+        for block_size in (7, 64, fastx_reader.DEFAULT_BLOCK_SIZE):
+            res = list(fastx_reader.readfx(io.BytesIO(text.encode()), block_size=block_size, **kwargs))
+            self.assertEqual(res, expected)
+        return expected
+
+    def testFastq(self):
+        fq = path.join(path.dirname(__file__), 'data', 'ref.fq')
+        with open(fq, 'r') as fh:
+            text = fh.read()
+        self.assertEqual(len(self._compare(text)), 3)
+        self._compare(text, min_qual=7.0)
+        self._compare("@r1 a=1 b=2\nACGT\n+r1\nIIII\n@@r2\n\n+\n\n")
+
+    def testFasta(self):
+        self.assertEqual(len(self._compare(">a\nAC\nGT\n>b c\n\n>d\nT\n")), 3)
+
+    def testMultiLineFastq(self):
+        self.assertEqual(len(self._compare("@r1\nAAAA\n+\nIIII\n@r2 x\nACGT\nAC\n+\n!!!!\n##\n@r3\nA\n+\n@\n")), 3)
+
+    def testQualFilter(self):
+        text = "@a\nACGT\n+\n!!!!\n@b\nACGT\n+\nIIII\n"
+        tmp = tempfile.mkdtemp()
+        sup = {"out_fq": path.join(tmp, "fail.fq"), "pass": 0, "total": 0}
+        res = list(fastx_reader.readfx(io.BytesIO(text.encode()), min_qual=7, rfq_sup=sup))
+        self.assertEqual([r.Id for r in res], ["b"])
+        self.assertEqual((sup["total"], sup["pass"]), (2, 1))
+        with open(sup["out_fq"], "r") as fh:
+            self.assertEqual(fh.read(), "@a\nACGT\n+\n!!!!\n")
+        os.remove(sup["out_fq"])
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import gzip
+import struct
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from pychopper import fastx_writer, fastx_reader
+from pychopper.common_structures import Seq
+
+
+class TestFastxWriter(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        self.reads = []
+        for i, n in enumerate(rng.randint(1, 3000, size=500)):
+            seq = "".join(rng.choice(list("ACGT"), size=n))
+            qual = "".join(chr(33 + q) for q in rng.randint(0, 40, size=n))
+            self.reads.append(Seq(Id="r{}".format(i), Name="r{} x=1".format(i), Seq=seq, Qual=qual))
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, fname, batch_size):
+        pool = fastx_writer.compression_pool(3)
+        fh = fastx_writer.FastqWriter(fastx_writer.open_output(fname, pool), batch_size=batch_size)
+        for r in self.reads:
+            fh.write(r)
+        fh.close()
+        pool.shutdown()
+
+    def testRoundTrip(self):
+        for batch_size in (1, 7, 1000):
+            plain = os.path.join(self.tmp, "out.fq")
+            comp = os.path.join(self.tmp, "out.fq.gz")
+            self._write(plain, batch_size)
+            self._write(comp, batch_size)
+            with open(plain, "rb") as fh, gzip.open(comp, "rb") as gz:
+                self.assertEqual(fh.read(), gz.read())
+            with gzip.open(comp, "rb") as gz:
+                self.assertEqual(list(fastx_reader.readfx(gz)), self.reads)
+
+    def testBlocks(self):
+        comp = os.path.join(self.tmp, "out.fq.gz")
+        self._write(comp, 100)
+        with open(comp, "rb") as fh:
+            data = fh.read()
+        # Walk the blocks using the BSIZE field of the BGZF extra subfield:
+        pos, sizes = 0, []
+        while pos < len(data):
+            self.assertEqual(data[pos:pos + 4], b"\x1f\x8b\x08\x04")
+            self.assertEqual(data[pos + 12:pos + 14], b"BC")
+            bsize = struct.unpack("<H", data[pos + 16:pos + 18])[0] + 1
+            sizes.append(struct.unpack("<I", data[pos + bsize - 4:pos + bsize])[0])
+            pos += bsize
+        self.assertEqual(pos, len(data))
+        self.assertEqual(sizes[-1], 0)
+        self.assertTrue(all(s <= fastx_writer.BGZF_BLOCK_SIZE for s in sizes))
+        self.assertGreater(len(sizes), 2)
+
+    def testStdout(self):
+        self.assertIsNotNone(fastx_writer.open_output("-"))
+        out = io.StringIO()
+        fh = fastx_writer.FastqWriter(out)
+        fh.write(self.reads[0])
+        fh.flush()
+        self.assertTrue(out.getvalue().startswith("@r0 x=1\n"))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import io
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from pychopper import hmmer_backend
+from pychopper.compact_seq import reverse_complement
+from pychopper.common_structures import Hit, Seq
+from pychopper.tests.helpers import SSP, VNP
+
+KIT_HMM = os.path.join(os.path.dirname(hmmer_backend.__file__), "phmm_data", "cDNA_SSP_VNP.hmm")
+
+
+def _reads(n, seed=13):
+    "Random reads with mutated primers at the ends"
+    rng = np.random.RandomState(seed)
+    res = []
+    for i in range(n):
+        parts = []
+        for p in (SSP, "".join(rng.choice(list("ACGT"), size=rng.randint(50, 800))), reverse_complement(VNP)):
+            parts.append("".join(c if rng.rand() > 0.08 else rng.choice(list("ACGT")) for c in p))
+        res.append(Seq("r{}".format(i), "r{}".format(i), "".join(parts), None))
+    return res
+
+
+TBLOUT = """#target name  accession  query name  accession  hmmfrom  hmm to  alifrom  ali to  envfrom  env to  modlen  strand  E-value  score  bias  description of target
+#------------ ---------- ---------- ---------- ------- ------- ------- ------- ------- ------- ------- ------ --------- ------ ----- ---------------------
+SSP          -          r1         -                1      25       3      27       1      29      25    +     1.2e-08   25.1   0.2  -
+-VNP         -          r1         -                2      30     400     428     398     430      30    +     3.4e-07   21.0   0.1  -
+VNP          -          r3         -                1      30      10      39       8      41      30    +      0.0021    9.9   0.0  -
+"""
+
+
+class TestHmmerBackend(unittest.TestCase):
+
+    def testParse(self):
+        reads = [Seq(r, r, "", None) for r in ("r1", "r2", "r3")]
+        res = list(hmmer_backend._parse_hmmscan_tab(io.StringIO(TBLOUT), reads))
+        self.assertEqual(res, [
+            [Hit("r1", 3, 28, "SSP", 1, 26, 1.2e-08), Hit("r1", 400, 429, "-VNP", 2, 31, 3.4e-07)],
+            [],
+            [Hit("r3", 10, 40, "VNP", 1, 31, 0.0021)]])
+
+    def testPressed(self):
+        self.assertTrue(hmmer_backend.is_pressed(KIT_HMM))
+        self.assertEqual(hmmer_backend.pressed_model(KIT_HMM), KIT_HMM)
+        tmp = tempfile.mkdtemp()
+        try:
+            model = os.path.join(tmp, "custom.hmm")
+            shutil.copyfile(KIT_HMM, model)
+            self.assertFalse(hmmer_backend.is_pressed(model))
+            # A model pressed in the cache earlier is found by its content:
+            cache = os.path.join(tmp, "cache")
+            with open(model, "rb") as fh:
+                cached = os.path.join(cache, hashlib.sha1(fh.read()).hexdigest(), "custom.hmm")
+            os.makedirs(os.path.dirname(cached))
+            for suffix in ("",) + hmmer_backend.PRESS_SUFFIXES:
+                shutil.copyfile(KIT_HMM + suffix, cached + suffix)
+            self.assertEqual(hmmer_backend.pressed_model(model, cache), cached)
+            shutil.rmtree(cache)
+            if shutil.which("hmmpress") is not None:
+                pressed = hmmer_backend.pressed_model(model, cache)
+                self.assertTrue(hmmer_backend.is_pressed(pressed))
+                self.assertEqual(hmmer_backend.pressed_model(model, cache), pressed)
+        finally:
+            shutil.rmtree(tmp)
+
+    @unittest.skipIf(hmmer_backend.plan7 is None, "pyhmmer is not installed")
+    def testPyhmmerBatch(self):
+        # Scanning a batch gives the same hits as scanning every read on its own:
+        reads = _reads(30)
+        runner = hmmer_backend.PyhmmerRunner(KIT_HMM, 1.0, 1)
+        batch = runner.scan(reads)
+        self.assertGreater(sum(len(hits) for hits in batch), 30)
+        # Primer names are str whatever the pyhmmer version, as in the primer configs:
+        self.assertEqual({type(hit.Query) for hits in batch for hit in hits}, {str})
+        self.assertTrue({hit.Query for hits in batch for hit in hits} <= {"SSP", "-SSP", "VNP", "-VNP"})
+        for read, hits in zip(reads, batch):
+            self.assertEqual(sorted(hits), sorted(runner.scan([read])[0]))
+        self.assertEqual(runner.scan([]), [])
+
+    @unittest.skipIf(hmmer_backend.plan7 is None or shutil.which("nhmmscan") is None, "pyhmmer or nhmmscan is not installed")
+    def testPyhmmerParity(self):
+        reads = _reads(50)
+        for E in (1e-3, 1.0):
+            expected = hmmer_backend.NhmmscanRunner(KIT_HMM, E, 1).scan(reads)
+            res = hmmer_backend.PyhmmerRunner(KIT_HMM, E, 1).scan(reads)
+            for hits_nhmmscan, hits_pyhmmer in zip(expected, res):
+                self.assertEqual(sorted(hits_pyhmmer), sorted(hits_nhmmscan))
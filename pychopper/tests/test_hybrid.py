@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+import numpy as np
+
+from pychopper import chopper, utils, worker_pool
+from pychopper.alignment_hits import merge_hits
+from pychopper.compact_seq import reverse_complement
+from pychopper.common_structures import Hit, Seq
+from pychopper.tests.helpers import SSP, VNP_SHORT, primer_set
+
+
+class TestHybrid(unittest.TestCase):
+
+    def testMergeHits(self):
+        primary = (Hit("r", 0, 25, "SSP", 0, 25, 0.1), Hit("r", 100, 120, "-SSP", 0, 20, 0.2))
+        secondary = (Hit("r", 110, 130, "-VNP", 0, 22, 1e-5),)
+        self.assertEqual(merge_hits(primary, secondary), (primary[0], secondary[0]))
+        self.assertEqual(merge_hits(primary, ()), primary)
+
+    def testTiers(self):
+        rng = np.random.RandomState(11)
+        config = utils.parse_config_string("+:SSP,-VNP|-:VNP,-SSP")
+        primers = primer_set(VNP_SHORT)
+        reads = []
+        for i in range(10):
+            insert = "".join(rng.choice(list("ACGT"), size=200))
+            tail = reverse_complement(VNP_SHORT) if i % 2 == 0 else ""
+            reads.append(Seq(str(i), str(i), SSP + insert + tail, None))
+
+        def fake_phmm(reads, params):
+            self.assertEqual(params, (0.5, 1))
+            return [[Hit(r.Id, len(r.Seq) - 10, len(r.Seq), "-VNP", 12, 22, 0.01)] for r in reads]
+
+        worker_pool._init_worker({"primers": primers})
+        try:
+            with mock.patch.object(chopper, "_detect_phmm", side_effect=fake_phmm) as phmm:
+                hits, tiers, timings = chopper._hybrid_batch((reads, ((0.36, False, 0.3), 0.3, 0.5, config)))
+            self.assertEqual([r.Id for r in phmm.call_args[0][0]], [str(i) for i in range(1, 10, 2)])
+        finally:
+            worker_pool._init_worker({})
+        self.assertEqual(tiers, ["edlib", "phmm"] * 5)
+        self.assertEqual(len(timings), 2)
+        for read, read_hits in zip(reads, hits):
+            segments = chopper.analyse_hits(read_hits, config)[0]
+            self.assertEqual(len(segments), 1)
+            self.assertEqual(segments[0].Strand, "+")
+            self.assertEqual([h.Query for h in read_hits], ["SSP", "-VNP"])
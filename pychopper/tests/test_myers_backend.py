@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import unittest
+import edlib
+import numpy as np
+
+from pychopper import myers_backend, edlib_backend, worker_pool
+from pychopper.common_structures import Seq
+from pychopper.tests.helpers import SSP, mutate
+
+PRIMERS = {
+    "SSP": SSP,
+    "VNP": "ACTTGCCTGTCGCTCTATCTTCNNNN",
+    "short": "GCA",
+    "long": "ACTTGCCTGTCGCTCTATCTTCTTTCTGTTGGTGCTGATATTGCTTTTTTCTGTTGGTGCTGATATTGCTTT",
+}
+
+
+class TestMyersBackend(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(17)
+        self.seqs = []
+        for n in rng.randint(1, 600, size=150):
+            seq = "".join(rng.choice(list("ACGTN"), p=[0.24, 0.24, 0.24, 0.24, 0.04], size=n))
+            for acc in ("SSP", "VNP", "long"):
+                if rng.rand() < 0.6:
+                    pos = rng.randint(0, len(seq) + 1)
+                    seq = seq[:pos] + mutate(PRIMERS[acc], 0.15, rng) + seq[pos:]
+            self.seqs.append(seq.lower() if rng.rand() < 0.1 else seq)
+
+    def testLocations(self):
+        for max_ed in (0.0, 0.1, 0.36):
+            for chunk_size in (7, 256):
+                matcher = myers_backend.MultiPrimerMatcher(PRIMERS, max_ed, chunk_size)
+                self.assertEqual(matcher.long, ["long"])
+                for seq, found in zip(self.seqs, matcher.locations(self.seqs)):
+                    for acc in matcher.names:
+                        res = edlib.align(PRIMERS[acc], seq, mode="HW", task="locations", k=matcher.max_eds[acc])
+                        expected = (res["editDistance"], res["locations"]) if res["editDistance"] >= 0 else None
+                        self.assertEqual(found.get(acc), expected)
+
+    def testHits(self):
+        reads = [Seq(str(i), str(i), s, None) for i, s in enumerate(self.seqs)]
+        worker_pool._init_worker({"primers": PRIMERS, "min_seed_len": 1000, "chunk_size": 64})
+        try:
+            for params in ((0.36, False, None), (0.36, True, 0.3)):
+                self.assertEqual(myers_backend._find_locations_batch((reads, params)),
+                                 edlib_backend._find_locations_batch((reads, params)))
+        finally:
+            worker_pool._init_worker({})
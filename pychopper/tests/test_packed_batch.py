@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import pickle
+import unittest
+import numpy as np
+
+from pychopper import packed_batch
+from pychopper.common_structures import Seq, Hit
+
+
+class TestPackedBatch(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(11)
+        self.reads = [Seq("r{}".format(i), "r{} x=1".format(i), "".join(rng.choice(list("ACGTN"), size=n)), "5" * n)
+                      for i, n in enumerate([0, 1, 300, 17, 0, 2000])]
+        self.hits = []
+        for read in self.reads:
+            self.hits.append([Hit(read.Name, int(s), int(s) + 20, rng.choice(["SSP", "-VNP", "VNP"]), 1, 19, float(rng.rand()))
+                              for s in rng.randint(0, 1000, size=rng.randint(0, 4))])
+
+    def testReads(self):
+        packed = pickle.loads(pickle.dumps(packed_batch.pack_reads(self.reads)))
+        unpacked = packed_batch.unpack_reads(packed)
+        self.assertEqual([r.Seq for r in unpacked], [r.Seq for r in self.reads])
+        self.assertEqual(len(set(r.Id for r in unpacked)), len(self.reads))
+
+    def testHits(self):
+        packed = pickle.loads(pickle.dumps(packed_batch.pack_hits(self.hits)))
+        self.assertEqual(packed[0].dtype, packed_batch.HIT_DTYPE)
+        self.assertEqual(packed_batch.unpack_hits(self.reads, packed), self.hits)
+        eds = [[(i, h) for i, h in enumerate(hits)] for hits in self.hits]
+        packed = packed_batch.pack_hits(eds, edit_distances=True)
+        self.assertEqual(packed_batch.unpack_hits(self.reads, packed, edit_distances=True), eds)
+
+    def testEmpty(self):
+        packed = packed_batch.pack_hits([[] for _ in self.reads])
+        self.assertEqual(len(packed[0]), 0)
+        self.assertEqual(packed_batch.unpack_hits(self.reads, packed), [[] for _ in self.reads])
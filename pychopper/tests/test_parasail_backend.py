@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+import parasail
+
+from pychopper import parasail_backend as pb
+from pychopper.common_structures import Seq, Hit
+from pychopper.tests.helpers import VNP_POLYT, primer_set
+
+
+class TestRefineLocations(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(13)
+        self.primers = primer_set(VNP_POLYT)
+        self.cases = []
+        for i in range(200):
+            acc = rng.choice(sorted(self.primers))
+            primer = list(self.primers[acc])
+            # Mutate the primer, including its edges, so leading insertions and deletions occur:
+            for _ in range(rng.randint(0, 8)):
+                pos = rng.randint(len(primer))
+                op = rng.randint(3)
+                if op == 0:
+                    primer[pos] = "ACGT"[rng.randint(4)]
+                elif op == 1:
+                    primer.insert(pos, "ACGT"[rng.randint(4)])
+                else:
+                    del primer[pos]
+            flank = ["".join(rng.choice(list("ACGT"), size=rng.randint(0, 10))) for _ in range(2)]
+            seq = flank[0] + "".join(primer) + flank[1]
+            if rng.rand() < 0.3:
+                seq = "".join(rng.choice(list("ACGT"), size=len(seq)))
+            read = Seq("r{}".format(i), "r{}".format(i), "GGGG" + seq + "CCCC", None)
+            start = rng.randint(0, 5)
+            self.cases.append((read, [Hit(read.Name, start, len(read.Seq) - rng.randint(0, 5), acc, 0, len(self.primers[acc]), 0.1)]))
+        self.profiles = pb.ProfileCache(self.primers, pb.DEFAULT_SUBS_MAT)
+
+    def testIdentical(self):
+        for read, locs in self.cases:
+            ref = pb.refine_locations(read, self.primers, locs)
+            self.assertEqual(pb.refine_locations_profiled(read, self.primers, locs, self.profiles), ref)
+            for max_score in (0.0, 0.2, 0.5, 1.0):
+                self.assertEqual(pb.refine_locations_profiled(read, self.primers, locs, self.profiles, max_score=max_score),
+                                 [h for h in ref if h.Score <= max_score])
+
+    def testNoMatch(self):
+        # Windows without any base matching the primer, or empty, give no hits:
+        for seq in ("N" * 30, ""):
+            read = Seq("r", "r", seq, None)
+            locs = [Hit("r", 0, len(seq), "SSP", 0, len(self.primers["SSP"]), 0.1)]
+            self.assertEqual(pb.refine_locations_profiled(read, self.primers, locs, self.profiles), [])
+            self.assertEqual(pb.refine_locations_profiled(read, self.primers, locs, self.profiles, max_score=1.0), [])
+
+    def testProfileCache(self):
+        self.assertIsInstance(self.profiles["SSP"], parasail.Profile)
+        self.assertIs(self.profiles["SSP"], self.profiles["SSP"])
+        self.assertEqual(len(pb.ProfileCache(self.primers, pb.DEFAULT_SUBS_MAT)), 0)
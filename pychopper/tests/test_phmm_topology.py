@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import shutil
+import subprocess
+import tempfile
+import unittest
+from os import path
+from concurrent.futures import ThreadPoolExecutor
+
+from pychopper import hmmer_backend, phmm_topology, scheduler
+from pychopper.phmm_topology import Topology
+
+
+def _double(params):
+    chunk, _ = params
+    return [2 * x for x in chunk]
+
+
+class TestPhmmTopology(unittest.TestCase):
+
+    def testPlan(self):
+        # Unknown input size: one single threaded process per core:
+        self.assertEqual(phmm_topology.plan(8, max_batch=1000), Topology(8, 1, 1000, 50000))
+        # Large input: one process per core, a few batches each:
+        self.assertEqual(phmm_topology.plan(8, 100000, [1000] * 10, 1000), Topology(8, 1, 1000, 6250))
+        self.assertEqual(phmm_topology.plan(8, 20000, [1000] * 10, 5000), Topology(8, 1, 625, 1250))
+        # Small input: fewer processes, given the spare cores as threads:
+        self.assertEqual(phmm_topology.plan(8, 400, [1000] * 10, 1000), Topology(2, 4, 200, 200))
+        self.assertEqual(phmm_topology.plan(8, 3, [500] * 3, 1000), Topology(1, 4, 3, 3))
+        self.assertEqual(phmm_topology.plan(8, 3, [500] * 3, 1000, max_cpu=1), Topology(1, 1, 3, 3))
+        # Long reads give fewer reads per batch:
+        self.assertEqual(phmm_topology.plan(2, 10000, [50000] * 10, 5000), Topology(2, 1, 1000, 1000))
+
+    def testBatchSizer(self):
+        sizer = phmm_topology.BatchSizer(100, 1000, target_seconds=1.0)
+        sizer.record(100, 0.1)
+        self.assertEqual(sizer(), 200)
+        sizer.record(200, 0.4)
+        self.assertEqual(sizer(), 400)
+        sizer.record(400, 0.8)
+        self.assertEqual(sizer(), 500)
+        sizer.record(500, 10.0)
+        self.assertEqual(sizer(), 250)
+        sizer.record(250, 0.0)
+        self.assertEqual(sizer(), 250)
+        self.assertEqual(sizer.reads, 1450)
+
+    def testSizedChunks(self):
+        sizes = iter([1, 2, 3, 100, 100])
+        chunks = []
+
+        def unpack(chunk, res):
+            chunks.append(len(chunk))
+            return res
+
+        with ThreadPoolExecutor(2) as pool:
+            res = list(scheduler.stream_map(_double, range(20), pool, lambda: next(sizes), 1, unpack=unpack))
+        self.assertEqual(res, [(x, 2 * x) for x in range(20)])
+        self.assertEqual(chunks, [1, 2, 3, 14])
+
+    @unittest.skipIf(hmmer_backend.plan7 is None, "pyhmmer is not installed")
+    def testStatsOutput(self):
+        input_fastq = path.join(path.dirname(__file__), "data", "ref.fq")
+        tmp = tempfile.mkdtemp()
+        try:
+            stats = path.join(tmp, "stats.tsv")
+            subprocess.call(["pychopper", "-Y", "0", "-q", "0.001", "-m", "phmm", "-P", "pyhmmer", "-S", stats,
+                             "-r", path.join(tmp, "report.pdf"), input_fastq, path.join(tmp, "out.fq")],
+                            stderr=subprocess.DEVNULL)
+            with open(stats) as fh:
+                rows = [line.rstrip("\n").split("\t") for line in fh]
+        finally:
+            shutil.rmtree(tmp)
+        names = [name for category, name, _ in rows if category == "PhmmTopology"]
+        self.assertEqual(names, ["processes", "cpu", "initial_batch", "final_batch"])
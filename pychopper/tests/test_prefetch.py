@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from pychopper import prefetch, fastx_writer
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(5)
+        self.data = "".join("@r{}\n{}\n+\n{}\n".format(i, s, "5" * len(s)) for i, s in enumerate(
+            "".join(rng.choice(list("ACGT"), size=n)) for n in rng.randint(1, 2000, size=800))).encode()
+        self.tmp = tempfile.mkdtemp()
+        self.pool = fastx_writer.compression_pool(3)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        shutil.rmtree(self.tmp)
+
+    def _path(self, name, data):
+        fname = os.path.join(self.tmp, name)
+        with open(fname, "wb") as fh:
+            fh.write(data)
+        return fname
+
+    def _read(self, fname, pool=None):
+        with prefetch.open_input(fname, pool, chunk_size=10000, queue_size=2) as fh:
+            return fh.read()
+
+    def testPlain(self):
+        self.assertEqual(self._read(self._path("x.fq", self.data)), self.data)
+        self.assertEqual(self._read(self._path("empty.fq", b"")), b"")
+
+    def testGzip(self):
+        fname = self._path("x.fq.gz", gzip.compress(self.data))
+        self.assertEqual(self._read(fname), self.data)
+        half = len(self.data) // 2
+        fname = self._path("multi.fq.gz", gzip.compress(self.data[:half]) + gzip.compress(self.data[half:]))
+        self.assertEqual(self._read(fname), self.data)
+
+    def testBgzf(self):
+        fname = os.path.join(self.tmp, "x.fq.gz")
+        fh = fastx_writer.open_output(fname, self.pool)
+        fh.write(self.data.decode())
+        fh.close()
+        with open(fname, "rb") as fh:
+            self.assertTrue(prefetch.is_bgzf(fh.read(18)))
+        self.assertEqual(self._read(fname, self.pool), self.data)
+        self.assertEqual(self._read(fname), self.data)
+
+    def testTruncated(self):
+        comp = gzip.compress(self.data)
+        fname = self._path("trunc.fq.gz", comp[:len(comp) // 2])
+        with self.assertRaises(EOFError):
+            self._read(fname)
+
+    def testEarlyClose(self):
+        fname = self._path("x.fq", self.data)
+        fh = prefetch.open_input(fname, chunk_size=100, queue_size=1)
+        self.assertEqual(fh.readline(), b"@r0\n")
+        fh.close()
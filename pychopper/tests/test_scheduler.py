@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+import concurrent.futures
+import numpy as np
+
+from pychopper import scheduler, worker_pool
+
+
+def _square_chunk(params):
+    chunk, delay = params
+    time.sleep(delay * np.random.rand())
+    return [x * x for x in chunk]
+
+
+def _primer_chunk(params):
+    chunk, _ = params
+    return [worker_pool.get_context()["primers"]["P"] for _ in chunk]
+
+
+class TestScheduler(unittest.TestCase):
+
+    def testOrder(self):
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            for chunk_size, in_flight in ((1, 1), (3, 2), (7, None), (1000, 4)):
+                res = list(scheduler.stream_map(_square_chunk, range(100), pool, chunk_size, in_flight, 0.002))
+                self.assertEqual(res, [(x, x * x) for x in range(100)])
+
+    def testBackpressure(self):
+        pulled = []
+
+        def source():
+            for i in range(200):
+                pulled.append(i)
+                yield i
+
+        with concurrent.futures.ThreadPoolExecutor(2) as pool:
+            for i, (x, y) in enumerate(scheduler.stream_map(_square_chunk, source(), pool, 5, 3, 0.0)):
+                # The reader can be ahead of the consumer by at most the work units in flight:
+                self.assertLessEqual(len(pulled) - i, 3 * 5)
+        self.assertEqual(len(pulled), 200)
+
+    def testContextRegistry(self):
+        contexts = [{"primers": {"P": "ACGT"}}, {"primers": {"P": "TTTT"}}]
+        keys = [worker_pool.context_key(c) for c in contexts]
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], worker_pool.context_key({"primers": {"P": "ACGT"}}))
+        with worker_pool.start_pool(2, contexts[0], executor=concurrent.futures.ThreadPoolExecutor, log=None) as p1, \
+                worker_pool.start_pool(2, contexts[1], executor=concurrent.futures.ThreadPoolExecutor, log=None) as p2:
+            # Thread pools share the registry, each work unit must see the context of its own pool:
+            for pool, context in ((p1, contexts[0]), (p2, contexts[1]), (p1, contexts[0])):
+                res = [y for _, y in scheduler.stream_map(_primer_chunk, range(50), pool, 3, 4)]
+                self.assertEqual(res, [context["primers"]["P"]] * 50)
+        with self.assertRaises(KeyError):
+            worker_pool.run_in_context("missing", _primer_chunk, ([1], None))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+
+from pychopper import seq_utils as seu
+from pychopper import edlib_backend, worker_pool
+from pychopper.seed_index import SeedIndex
+from pychopper.common_structures import Seq
+from pychopper.tests.helpers import SSP, VNP_POLYT, primer_set, mutate
+
+
+class TestSeedIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(11)
+        self.primers = primer_set(VNP_POLYT)
+        self.reads = []
+        for i in range(300):
+            insert = "".join(rng.choice(list("ACGT"), size=rng.randint(0, 800)))
+            seq = SSP + insert + seu.reverse_complement(VNP_POLYT)
+            if rng.rand() < 0.2:
+                seq = seq + SSP + insert[:100] + seu.reverse_complement(VNP_POLYT)
+            if rng.rand() < 0.5:
+                seq = seu.reverse_complement(seq)
+            seq = mutate(seq, rng.choice([0.0, 0.03, 0.1]), rng)
+            self.reads.append(Seq(str(i), str(i), seq, None))
+
+    def testPieces(self):
+        index = SeedIndex(self.primers, 0.1)
+        self.assertEqual(sorted(index.seeded), sorted(self.primers.keys()))
+        self.assertEqual(index.max_eds["SSP"], 2)
+        wins = index.windows(["AAAA" + SSP + "AAAA", "", "C" * 10 + SSP[:12] + "N" + SSP[12:]])
+        self.assertEqual(wins[0]["SSP"], [(2, 4 + len(SSP) + 2)])
+        self.assertEqual(wins[1], {})
+        # The N breaks one of the three pieces, the other two are still found (window clipped to the read):
+        self.assertEqual(wins[2]["SSP"], [(8, 10 + len(SSP) + 1)])
+        self.assertNotIn("-SSP", wins[0])
+        index = SeedIndex(self.primers, 0.5)
+        self.assertEqual(index.seeded, [])
+
+    def testSameHits(self):
+        worker_pool._init_worker({"primers": self.primers})
+        for max_ed in (0.0, 0.05, 0.12, 0.2, 0.3):
+            seeded = edlib_backend._find_locations_batch((self.reads, (max_ed, True, None)))
+            worker_pool._init_worker({"primers": self.primers, "min_seed_len": 1000})
+            full = [edlib_backend._find_locations_single((r, (max_ed, True, None))) for r in self.reads]
+            worker_pool._init_worker({"primers": self.primers})
+            self.assertEqual(seeded, full)
+            self.assertGreater(sum(map(len, full)), 0)
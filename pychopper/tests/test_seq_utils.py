@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import io
+import unittest
+from unittest import mock
+import numpy as np
+
+from pychopper import seq_utils as seu
+from pychopper import compact_seq
+
+
+class TestSeqUtils(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(7)
+        self.quals = ["".join(chr(33 + q) for q in rng.randint(0, 45, size=n)) for n in rng.randint(0, 2000, size=300)]
+        self.quals += ["", "!", "+++", "I" * 5]
+
+    def testMeanQuals(self):
+        res = seu.mean_quals(self.quals)
+        for q, mq in zip(self.quals, res):
+            self.assertAlmostEqual(mq, seu.mean_qual(q), places=9)
+
+    def testMeanQualMask(self):
+        exact = [seu.mean_qual(q) for q in self.quals]
+        # Cutoffs placed exactly at the mean quality of some reads are the worst case:
+        for min_qual in [7.0, 10.0] + exact[:20]:
+            mask = seu.mean_qual_mask(self.quals, min_qual)
+            self.assertEqual(mask.tolist(), [not (mq < min_qual) for mq in exact])
+
+    def testReverseComplement(self):
+        self.assertEqual(seu.reverse_complement(""), "")
+        self.assertEqual(seu.reverse_complement("AACGTNx-"), "-xNACGTT")
+        rng = np.random.RandomState(3)
+        for n in (1, 3, 4, 5, 33, 1000):
+            s = "".join(rng.choice(list("ACGTNacgtn-"), size=n))
+            expected = "".join(seu.base_complement(b) for b in reversed(s))
+            self.assertEqual(seu.reverse_complement(s), expected)
+            self.assertEqual(compact_seq.reverse_complement(s.encode()), expected.encode())
+
+    def testUnknownWarning(self):
+        for seq, unknown in (("ACGTN-", None), (b"ACGTN-", None), ("ACRGTY", "R,Y"), (b"ACRGTY", "R,Y"), ("AC\u00e9G", "\u00e9")):
+            with mock.patch("sys.stderr", new_callable=io.StringIO) as err:
+                compact_seq.reverse_complement(seq)
+            if unknown is None:
+                self.assertEqual(err.getvalue(), "")
+            else:
+                self.assertIn("for {} found".format(unknown), err.getvalue())
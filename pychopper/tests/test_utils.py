@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+
+from pychopper import utils
+
+
+class TestUtils(unittest.TestCase):
+
+    def testReservoirSmall(self):
+        self.assertEqual(utils.reservoir_sample(range(5), 10, seed=1), ([0, 1, 2, 3, 4], 5))
+        self.assertEqual(utils.reservoir_sample(range(5), 0, seed=1), ([], 5))
+        self.assertEqual(utils.reservoir_sample([], 3, seed=1), ([], 0))
+
+    def testReservoirSeed(self):
+        a = utils.reservoir_sample(range(10000), 50, seed=3)
+        self.assertEqual(a, utils.reservoir_sample(iter(range(10000)), 50, seed=3))
+        self.assertEqual(a[1], 10000)
+        self.assertEqual(len(set(a[0])), 50)
+
+    def testReservoirUniform(self):
+        counts = np.zeros(50)
+        for seed in range(4000):
+            sample, n = utils.reservoir_sample(range(50), 5, seed=seed)
+            counts[sample] += 1
+        # Every item is expected 400 times, allow for ~5 standard deviations:
+        self.assertLess(np.abs(counts - 400).max(), 100)
+
+    def testWarmupBuffer(self):
+        buff, rest = utils.warmup_buffer(iter(range(100)), 10, size=lambda x: 1)
+        self.assertEqual(buff, list(range(10)))
+        self.assertEqual(list(rest), list(range(100)))
+        buff, rest = utils.warmup_buffer(["AAA", "CC", "G", "TT"], 10, max_size=5)
+        self.assertEqual(buff, ["AAA", "CC"])
+        self.assertEqual(list(rest), ["AAA", "CC", "G", "TT"])
+        buff, rest = utils.warmup_buffer(["A", "C", "G"], 0)
+        self.assertEqual((buff, list(rest)), ([], ["A", "C", "G"]))
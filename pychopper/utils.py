@@ -3,6 +3,8 @@ from collections import OrderedDict
 import subprocess as sp
 from itertools import islice, chain
 import numpy as np
+import math
+import random
 import sys
 
 
@@ -50,16 +52,57 @@ def hit2bed(hit, read):
     return bed_line
 
 
-def count_fastq_records(fname, size=128000000, opener=open):
-    fh = opener(fname, "r")
-    count = 0
-    while True:
-        b = fh.read(size)
-        if not b:
-            break
-        count += b.count("\n+\n")
-    fh.close()
-    return count
+def reservoir_sample(iterable, k, seed=None):
+    """ Draw a uniform random sample of k items from an iterable in a single pass (Algorithm L).
+
+    :param iterable: Input items.
+    :param k: Sample size.
+    :param seed: Random seed.
+    :returns: List of sampled items and the total number of items.
+    :rtype: tuple
+    """
+    sourceiter = iter(iterable)
+    sample = list(islice(sourceiter, k))
+    if len(sample) < k or k == 0:
+        return sample, len(sample) + sum(1 for _ in sourceiter)
+    rng = random.Random(seed)
+
+    def skip(w):
+        if w >= 1.0:
+            return 1
+        return int(math.log(1.0 - rng.random()) / math.log1p(-w)) + 1
+
+    w = math.exp(math.log(1.0 - rng.random()) / k)
+    i = k - 1
+    next_i = i + skip(w)
+    for item in sourceiter:
+        i += 1
+        if i == next_i:
+            sample[rng.randrange(k)] = item
+            w *= math.exp(math.log(1.0 - rng.random()) / k)
+            next_i = i + skip(w)
+    return sample, i + 1
+
+
+def warmup_buffer(iterable, max_items, max_size=None, size=len):
+    """ Buffer the first items of an iterable, up to max_items items or a total size of max_size.
+
+    :param iterable: Input items.
+    :param max_items: Maximum number of buffered items.
+    :param max_size: Maximum total size of buffered items (None for no limit).
+    :param size: Function returning the size of an item.
+    :returns: List of buffered items and an iterator over the buffered items followed by the rest.
+    :rtype: tuple
+    """
+    sourceiter = iter(iterable)
+    buff, total = [], 0
+    if max_items > 0:
+        for item in sourceiter:
+            buff.append(item)
+            total += size(item)
+            if len(buff) >= max_items or (max_size is not None and total >= max_size):
+                break
+    return buff, chain(buff, sourceiter)
 
 
 def check_command(cmd):
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import pickle
+import hashlib
+import threading
+import concurrent.futures
+import parasail
+from pychopper.parasail_backend import DEFAULT_ALIGN_PARAMS, ProfileCache
+
+""" A worker pool living for the whole run. Backend parameters (primers, profile HMM path,
+alignment parameters and matrices) are installed once in every worker by the pool initializer.
+Parasail profiles of the primers are created on first use and kept for the lifetime of the worker.
+
+Installed contexts are kept in a registry keyed by a hash of the backend parameters, and work
+units carry only the key. This lets pools with different parameters share a process (thread
+pools) without pickling the parameters with every work unit.
+"""
+
+_CONTEXTS = {}
+_CONTEXT = {}
+_CURRENT = threading.local()
+
+
+def context_key(context):
+    "Hash identifying a backend context in the worker registry"
+    return hashlib.sha1(pickle.dumps(sorted(context.items()))).hexdigest()
+
+
+def _init_worker(context, key=None):
+    "Install the backend context in a worker and make it the default context"
+    global _CONTEXT
+    if key is None:
+        key = context_key(context)
+    if key not in _CONTEXTS:
+        t0 = time.perf_counter()
+        ctx = dict(context)
+        aln_params = ctx.setdefault("aln_params", DEFAULT_ALIGN_PARAMS)
+        ctx["subs_mat"] = parasail.matrix_create("ACGT", aln_params['match'], aln_params['mismatch'])
+        ctx["profiles"] = ProfileCache(ctx.get("primers", {}), ctx["subs_mat"])
+        ctx["init_time"] = time.perf_counter() - t0
+        _CONTEXTS[key] = ctx
+    _CONTEXT = _CONTEXTS[key]
+
+
+def get_context():
+    "Return the backend context of the work unit running in the current worker"
+    key = getattr(_CURRENT, "key", None)
+    return _CONTEXT if key is None else _CONTEXTS[key]
+
+
+def run_in_context(key, func, args):
+    """ Run func(args) with the context registered under key as the current context.
+
+    :param key: Context key, as returned by context_key.
+    :param func: Function to run.
+    :param args: Argument passed to func.
+    :returns: The result of func.
+    """
+    if key not in _CONTEXTS:
+        raise KeyError("Backend context {} is not installed in worker {}!".format(key, os.getpid()))
+    _CURRENT.key = key
+    try:
+        return func(args)
+    finally:
+        _CURRENT.key = None
+
+
+def _ping(delay, key):
+    "Report the process and initialization time of the worker running this task"
+    time.sleep(delay)
+    return os.getpid(), _CONTEXTS[key]["init_time"]
+
+
+def start_pool(workers, context, executor=concurrent.futures.ProcessPoolExecutor, log=sys.stderr):
+    """ Start a worker pool with the backend context installed in every worker.
+
+    The key of the context is stored as the context_key attribute of the executor.
+
+    :param workers: Number of workers.
+    :param context: Dictionary with the backend parameters: primers, phmm_file and aln_params.
+    :param executor: Executor class to use.
+    :param log: Stream to report startup cost to (None to disable).
+    :returns: The executor.
+    """
+    t0 = time.perf_counter()
+    key = context_key(context)
+    pool = executor(max_workers=workers, initializer=_init_worker, initargs=(context, key))
+    pool.context_key = key
+    # Make sure the workers are up, so startup cost is paid (and measured) here:
+    seen = dict(pool.map(_ping, [0.01] * (2 * workers), [key] * (2 * workers)))
+    startup = time.perf_counter() - t0
+    if log is not None:
+        log.write("Started {} workers in {:.3f}s (mean worker initialization: {:.2f}ms).\n".format(
+            workers, startup, 1000 * sum(seen.values()) / len(seen)))
+    return pool
@@ -36,7 +36,7 @@ with open(os.path.join(dir_path, 'requirements.txt')) as fh:
         pkg_resources.parse_requirements(fh)]
 
 data_files = []
-extra_requires = {}
+extra_requires = {'pyhmmer': ['pyhmmer>=0.10.8']}
 extensions = []
 
 